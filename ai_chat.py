@@ -1,18 +1,50 @@
 """
 מודול AI Chat - ניהול שיחות חכמות עם משתמשים.
 משתמש ב-OpenAI לניהול שיחה טבעית ולזיהוי פניות.
-גרסה ללא היסטוריה - מותאם ל-Lambda.
+כברירת מחדל ללא היסטוריה (מצב רב-שלבי עם חלון חסום - CHAT_HISTORY_MODE) - מותאם ל-Lambda.
 """
-import json
-from typing import Tuple, Optional, Dict
-from openai import OpenAI
+import functools
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import config
+import json_codec
 from config import OPENAI_API_KEY
+from pending_store import PendingRequestStore, create_pending_store
+from structured_log import get_logger
+from tracing import traced
+from prompt_builder import TOKENS_PER_MESSAGE, PromptBuilder, count_tokens, prompt_metrics
 
-# יצירת לקוח OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# לקוח OpenAI - נוצר בשימוש הראשון (ייבוא openai יקר ב-cold start) ונשמר בין הפעלות חמות
+_client = None
+_client_lock = threading.Lock()
 
-# זיכרון זמני לפניות שמחכות לאישור (עובד בתוך אותו Lambda container)
-pending_requests: Dict[str, str] = {}
+log = get_logger("ai_chat")
+
+
+def get_client():
+    """מחזיר את לקוח OpenAI המשותף, ויוצר אותו בקריאה הראשונה."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+
+def __getattr__(name):
+    # תאימות לאחור: ai_chat.client
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# פניות שמחכות לאישור - בזיכרון התהליך, או משותף בין containers (SQLite / Redis),
+# לפי PENDING_STORE. תומך גם בגישה כמו מילון.
+pending_requests: PendingRequestStore = create_pending_store()
 
 # הגדרת ה-System Prompt לבוט
 SYSTEM_PROMPT_HE = """אתה נציג שירות לקוחות ידידותי ומקצועי של "בית לאה" - עמותה.
@@ -77,6 +109,188 @@ def get_system_prompt(language: str) -> str:
     return SYSTEM_PROMPT_HE
 
 
+# ============================================
+# מטמון תשובות להודעות טריוויאליות (ברכות / "מה התפקיד שלך")
+# ============================================
+# התשובות להודעות האלה נקבעות כולן מה-System Prompt, ולכן אפשר להגיש אותן
+# מהמטמון בלי קריאה ל-OpenAI. תשובה שתישמר במטמון נוצרת כשבמקום שם המשתמש
+# נשלח placeholder קבוע, והשם מוחלף רק בהגשה. (החלפת השם בתשובה מוכנה לא
+# בטוחה: השם יכול להופיע גם בטקסט עצמו - למשל "לאה" ב"בית לאה".)
+
+RESPONSE_CACHE_SIZE = getattr(config, 'RESPONSE_CACHE_SIZE', 256)
+RESPONSE_CACHE_TTL_SECONDS = getattr(config, 'RESPONSE_CACHE_TTL_SECONDS', 60 * 60)
+
+NAME_PLACEHOLDER = "[[NAME]]"
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_REPEATED_CHAR_RE = re.compile(r"(.)\1+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """
+    מנרמל הודעה להשוואה: אותיות קטנות, בלי ניקוד, סימני פיסוק ואימוג'י,
+    רווחים מאוחדים ואותיות חוזרות מכווצות ("היייי" -> "הי", "hiii" -> "hi").
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _REPEATED_CHAR_RE.sub(r"\1", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+_GREETINGS = {
+    normalize_message(word) for word in (
+        "היי", "הי", "שלום", "שלום לך", "היי שלום", "הלו", "אהלן", "מה נשמע", "מה שלומך", "מה קורה",
+        "בוקר טוב", "צהריים טובים", "ערב טוב", "לילה טוב",
+        "hi", "hey", "hello", "hi there", "hello there", "good morning", "good afternoon",
+        "good evening", "how are you",
+    )
+}
+_ROLE_QUESTIONS = {
+    normalize_message(word) for word in (
+        "מה אתה עושה", "מי אתה", "מה התפקיד שלך", "מה המטרה שלך", "מה אפשר לעשות איתך", "במה אתה עוזר",
+        "what do you do", "who are you", "what is your role", "what's your role", "what can you do",
+        "what is your purpose",
+    )
+}
+
+
+def classify_trivial(user_message: str) -> Optional[str]:
+    """
+    מסווג מקומי מהיר להודעות שהתשובה להן לא תלויה בתוכן נוסף.
+    מחזיר "greeting", "role" או None.
+    """
+    normalized = normalize_message(user_message)
+    if normalized in _GREETINGS:
+        return "greeting"
+    if normalized in _ROLE_QUESTIONS:
+        return "role"
+    return None
+
+
+class ResponseCache:
+    """מטמון LRU עם תפוגה לתשובות, לפי (שפה, הודעה מנורמלת)."""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, template = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return template
+
+    def put(self, key: Tuple[str, str], template: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), template)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def _render_cached(template: str, user_name: str) -> str:
+    return template.replace(NAME_PLACEHOLDER, user_name)
+
+
+def _is_reusable_template(response: str) -> bool:
+    """האם המודל השאיר את ה-placeholder שלם (או השמיט אותו), כך שאפשר להגיש את התשובה לכל משתמש."""
+    rest = response.replace(NAME_PLACEHOLDER, "")
+    return "[[" not in rest and "]]" not in rest and "NAME" not in rest
+
+
+PENDING_OPEN_TAG = "[PENDING_REQUEST]"
+PENDING_CLOSE_TAG = "[/PENDING_REQUEST]"
+
+# מצב הזרמה: קריאת התשובה מ-OpenAI בחלקים ועצירה ברגע שהתגית הסוגרת הגיעה
+OPENAI_STREAMING = getattr(config, 'OPENAI_STREAMING', False)
+
+# שאלת האישור שנוספת מקומית כשהזרמה נעצרה לפני שהמודל כתב אותה
+CONFIRMATION_QUESTIONS = {
+    "he": "אז להכניס את הפנייה: '{request}'?",
+    "en": "So should I submit the request: '{request}'?",
+}
+_CONFIRMATION_MARKERS = ("להכניס את הפנייה", "submit the request")
+
+
+class PendingRequestStreamParser:
+    """
+    מפענח הדרגתי לתגיות [PENDING_REQUEST]...[/PENDING_REQUEST] בתשובה מוזרמת.
+
+    feed() מקבל כל חלק שמגיע מה-API - גם כשתגית מפוצלת בין כמה חלקים -
+    ומחזיר True ברגע שהתגית הסוגרת הושלמה (אפשר להפסיק לקרוא את ההזרמה).
+    כל חלק נסרק פעם אחת בלבד; נשמרת רק סיפא קצרה שעשויה להיות תחילת תגית.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._tail = ""
+        self.state = "before"  # before -> inside -> done
+        self.usage = None  # מגיע ב-chunk האחרון (stream_options.include_usage)
+
+    @property
+    def complete(self) -> bool:
+        return self.state == "done"
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> bool:
+        if not chunk:
+            return self.complete
+        self._parts.append(chunk)
+        if self.complete:
+            return True
+
+        text = self._tail + chunk
+        while True:
+            tag = PENDING_OPEN_TAG if self.state == "before" else PENDING_CLOSE_TAG
+            index = text.find(tag)
+            if index < 0:
+                self._tail = text[len(text) - self._partial_tag_length(text, tag):]
+                return False
+            text = text[index + len(tag):]
+            if self.state == "before":
+                self.state = "inside"
+            else:
+                self.state = "done"
+                self._tail = ""
+                return True
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """אורך הסיפא הארוכה ביותר של text שהיא תחילית של tag."""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if tag.startswith(text[-length:]):
+                return length
+        return 0
+
+    def result(self) -> Tuple[str, Optional[str]]:
+        """(טקסט לשליחה למשתמש, פנייה לאישור או None) - כמו parse_pending_request."""
+        return parse_pending_request(self.raw)
+
+
+def with_confirmation_question(response: str, pending_request: str, language: str) -> str:
+    """מוסיף את שאלת האישור אם היא חסרה בתשובה (למשל כשההזרמה נעצרה אחרי התגית)."""
+    if any(marker in response for marker in _CONFIRMATION_MARKERS):
+        return response
+    question = CONFIRMATION_QUESTIONS.get(language, CONFIRMATION_QUESTIONS["he"]).format(request=pending_request)
+    return response + "\n\n" + question if response else question
+
+
 def parse_pending_request(response: str) -> Tuple[str, Optional[str]]:
     """
     מחלץ את הפנייה המסומנת מתוך תשובת ה-AI.
@@ -101,56 +315,429 @@ def parse_pending_request(response: str) -> Tuple[str, Optional[str]]:
     return response, None
 
 
+COMPLETION_PARAMS = {
+    "model": "gpt-4o-mini",  # מודל מהיר וזול
+    "max_tokens": 500,
+    "temperature": 0.4,
+}
+
+
+def stream_chat_completion(messages) -> PendingRequestStreamParser:
+    """
+    מזרים תשובה מ-OpenAI דרך PendingRequestStreamParser, וסוגר את ההזרמה
+    ברגע שהתגית הסוגרת מגיעה - כך לא מחכים (ולא משלמים) על שאר הטוקנים.
+    ה-usage מגיע רק ב-chunk האחרון, ולכן אחרי עצירה מוקדמת parser.usage הוא None.
+    """
+    parser = PendingRequestStreamParser()
+    stream = get_client().chat.completions.create(
+        messages=messages, stream=True, stream_options={"include_usage": True}, **COMPLETION_PARAMS
+    )
+    try:
+        for chunk in stream:
+            if chunk.usage is not None:
+                parser.usage = chunk.usage
+            if chunk.choices and parser.feed(chunk.choices[0].delta.content or ""):
+                break
+    finally:
+        stream.close()
+    return parser
+
+
+# ============================================
+# מצב פלט מובנה (JSON) - חלופה לתגיות [PENDING_REQUEST]
+# ============================================
+# "tags" - התשובה היא טקסט חופשי עם תגיות; "json" - המודל מחזיר אובייקט JSON
+# לפי STRUCTURED_REPLY_SCHEMA. אם ה-JSON לא תקין, נופלים חזרה לפענוח התגיות.
+OPENAI_OUTPUT_MODE = getattr(config, 'OPENAI_OUTPUT_MODE', 'tags')
+
+STRUCTURED_REPLY_SCHEMA = {
+    "name": "beit_lea_reply",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "reply": {"type": "string"},
+            "is_request": {"type": "boolean"},
+            "summary": {"type": ["string", "null"]},
+            "language": {"type": "string", "enum": ["he", "en"]},
+        },
+        "required": ["reply", "is_request", "summary", "language"],
+    },
+}
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = """פורמט הפלט (גובר על הוראת התגיות למעלה):
+החזר אובייקט JSON בלבד, בלי תגיות [PENDING_REQUEST]:
+- reply: הטקסט שיישלח למשתמש (כולל שאלת האישור אם יש פנייה)
+- is_request: true אם זיהית בקשה, אחרת false
+- summary: סיכום הפנייה אם is_request, אחרת null
+- language: "he" או "en" - השפה שבה המשתמש כתב
+Output format (overrides the tag instructions above): return only the JSON object described above."""
+
+
+class StructuredReply(NamedTuple):
+    reply: str
+    is_request: bool
+    summary: Optional[str]
+    language: Optional[str]
+
+
+def parse_structured_reply(raw: str) -> Optional[StructuredReply]:
+    """מפענח ומאמת תשובת JSON של המודל. מחזיר None אם היא לא תואמת את המבנה."""
+    try:
+        data = json_codec.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    reply = data.get("reply")
+    is_request = data.get("is_request")
+    summary = data.get("summary")
+    language = data.get("language")
+    if not isinstance(reply, str) or not reply.strip() or not isinstance(is_request, bool):
+        return None
+    if is_request and (not isinstance(summary, str) or not summary.strip()):
+        return None
+    if language not in ("he", "en"):
+        language = None
+    return StructuredReply(reply.strip(), is_request, summary.strip() if is_request else None, language)
+
+
+TECHNICAL_ERROR_MESSAGES = {
+    "he": "מצטער, יש בעיה טכנית. אנא נסה שוב.",
+    "en": "Sorry, technical issue. Please try again.",
+}
+
+
+def technical_error_message(language: str) -> str:
+    return TECHNICAL_ERROR_MESSAGES.get(language, TECHNICAL_ERROR_MESSAGES["he"])
+
+
+def invalid_structured_fallback(raw: str, language: str) -> Tuple[str, Optional[str]]:
+    """
+    תשובה כשפלט ה-JSON לא עבר אימות. JSON לעולם לא נשלח למשתמש כמו שהוא:
+    אובייקט JSON - השדה reply אם הוא טקסט שמיש, אחרת הודעת שגיאה;
+    פלט שאינו JSON בכלל - פענוח לפי תגיות (המודל החזיר טקסט רגיל).
+    """
+    try:
+        data = json_codec.loads(raw)
+    except (TypeError, ValueError):
+        return parse_pending_request(raw)
+    if isinstance(data, dict):
+        reply = data.get("reply")
+        if isinstance(reply, str) and reply.strip():
+            return reply.strip(), None
+        return technical_error_message(language), None
+    if isinstance(data, str) and data.strip():
+        return data.strip(), None
+    return technical_error_message(language), None
+
+
+class ChatResult(NamedTuple):
+    text: str                      # הטקסט לשליחה למשתמש
+    pending_request: Optional[str]  # הפנייה לאישור, אם זוהתה
+    usage: Any                     # usage של OpenAI (None בהזרמה שנעצרה מוקדם)
+    fallback: bool                 # במצב json: התשובה לא עברה אימות ופוענחה כתגיות
+
+
+def get_static_prompt(language: str, output_mode: str = "tags") -> str:
+    """ה-system prompt הסטטי (אותה מחרוזת בדיוק בכל קריאה עם אותה שפה ומצב)."""
+    if output_mode == "json":
+        return get_system_prompt(language) + "\n" + STRUCTURED_OUTPUT_INSTRUCTIONS
+    return get_system_prompt(language)
+
+
+prompt_builder = PromptBuilder(get_static_prompt)
+
+
+def build_messages(user_message: str, user_name: str, language: str, output_mode: str = "tags") -> List[Dict[str, str]]:
+    """בונה את רשימת ההודעות ל-OpenAI (בלי היסטוריה)."""
+    return prompt_builder.build(user_message, user_name, language, output_mode).messages
+
+
+@traced("openai.chat_completion")
+def complete_chat(messages: List[Dict[str, str]], language: str, output_mode: str = "tags",
+                  streaming: bool = False) -> ChatResult:
+    """
+    קריאה אחת ל-OpenAI וחילוץ הפנייה, לפי מצב הפלט:
+    json (פלט מובנה, עם נפילה לתגיות), הזרמה עם עצירה מוקדמת, או תגיות רגילות.
+    """
+    if output_mode == "json":
+        response = get_client().chat.completions.create(
+            messages=messages,
+            response_format={"type": "json_schema", "json_schema": STRUCTURED_REPLY_SCHEMA},
+            **COMPLETION_PARAMS,
+        )
+        raw = response.choices[0].message.content or ""
+        structured = parse_structured_reply(raw)
+        if structured is None:
+            log.warning("⚠️ תשובת JSON לא תקינה - משתמש בשדה reply או בפענוח כתגיות")
+            clean_response, pending_request = invalid_structured_fallback(raw, language)
+            return ChatResult(clean_response, pending_request, response.usage, True)
+        if not structured.is_request:
+            return ChatResult(structured.reply, None, response.usage, False)
+        text = with_confirmation_question(structured.reply, structured.summary, structured.language or language)
+        return ChatResult(text, structured.summary, response.usage, False)
+
+    if streaming:
+        # הזרמה - נעצרת ברגע שהפנייה הושלמה; שאלת האישור נוספת מקומית אם לא הגיעה
+        parser = stream_chat_completion(messages)
+        clean_response, pending_request = parser.result()
+        if pending_request:
+            clean_response = with_confirmation_question(clean_response, pending_request, language)
+        return ChatResult(clean_response, pending_request, parser.usage, False)
+
+    # שליחה ל-OpenAI
+    response = get_client().chat.completions.create(messages=messages, **COMPLETION_PARAMS)
+    ai_response = response.choices[0].message.content
+
+    # נתח את התשובה לחילוץ פנייה אפשרית
+    clean_response, pending_request = parse_pending_request(ai_response)
+    return ChatResult(clean_response, pending_request, response.usage, False)
+
+
+# ============================================
+# מצב רב-שלבי (היסטוריה חסומה מתוך conversation_state)
+# ============================================
+# "off" - כל הודעה עומדת בפני עצמה (ברירת מחדל);
+# "turns" - נשלחים N הסבבים האחרונים (סבב = הודעת משתמש + תשובה);
+# "tokens" - נשלחות ההודעות האחרונות שנכנסות ב-CHAT_HISTORY_TOKENS טוקנים.
+# הודעות שיוצאות מהחלון מקופלות לסיכום מתגלגל (או נמחקות, אם הסיכום כבוי),
+# כך שגם ההיסטוריה השמורה וגם ה-prompt חסומים.
+CHAT_HISTORY_MODE = getattr(config, 'CHAT_HISTORY_MODE', 'off')
+CHAT_HISTORY_TURNS = getattr(config, 'CHAT_HISTORY_TURNS', 3)
+CHAT_HISTORY_TOKENS = getattr(config, 'CHAT_HISTORY_TOKENS', 600)
+CHAT_HISTORY_SUMMARIZE = getattr(config, 'CHAT_HISTORY_SUMMARIZE', True)
+SUMMARY_MAX_TOKENS = 150
+
+SUMMARY_INSTRUCTIONS = {
+    "he": "סכם בקצרה (עד 3 משפטים) את השיחה הבאה בין משתמש לנציג, כולל בקשות ופרטים חשובים. "
+          "אם יש סיכום קודם, שלב אותו בסיכום החדש. החזר רק את הסיכום.",
+    "en": "Briefly summarize (up to 3 sentences) the following conversation between a user and an agent, "
+          "including requests and important details. Merge any previous summary. Return only the summary.",
+}
+
+
+def history_window(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """ההודעות האחרונות שנכנסות לחלון ההיסטוריה לפי CHAT_HISTORY_MODE."""
+    if CHAT_HISTORY_MODE == "turns":
+        return messages[-2 * CHAT_HISTORY_TURNS:] if CHAT_HISTORY_TURNS > 0 else []
+    if CHAT_HISTORY_MODE == "tokens":
+        window, used = [], 0
+        for message in reversed(messages):
+            used += TOKENS_PER_MESSAGE + count_tokens(message["content"])
+            if used > CHAT_HISTORY_TOKENS:
+                break
+            window.append(message)
+        window.reverse()
+        return window
+    return []
+
+
+@traced("openai.summary")
+def summarize_history(previous_summary: Optional[str], messages: List[Dict[str, str]], language: str) -> Optional[str]:
+    """מקפל הודעות ישנות לסיכום מתגלגל (קריאה קצרה ל-OpenAI). מחזיר את הסיכום הקודם בכשל."""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    if previous_summary:
+        transcript = f"summary: {previous_summary}\n{transcript}"
+    try:
+        response = get_client().chat.completions.create(
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.get(language, SUMMARY_INSTRUCTIONS["he"])},
+                {"role": "user", "content": transcript},
+            ],
+            **dict(COMPLETION_PARAMS, max_tokens=SUMMARY_MAX_TOKENS),
+        )
+        prompt_metrics.record_usage(response.usage, call="summary")
+        return (response.choices[0].message.content or "").strip() or previous_summary
+    except Exception as e:
+        log.error("❌ OpenAI Error (summary): %s", e)
+        return previous_summary
+
+
+def record_turn(phone_number: str, user_message: str, reply: str, language: str) -> None:
+    """
+    שומר את הסבב בשיחה, ומקפל הודעות שיצאו מהחלון.
+    הקיפול נעשה רק כשהחלק שמחוץ לחלון גדל לפחות כמו החלון עצמו, כך שקריאת
+    הסיכום מתבצעת פעם בכמה סבבים ולא בכל הודעה.
+    """
+    import conversation_state
+
+    conversation_state.add_message(phone_number, "user", user_message)
+    conversation_state.add_message(phone_number, "assistant", reply)
+
+    messages, summary = conversation_state.get_history(phone_number)
+    window = history_window(messages)
+    overflow = messages[:len(messages) - len(window)]
+    if len(overflow) < max(2, len(window)):
+        return
+    if CHAT_HISTORY_SUMMARIZE:
+        summary = summarize_history(summary, overflow, language)
+    conversation_state.replace_history(phone_number, window, summary)
+
+
+def save_turn(phone_number: str, user_message: str, reply: str, language: str) -> None:
+    """record_turn שלא זורק: כשל באחסון ההיסטוריה או בסיכום נרשם ללוג בלבד."""
+    try:
+        record_turn(phone_number, user_message, reply, language)
+    except Exception as e:
+        log.error("❌ History Error: %s", e, phone=phone_number, exc_info=True)
+
+
+def _schedule_turn(
+    after_reply: Optional[Callable[[Callable[[], None]], Any]],
+    phone_number: str,
+    user_message: str,
+    reply: str,
+    language: str,
+) -> None:
+    """שמירת הסבב בהיסטוריה (אם הופעלה) - דרך after_reply, או מיד אם לא ניתן."""
+    if CHAT_HISTORY_MODE == "off":
+        return
+    turn = functools.partial(save_turn, phone_number, user_message, reply, language)
+    if after_reply is not None:
+        after_reply(turn)
+    else:
+        turn()
+
+
 def chat_with_ai(
     phone_number: str, 
     user_message: str, 
     user_name: str,
-    language: str = "he"
+    language: str = "he",
+    after_reply: Optional[Callable[[Callable[[], None]], Any]] = None,
 ) -> Tuple[str, Optional[str]]:
     """
     מנהל שיחה עם המשתמש דרך OpenAI.
-    גרסה ללא היסטוריה - כל הודעה עומדת בפני עצמה.
+    כברירת מחדל ללא היסטוריה - כל הודעה עומדת בפני עצמה (ראו CHAT_HISTORY_MODE).
     
     Args:
         phone_number: מספר הטלפון של המשתמש
         user_message: ההודעה שהמשתמש שלח
         user_name: שם המשתמש
         language: שפת המשתמש (he/en)
+        after_reply: מקבל את שמירת הסבב בהיסטוריה (פונקציה בלי ארגומנטים) כדי להריץ
+            אותה אחרי שליחת התשובה; בלי after_reply השמירה מתבצעת כאן, לפני החזרה.
+            שגיאות בשמירה נרשמות ללוג ולא משפיעות על התשובה.
     
     Returns:
         (תשובה לשלוח למשתמש, פנייה לאישור או None)
     """
-    # הכן את ההודעות לשליחה ל-OpenAI (בלי היסטוריה)
-    messages = [
-        {"role": "system", "content": get_system_prompt(language)},
-        {"role": "system", "content": f"שם המשתמש: {user_name}. פנה אליו בשמו בתחילת השיחה."},
-        {"role": "user", "content": user_message}
-    ]
-    
-    try:
-        # שליחה ל-OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # מודל מהיר וזול
-            messages=messages,
-            max_tokens=500,
-            temperature=0.4
+    # הודעה טריוויאלית שכבר נענתה - הגש מהמטמון בלי קריאה ל-OpenAI
+    cache_key = None
+    if classify_trivial(user_message):
+        cache_key = (language, normalize_message(user_message))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            reply = _render_cached(cached, user_name)
+            _schedule_turn(after_reply, phone_number, user_message, reply, language)
+            return reply, None
+
+    # הכן את ההודעות לשליחה ל-OpenAI - תחילית סטטית ואז נתוני המשתמש (והיסטוריה, אם הופעלה)
+    history, summary = None, None
+    if CHAT_HISTORY_MODE != "off":
+        import conversation_state
+        stored, summary = conversation_state.get_history(phone_number)
+        history = history_window(stored)
+
+    def complete(name: str) -> ChatResult:
+        prompt = prompt_builder.build(
+            user_message, name, language, OPENAI_OUTPUT_MODE, history=history, summary=summary
         )
-        
-        ai_response = response.choices[0].message.content
-        
-        # נתח את התשובה לחילוץ פנייה אפשרית
-        clean_response, pending_request = parse_pending_request(ai_response)
-        
+        log.debug("📏 Prompt", prompt_tokens=prompt.prompt_tokens, truncated=prompt.truncated)
+        result = complete_chat(prompt.messages, language, OPENAI_OUTPUT_MODE, OPENAI_STREAMING)
+        prompt_metrics.record_usage(
+            result.usage, estimated_prompt_tokens=prompt.prompt_tokens, truncated=prompt.truncated
+        )
+        return result
+
+    try:
+        if cache_key is not None:
+            # תשובה למטמון - נוצרת עם placeholder במקום השם
+            result = complete(NAME_PLACEHOLDER)
+            if result.pending_request is None and _is_reusable_template(result.text):
+                if not result.fallback:
+                    response_cache.put(cache_key, result.text)
+                result = result._replace(text=_render_cached(result.text, user_name))
+            else:
+                # המודל שינה את ה-placeholder - תשובה רגילה עם השם האמיתי, בלי מטמון
+                result = complete(user_name)
+        else:
+            result = complete(user_name)
+        clean_response, pending_request = result.text, result.pending_request
+
         # אם יש פנייה, שמור בזיכרון הזמני
         if pending_request:
             pending_requests[phone_number] = pending_request
-        
-        return clean_response, pending_request
-        
+
     except Exception as e:
-        print(f"❌ OpenAI Error: {e}")
-        error_msg = "מצטער, יש בעיה טכנית. אנא נסה שוב." if language == "he" else "Sorry, technical issue. Please try again."
-        return error_msg, None
+        log.error("❌ OpenAI Error: %s", e, phone=phone_number)
+        return technical_error_message(language), None
+
+    _schedule_turn(after_reply, phone_number, user_message, clean_response, language)
+    return clean_response, pending_request
+
+
+# ============================================
+# זיהוי אישור / דחייה (regex אחד שנבנה פעם אחת בייבוא)
+# ============================================
+# מילים שלמות בלבד (גבולות מילה גם בעברית), אותיות חוזרות מותרות ("כןןן", "yesss"),
+# ו-ו' החיבור בתחילת מילה עברית ("ולא"). שלילה של מילת אישור ("לא נכון", "not ok")
+# נספרת כדחייה, וביטויים כמו "אין בעיה" / "no problem" נספרים כאישור.
+CONFIRM_WORDS = (
+    "כן", "אישור", "לאשר", "מאשר", "מאשרת", "מאושר", "בסדר", "אוקי", "נכון", "בטח", "בוודאי",
+    "סבבה", "יאללה", "מעולה", "להכניס", "תכניס", "תכניסי", "תגיש", "תגישי",
+    "ok", "okay", "yes", "yeah", "yep", "yup", "sure", "confirm", "confirmed", "correct",
+    "approve", "approved", "right", "submit",
+)
+CONFIRM_PHRASES = ("אין בעיה", "אין שום בעיה", "ברור", "no problem", "of course", "go ahead", "please do")
+REJECT_WORDS = (
+    "לא", "ביטול", "לבטל", "בטל", "תבטל", "תבטלי", "שגוי", "טעות",
+    "no", "nope", "nah", "cancel", "wrong", "mistake", "reject", "don't", "dont",
+)
+NEGATIONS = ("לא", "אל", "not", "no", "don't", "dont", "do not")
+CONFIRM_EMOJI = ("👍", "👌", "✅", "✔")
+REJECT_EMOJI = ("👎", "❌", "✖", "🚫")
+
+
+def _word_pattern(word: str) -> str:
+    """תבנית למילה: כל אות יכולה לחזור, ומילה עברית יכולה להתחיל ב-ו'."""
+    body = "".join(re.escape(ch) + "+" if not ch.isspace() else r"\s+" for ch in word)
+    prefix = "ו?" if "\u0590" <= word[0] <= "\u05ff" else ""
+    return prefix + body
+
+
+def _alternation(words) -> str:
+    # מילים ארוכות קודם, כדי שהחלופה הארוכה תנצח באותו מיקום
+    return "|".join(_word_pattern(word) for word in sorted(words, key=len, reverse=True))
+
+
+_CONFIRMATION_RE = re.compile(
+    r"(?<!\w)(?:"
+    rf"(?P<phrase>{_alternation(CONFIRM_PHRASES)})"
+    rf"|(?P<reject>(?:{_alternation(NEGATIONS)})\s+(?:{_alternation(CONFIRM_WORDS)})|{_alternation(REJECT_WORDS)})"
+    rf"|(?P<confirm>{_alternation(CONFIRM_WORDS)})"
+    r")(?!\w)"
+    rf"|(?P<confirm_emoji>{'|'.join(CONFIRM_EMOJI)})"
+    rf"|(?P<reject_emoji>{'|'.join(REJECT_EMOJI)})"
+)
+_MATCH_KINDS = {
+    "phrase": "confirm", "confirm": "confirm", "confirm_emoji": "confirm",
+    "reject": "reject", "reject_emoji": "reject",
+}
+
+
+def classify_confirmation(user_message: str) -> Optional[str]:
+    """
+    מסווג תשובה לשאלת האישור: "confirm", "reject", או None אם אין התאמה
+    או שיש גם אישור וגם דחייה.
+    """
+    kinds = {_MATCH_KINDS[match.lastgroup] for match in _CONFIRMATION_RE.finditer(user_message.lower())}
+    if len(kinds) == 1:
+        return kinds.pop()
+    return None
 
 
 def process_confirmation(
@@ -169,24 +756,14 @@ def process_confirmation(
     Returns:
         (הודעה לשלוח, האם אושר, טקסט הפנייה אם אושר)
     """
-    user_lower = user_message.lower().strip()
-    pending = pending_requests.get(phone_number)
-    
-    # מילות אישור
-    confirm_words_he = ["כן", "אישור", "לאשר", "בסדר", "אוקי", "ok", "yes", "נכון", "מאשר"]
-    confirm_words_en = ["yes", "confirm", "ok", "okay", "sure", "correct", "approved"]
-    
-    # מילות דחייה
-    reject_words_he = ["לא", "ביטול", "לבטל", "שגוי", "טעות", "no"]
-    reject_words_en = ["no", "cancel", "wrong", "mistake", "reject"]
-    
-    is_confirmed = any(word in user_lower for word in (confirm_words_he + confirm_words_en))
-    is_rejected = any(word in user_lower for word in (reject_words_he + reject_words_en))
+    decision = classify_confirmation(user_message)
+    is_confirmed = decision == "confirm"
+    is_rejected = decision == "reject"
+
+    # באישור - קריאה ומחיקה אטומית, כך שאישור כפול לא מגיש את הפנייה פעמיים
+    pending = pending_requests.pop(phone_number) if is_confirmed else pending_requests.get(phone_number)
     
     if is_confirmed and pending:
-        # אישור - מחק מהזיכרון
-        del pending_requests[phone_number]
-        
         if language == "he":
             return "תודה רבה! הפנייה נרשמה בהצלחה ותטופל בהקדם. 🙏\n\nאם יש משהו נוסף, אני כאן.", True, pending
         else:
@@ -194,8 +771,7 @@ def process_confirmation(
     
     elif is_rejected:
         # דחייה - מחק מהזיכרון
-        if phone_number in pending_requests:
-            del pending_requests[phone_number]
+        pending_requests.delete(phone_number)
         
         if language == "he":
             return "בסדר, הפנייה בוטלה. ספר לי שוב מה הבעיה ואנסח מחדש.", False, None
@@ -0,0 +1,104 @@
+"""
+השוואה בין זיהוי האישור/דחייה הישן (חיפוש תת-מחרוזות ברשימות מילים)
+לבין classify_confirmation (regex מקומפל עם גבולות מילה).
+
+הקורפוס מסומן: "confirm", "reject", או None (תשובה לא ברורה - צריך לשאול שוב).
+מדווח לכל מימוש: דיוק, כמה תשובות הוכרעו מקומית, כמה הוכרעו בטעות,
+וזמן ממוצע לקריאה.
+
+שימוש:
+    python bench_confirmation.py
+    python bench_confirmation.py --errors        # הדפסת כל הטעויות
+    python bench_confirmation.py --json
+"""
+import argparse
+import json
+import timeit
+from typing import Callable, Dict, Optional
+
+from ai_chat import classify_confirmation
+
+CORPUS = [
+    # אישורים
+    ("כן", "confirm"), ("כןןן", "confirm"), ("כן בבקשה", "confirm"), ("כן תודה", "confirm"),
+    ("וכן", "confirm"), ("בסדר", "confirm"), ("בסדר גמור", "confirm"), ("אוקי", "confirm"),
+    ("נכון", "confirm"), ("מאשר", "confirm"), ("מאשרת", "confirm"), ("אישור", "confirm"),
+    ("בטח", "confirm"), ("סבבה", "confirm"), ("יאללה", "confirm"), ("אין בעיה", "confirm"),
+    ("תכניס בבקשה", "confirm"), ("מעולה תודה", "confirm"), ("👍", "confirm"), ("👍🏼", "confirm"),
+    ("✅", "confirm"), ("כן 👍", "confirm"), ("yes", "confirm"), ("Yes!", "confirm"),
+    ("yesss", "confirm"), ("ok", "confirm"), ("okay", "confirm"), ("sure", "confirm"),
+    ("correct", "confirm"), ("yes please", "confirm"), ("no problem", "confirm"), ("of course", "confirm"),
+    ("go ahead", "confirm"), ("yep", "confirm"), ("confirmed", "confirm"), ("👌", "confirm"),
+    # דחיות
+    ("לא", "reject"), ("לאאא", "reject"), ("לא תודה", "reject"), ("ולא", "reject"),
+    ("ביטול", "reject"), ("לבטל", "reject"), ("תבטל", "reject"), ("טעות", "reject"),
+    ("לא נכון", "reject"), ("לא בסדר", "reject"), ("אל תכניס", "reject"), ("שגוי", "reject"),
+    ("👎", "reject"), ("❌", "reject"), ("no", "reject"), ("nope", "reject"), ("cancel", "reject"),
+    ("wrong", "reject"), ("not correct", "reject"), ("not ok", "reject"), ("don't submit", "reject"),
+    ("No thanks", "reject"),
+    # לא ברור - צריך לשאול שוב
+    ("כנראה", None), ("הלאה", None), ("מכונית", None), ("אני לא יודע... כן?", None),
+    ("I know", None), ("book a taxi", None), ("token", None), ("canceled flight tomorrow", None),
+    ("מה?", None), ("רגע", None), ("כן לא", None), ("נו", None), ("מתי זה יטופל", None),
+    ("i'm not sure", None), ("hmm", None),
+]
+
+# המימוש הקודם ב-process_confirmation
+_LEGACY_CONFIRM = ["כן", "אישור", "לאשר", "בסדר", "אוקי", "ok", "yes", "נכון", "מאשר",
+                   "yes", "confirm", "ok", "okay", "sure", "correct", "approved"]
+_LEGACY_REJECT = ["לא", "ביטול", "לבטל", "שגוי", "טעות", "no", "no", "cancel", "wrong", "mistake", "reject"]
+
+
+def legacy_classify(user_message: str) -> Optional[str]:
+    user_lower = user_message.lower().strip()
+    if any(word in user_lower for word in _LEGACY_CONFIRM):
+        return "confirm"  # בקוד הישן אישור גובר כשיש פנייה ממתינה
+    if any(word in user_lower for word in _LEGACY_REJECT):
+        return "reject"
+    return None
+
+
+def evaluate(name: str, classify: Callable[[str], Optional[str]], show_errors: bool) -> Dict:
+    correct = decided = wrong_decisions = 0
+    for text, expected in CORPUS:
+        actual = classify(text)
+        correct += actual == expected
+        decided += actual is not None
+        if actual is not None and actual != expected:
+            wrong_decisions += 1
+        if show_errors and actual != expected:
+            print(f"  {name}: {text!r} -> {actual} (expected {expected})")
+
+    runs = 200
+    seconds = timeit.timeit(lambda: [classify(text) for text, _ in CORPUS], number=runs)
+    return {
+        "matcher": name,
+        "accuracy": round(correct / len(CORPUS), 3),
+        "decided_locally": decided,
+        "wrong_decisions": wrong_decisions,
+        "us_per_call": round(seconds / (runs * len(CORPUS)) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--errors", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = [
+        evaluate("legacy", legacy_classify, args.errors),
+        evaluate("regex", classify_confirmation, args.errors),
+    ]
+    if args.json:
+        print(json.dumps({"corpus_size": len(CORPUS), "results": reports}, indent=2))
+        return
+    print(f"corpus: {len(CORPUS)} labelled replies")
+    for report in reports:
+        print(f"{report['matcher']:>8}: accuracy {report['accuracy']:.1%}, "
+              f"decided locally {report['decided_locally']}, wrong decisions {report['wrong_decisions']}, "
+              f"{report['us_per_call']}us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+השוואה בין שני מצבי חילוץ הפנייה ב-ai_chat: תגיות [PENDING_REQUEST] מול פלט JSON מובנה.
+
+כל הודעה בקורפוס מסומנת אם היא בקשה או לא, ונשלחת ל-OpenAI בכל מצב.
+מדווח לכל מצב: טוקנים (prompt/completion), זמן תגובה (p50/p95), דיוק הזיהוי,
+ו"שיעור ניסיון חוזר" - בקשות שלא חולצו מהן פנייה (המשתמש היה צריך לשלוח שוב),
+וכמה תשובות JSON נפלו חזרה לפענוח תגיות.
+
+דורש OPENAI_API_KEY (אפשר להפנות לשרת אחר עם OPENAI_BASE_URL).
+
+שימוש:
+    python bench_extraction.py
+    python bench_extraction.py --repeat 3 --json > extraction.json
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from ai_chat import build_messages, complete_chat
+
+# (הודעה, שפה, האם זו בקשה)
+CORPUS = [
+    ("היי", "he", False),
+    ("מה אתה עושה?", "he", False),
+    ("תודה רבה!", "he", False),
+    ("שלום, יש לי בעיה עם הניקיון בחדר המדרגות", "he", True),
+    ("אני צריך עזרה בתשלום חשבון החשמל החודש", "he", True),
+    ("היי, המזגן בדירה לא עובד כבר שבוע", "he", True),
+    ("אפשר לקבל סל מזון לשבת?", "he", True),
+    ("בוקר טוב, רציתי לבקש הסעה לבית החולים ביום שלישי", "he", True),
+    ("Hi", "en", False),
+    ("Thanks, great", "en", False),
+    ("Hello, the elevator in my building is broken", "en", True),
+    ("I need help paying for my son's school books", "en", True),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_mode(mode: str, repeat: int) -> Dict[str, Any]:
+    latencies, prompt_tokens, completion_tokens = [], [], []
+    correct = missed_requests = false_requests = fallbacks = errors = 0
+    total = 0
+
+    for _ in range(repeat):
+        for text, language, is_request in CORPUS:
+            total += 1
+            messages = build_messages(text, "דני", language, mode)
+            start = time.perf_counter()
+            try:
+                result = complete_chat(messages, language, mode)
+            except Exception as e:
+                errors += 1
+                print(f"❌ {mode}: {e}")
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if result.usage is not None:
+                prompt_tokens.append(result.usage.prompt_tokens)
+                completion_tokens.append(result.usage.completion_tokens)
+            fallbacks += result.fallback
+
+            detected = result.pending_request is not None
+            if detected == is_request:
+                correct += 1
+            elif is_request:
+                missed_requests += 1
+            else:
+                false_requests += 1
+
+    requests_sent = sum(1 for _, _, is_request in CORPUS if is_request) * repeat
+    return {
+        "mode": mode,
+        "calls": total,
+        "errors": errors,
+        "latency_ms_p50": round(percentile(latencies, 50), 1) if latencies else None,
+        "latency_ms_p95": round(percentile(latencies, 95), 1) if latencies else None,
+        "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1) if prompt_tokens else None,
+        "completion_tokens_mean": round(statistics.mean(completion_tokens), 1) if completion_tokens else None,
+        "accuracy": round(correct / total, 3) if total else None,
+        "retry_rate": round(missed_requests / requests_sent, 3) if requests_sent else None,
+        "false_requests": false_requests,
+        "json_fallbacks": fallbacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["tags", "json"], choices=["tags", "json"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="פלט JSON (להשוואה בין ריצות)")
+    args = parser.parse_args()
+
+    reports = [run_mode(mode, args.repeat) for mode in args.modes]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    columns = ["mode", "calls", "latency_ms_p50", "latency_ms_p95", "prompt_tokens_mean",
+               "completion_tokens_mean", "accuracy", "retry_rate", "false_requests", "json_fallbacks"]
+    print("  ".join(f"{column:>22}" for column in columns))
+    for report in reports:
+        print("  ".join(f"{str(report[column]):>22}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
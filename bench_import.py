@@ -0,0 +1,107 @@
+"""
+מדידת מהירות נרמול המספרים בייבוא חברים: normalize_phone_relaxed (מספר אחד
+בכל קריאה, עם try/except) מול normalize_phones (מעבר אחד על כל הרשימה),
+וזמן import_members המלא על אותה טבלה.
+
+המספרים הסינתטיים מגיעים בכל הפורמטים שמופיעים ביצוא (05X-XXX-XXXX, 972...,
++972..., בלי 0, עם רווחים/סוגריים), עם אחוז מספרים לא תקינים וכפולים.
+הבדיקה מוודאת שהתוצאות של שני המימושים זהות.
+
+שימוש:
+    python bench_import.py
+    python bench_import.py --members 100000 --duplicate-rate 0.05 --json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from member_import import import_members
+from whatsApp import normalize_phone_relaxed, normalize_phones
+
+FORMATS = [
+    lambda n: f"0{n[:2]}-{n[2:5]}-{n[5:]}",
+    lambda n: f"0{n}",
+    lambda n: f"972{n}",
+    lambda n: f"+972{n}",
+    lambda n: f"+972 {n[:2]} {n[2:5]} {n[5:]}",
+    lambda n: f"({n[:3]}) {n[3:]}",
+    lambda n: n,
+]
+INVALID = ["", "12345", "+1 415 555 0100", "05-12", "972", "טלפון", "0000000000000"]
+
+
+def generate_phones(count: int, invalid_rate: float, duplicate_rate: float, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    phones: List[str] = []
+    for _ in range(count):
+        roll = rnd.random()
+        if phones and roll < duplicate_rate:
+            phones.append(rnd.choice(phones))
+        elif roll < duplicate_rate + invalid_rate:
+            phones.append(rnd.choice(INVALID))
+        else:
+            number = "5" + "".join(rnd.choice("0123456789") for _ in range(8))
+            phones.append(rnd.choice(FORMATS)(number))
+    return phones
+
+
+def scalar_normalize(raws: List[str]) -> List[Optional[str]]:
+    results: List[Optional[str]] = []
+    for raw in raws:
+        try:
+            results.append(normalize_phone_relaxed(raw))
+        except ValueError:
+            results.append(None)
+    return results
+
+
+def measure(fn: Callable[[], object], runs: int) -> float:
+    """הזמן הטוב ביותר (שניות) מתוך runs הרצות."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--invalid-rate", type=float, default=0.02)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    phones = generate_phones(args.members, args.invalid_rate, args.duplicate_rate, args.seed)
+    if scalar_normalize(phones) != normalize_phones(phones):
+        raise SystemExit("❌ normalize_phones לא תואם ל-normalize_phone_relaxed")
+
+    rows = [[f"חבר {i}", phone, "he"] for i, phone in enumerate(phones)]
+    timings: Dict[str, float] = {
+        "scalar": measure(lambda: scalar_normalize(phones), args.runs),
+        "batch": measure(lambda: normalize_phones(phones), args.runs),
+        "import_members": measure(lambda: import_members(["name", "phone", "language"], rows), args.runs),
+    }
+    report = {
+        "members": len(phones),
+        "valid": sum(phone is not None for phone in normalize_phones(phones)),
+        "numbers_per_s": {name: round(len(phones) / seconds) for name, seconds in timings.items()},
+        "speedup": round(timings["scalar"] / timings["batch"], 2),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print(f"{len(phones)} מספרים ({report['valid']} תקינים)")
+    for name, rate in report["numbers_per_s"].items():
+        print(f"  {name:<15} {rate:>12,} מספרים/שנייה")
+    print(f"  האצה: x{report['speedup']}")
+
+
+if __name__ == "__main__":
+    main()
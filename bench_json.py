@@ -0,0 +1,142 @@
+"""
+מיקרו-בנצ'מרק לקידוד JSON על מטענים אמיתיים של הבוט: הקוד הקודם (json של
+הספרייה הסטנדרטית כפי שנקרא בכל מקום - ensure_ascii, indent=2 בקובץ השיחות,
+json= של requests) מול json_codec בכל backend זמין (stdlib, orjson).
+
+מטענים:
+    webhook       - גוף Webhook של WhatsApp עם הודעת טקסט בעברית (loads בכל הפעלה)
+    send_text     - גוף שליחת הודעה ל-Graph API (dumps בכל שליחה)
+    conversation  - שיחה עם 20 הודעות (שורה ב-SQLite / ביומן)
+    conversations - קובץ שיחות של 200 משתמשים (ה-backend הישן; הקוד הקודם עם indent=2)
+    users         - מאגר 10,000 משתמשים בפורמט compact (טעינה ב-cold start)
+
+שימוש:
+    python bench_json.py
+    python bench_json.py --json
+"""
+import argparse
+import json
+import timeit
+from typing import Any, Callable, Dict
+
+import json_codec
+
+WEBHOOK = {
+    "object": "whatsapp_business_account",
+    "entry": [{
+        "id": "102290129340398",
+        "changes": [{
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                "contacts": [{"profile": {"name": "ישראל ישראלי"}, "wa_id": "972501234567"}],
+                "messages": [{
+                    "from": "972501234567",
+                    "id": "wamid.HBgMOTcyNTAxMjM0NTY3FQIAEhgUM0VCMDRBRjlFQkQ1NjZGNjM1OTQA",
+                    "timestamp": "1718000000",
+                    "text": {"body": "שלום, הברז במטבח דולף כבר יומיים ואשמח שמישהו יגיע לתקן אותו השבוע"},
+                    "type": "text",
+                }],
+            },
+            "field": "messages",
+        }],
+    }],
+}
+
+SEND_TEXT = {
+    "messaging_product": "whatsapp",
+    "to": "+972501234567",
+    "text": {"body": "הבנתי שהברז במטבח דולף. האם לרשום את הפנייה לטיפול? (כן/לא)"},
+}
+
+CONVERSATION = {
+    "messages": [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"הודעה מספר {i} בשיחה - הברז במטבח דולף ואשמח לעזרה בהקדם"}
+        for i in range(20)
+    ],
+    "state": "chatting",
+    "pending_request": None,
+    "summary": "המשתמש דיווח על ברז דולף במטבח וביקש טכנאי השבוע.",
+    "last_activity": "2024-06-10T12:00:00",
+    "created_at": "2024-06-10T11:45:00",
+}
+
+CONVERSATIONS = {f"9725012{i:05d}": CONVERSATION for i in range(200)}
+
+USERS = {
+    "format": "compact-v1",
+    "fields": ["name", "language"],
+    "rows": [[f"+9725012{i:05d}", f"חבר {i}", "he" if i % 3 else "en"] for i in range(10000)],
+}
+
+PAYLOADS = {
+    "webhook": WEBHOOK,
+    "send_text": SEND_TEXT,
+    "conversation": CONVERSATION,
+    "conversations": CONVERSATIONS,
+    "users": USERS,
+}
+
+
+def legacy_dumps(name: str) -> Callable[[Any], Any]:
+    if name == "conversations":
+        return lambda obj: json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    if name == "users":
+        return lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if name == "send_text":
+        # requests(json=...) - ensure_ascii, ואז קידוד לבתים
+        return lambda obj: json.dumps(obj, allow_nan=False).encode("utf-8")
+    return lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def measure(fn: Callable[[], Any]) -> float:
+    """מיקרו-שניות לקריאה (הטוב מבין 5 סבבים)."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def run() -> Dict[str, Dict[str, Any]]:
+    report: Dict[str, Dict[str, Any]] = {}
+    for name, payload in PAYLOADS.items():
+        legacy = legacy_dumps(name)
+        legacy_body = legacy(payload)
+        results: Dict[str, Any] = {
+            "legacy": {
+                "bytes": len(legacy_body),
+                "dumps_us": round(measure(lambda: legacy(payload)), 2),
+                "loads_us": round(measure(lambda: json.loads(legacy_body)), 2),
+            }
+        }
+        for backend, (dumps, loads) in json_codec.BACKENDS.items():
+            body = dumps(payload)
+            if loads(body) != json.loads(legacy_body):
+                raise SystemExit(f"❌ {backend}: תוצאה שונה עבור {name}")
+            results[backend] = {
+                "bytes": len(body),
+                "dumps_us": round(measure(lambda: dumps(payload)), 2),
+                "loads_us": round(measure(lambda: loads(body)), 2),
+            }
+        report[name] = results
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = run()
+    if args.json:
+        print(json.dumps({"active_backend": json_codec.BACKEND, "payloads": report}, indent=2, ensure_ascii=False))
+        return
+    print(f"backend פעיל: {json_codec.BACKEND}")
+    print(f"{'payload':<14} {'codec':<8} {'bytes':>9} {'dumps µs':>11} {'loads µs':>11}")
+    for name, results in report.items():
+        for codec, row in results.items():
+            print(f"{name:<14} {codec:<8} {row['bytes']:>9,} {row['dumps_us']:>11,.2f} {row['loads_us']:>11,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+בדיקת עומס מקומית ל-lambda_handler, בלי רשת חיצונית.
+
+מריץ תעבורת Webhook סינתטית (או מוקלטת) דרך lambda_handler, מול שרתי דמה
+מקומיים ל-graph.facebook.com, ל-OpenAI ול-Apps Script (stub_servers), עם
+השהיות ושיעורי שגיאה שניתן להגדיר. מדווח זמני p50/p95/p99 לכל שלב,
+תפוקה, מדדי ה-prompt (prompt_metrics: טוקנים משוערים ומדווחים, חלק ה-cache)
+ושיא זיכרון (RSS) כ-JSON, כדי להשוות בין commits.
+
+שלבים שנמדדים:
+    handler        - קריאה שלמה ל-lambda_handler
+    member_lookup  - זיהוי המשתמש (check_user_in_sheets)
+    openai         - קריאה ל-OpenAI (complete_chat)
+    graph_send     - שליחה ל-WhatsApp (_post)
+    sheets_write   - שליחת מנה לגיליון
+
+שימוש:
+    python bench_load.py --events 300 --users 100 --concurrency 4 --output before.json
+    python bench_load.py --burst 5 --duplicate-rate 0.1 --openai-latency lognormal:800,0.5
+    python bench_load.py --replay recorded_webhooks.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "bench-dummy-key")
+
+DEFAULT_MIX = "greeting=0.15,role=0.05,request=0.45,confirm=0.15,reject=0.05,free=0.05,media=0.10"
+
+GREETINGS = ["היי", "שלום", "בוקר טוב", "hi", "hello"]
+ROLE_QUESTIONS = ["מה אתה עושה?", "מי אתה", "what do you do?"]
+REQUESTS = [
+    "יש לי בעיה עם הניקיון בחדר המדרגות",
+    "המזגן בדירה לא עובד כבר שבוע",
+    "אני צריך עזרה בתשלום חשבון החשמל",
+    "אפשר לקבל סל מזון לשבת?",
+    "The elevator in my building is broken again",
+    "I need a ride to the hospital on Tuesday",
+]
+CONFIRMATIONS = ["כן", "כן בבקשה", "👍", "yes", "אישור"]
+REJECTIONS = ["לא", "ביטול", "no"]
+FREE_TEXT = ["מתי זה יטופל?", "תודה רבה", "רגע", "thanks"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "mean_ms": round(sum(values) / len(values), 2),
+        "max_ms": round(max(values), 2),
+    }
+
+
+class StageTimer:
+    """אוסף זמני ביצוע (מילישניות) לפי שלב, בטוח לשימוש מכמה threads."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(elapsed_ms)
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, (time.perf_counter() - start) * 1000)
+        return timed
+
+    def report(self) -> Dict[str, Any]:
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class TrafficGenerator:
+    """יוצר גופי Webhook סינתטיים לפי תמהיל הודעות, גודל מנה ושיעור כפילויות."""
+
+    def __init__(self, users: List[str], mix: Dict[str, float], burst: int, duplicate_rate: float, rng: random.Random):
+        self.users = users
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.burst = burst
+        self.duplicate_rate = duplicate_rate
+        self.rng = rng
+        self._sent: List[str] = []
+        self._counter = 0
+
+    def _message(self, sender: str, timestamp: int) -> Dict[str, Any]:
+        self._counter += 1
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        message = {"from": sender, "id": f"wamid.bench{self._counter}", "timestamp": str(timestamp)}
+        if kind == "media":
+            message.update({"type": "image", "image": {"id": f"media{self._counter}"}})
+            return message
+        text = self.rng.choice({
+            "greeting": GREETINGS, "role": ROLE_QUESTIONS, "request": REQUESTS,
+            "confirm": CONFIRMATIONS, "reject": REJECTIONS,
+        }.get(kind, FREE_TEXT))
+        message.update({"type": "text", "text": {"body": text}})
+        return message
+
+    def next_body(self) -> str:
+        if self._sent and self.rng.random() < self.duplicate_rate:
+            # WhatsApp שולח שוב אירוע שלא אושר בזמן - אותו גוף ואותם מזהים
+            return self.rng.choice(self._sent)
+        timestamp = int(time.time())
+        messages = [self._message(self.rng.choice(self.users), timestamp + i) for i in range(self.burst)]
+        body = json.dumps({
+            "object": "whatsapp_business_account",
+            "entry": [{"changes": [{"field": "messages", "value": {
+                "messaging_product": "whatsapp",
+                "messages": messages,
+            }}]}],
+        }, ensure_ascii=False)
+        self._sent.append(body)
+        return body
+
+
+def load_replay(path: str) -> List[str]:
+    """קובץ JSONL: כל שורה היא גוף Webhook, או אירוע API Gateway עם body."""
+    bodies = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            body = record.get("body", record) if isinstance(record, dict) and "httpMethod" in record else record
+            bodies.append(body if isinstance(body, str) else json.dumps(body, ensure_ascii=False))
+    return bodies
+
+
+def git_commit() -> Any:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    from stub_servers import AppsScriptStub, GraphStub, OpenAIStub, parse_latency
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # גם ההשהיות בשרתי הדמה
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+
+    graph = GraphStub(latency=parse_latency(args.graph_latency), error_rate=args.graph_error_rate, record=False)
+    openai_stub = OpenAIStub(latency=parse_latency(args.openai_latency), error_rate=args.openai_error_rate,
+                             record=False)
+    sheets = AppsScriptStub(latency=parse_latency(args.sheets_latency), error_rate=args.sheets_error_rate,
+                            record=False)
+
+    users = [f"97250{1000000 + i}" for i in range(args.users)]
+    registered = users[:int(len(users) * args.registered)]
+    members = {phone: {"name": f"משתמש {i}", "language": "he"} for i, phone in enumerate(registered)}
+    sheets.members = members
+
+    timer = StageTimer()
+    with graph, openai_stub, sheets, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import ai_chat
+        import google_sheets_utils
+        import lambda_function
+        import whatsApp
+        from dedup import MessageDeduplicator
+        from local_storage import UserDirectory, save_users_compact
+        from openai import OpenAI
+        from pending_store import InMemoryPendingStore
+        from prompt_builder import prompt_metrics
+
+        # הפניית כל השירותים לשרתי הדמה ואיפוס מצב בין ריצות
+        users_path = os.path.join(workdir, "users.json")
+        save_users_compact(members, users_path)
+        whatsApp.API_URL = graph.messages_url()
+        whatsApp._session = None
+        ai_chat._client = OpenAI(api_key="bench", base_url=openai_stub.base_url, max_retries=args.openai_retries)
+        ai_chat.pending_requests = InMemoryPendingStore()
+        ai_chat.response_cache = ai_chat.ResponseCache()
+        google_sheets_utils.APPS_SCRIPT_URL = sheets.url
+        google_sheets_utils._write_queue = google_sheets_utils.SheetsWriteQueue(
+            url=sheets.url, spool_path=os.path.join(workdir, "sheets_spool.jsonl"),
+            batch_size=20,  # ה-stub מקבל רשימת rows
+        )
+        google_sheets_utils._member_resolver = google_sheets_utils.MemberResolver(
+            url=sheets.url,
+            local_directory=UserDirectory(users_path),
+            sync_path=os.path.join(workdir, "members_sync.json"),
+            sheets_lookup=True,  # ה-stub תומך ב-read_users / read_user
+        )
+        lambda_function.processed_messages = MessageDeduplicator()
+        prompt_metrics.reset()
+        lambda_function.WEBHOOK_MODE = "sync"
+
+        # מדידת שלבים
+        lambda_function.check_user_in_sheets = timer.wrap("member_lookup", lambda_function.check_user_in_sheets)
+        ai_chat.complete_chat = timer.wrap("openai", ai_chat.complete_chat)
+        whatsApp._post = timer.wrap("graph_send", whatsApp._post)
+        queue = google_sheets_utils._write_queue
+        queue._post_batch = timer.wrap("sheets_write", queue._post_batch)
+        handler = timer.wrap("handler", lambda_function.lambda_handler)
+
+        if args.replay:
+            bodies = load_replay(args.replay)
+        else:
+            generator = TrafficGenerator(users, parse_mix(args.mix), args.burst, args.duplicate_rate, rng)
+            bodies = [generator.next_body() for _ in range(args.events)]
+        message_count = sum(
+            len(change["value"].get("messages", []))
+            for body in bodies
+            for entry in json.loads(body).get("entry", [])
+            for change in entry.get("changes", [])
+        )
+
+        status_counts: Dict[str, int] = {}
+        counts_lock = threading.Lock()
+
+        def send(body: str) -> None:
+            response = handler({"httpMethod": "POST", "body": body}, None)
+            key = f"{response['statusCode']} {response['body']}"
+            with counts_lock:
+                status_counts[key] = status_counts.get(key, 0) + 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(send, bodies))
+        google_sheets_utils.flush_sheet_writes()
+        duration = time.perf_counter() - start
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss_kb /= 1024  # ב-macOS הערך בבתים
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "events": len(bodies),
+        "messages": message_count,
+        "duration_s": round(duration, 3),
+        "throughput": {
+            "events_per_s": round(len(bodies) / duration, 2),
+            "messages_per_s": round(message_count / duration, 2),
+        },
+        "responses": dict(sorted(status_counts.items())),
+        "stages": timer.report(),
+        "prompt": prompt_metrics.snapshot(),
+        "stubs": {
+            name: {"requests": stub.request_count, "injected_errors": stub.error_count}
+            for name, stub in (("graph", graph), ("openai", openai_stub), ("apps_script", sheets))
+        },
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200, help="מספר אירועי Webhook")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--registered", type=float, default=0.8, help="חלק המשתמשים הרשומים")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="תמהיל סוגי הודעות (משקלות)")
+    parser.add_argument("--burst", type=int, default=1, help="מספר הודעות בכל אירוע")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="שיעור אירועים שנשלחים שוב")
+    parser.add_argument("--concurrency", type=int, default=4, help="קריאות handler במקביל")
+    parser.add_argument("--replay", help="קובץ JSONL של גופי Webhook מוקלטים (במקום תעבורה סינתטית)")
+    parser.add_argument("--graph-latency", default="lognormal:40,0.3")
+    parser.add_argument("--openai-latency", default="lognormal:300,0.4")
+    parser.add_argument("--sheets-latency", default="lognormal:150,0.3")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-retries", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="קובץ לכתיבת הדו\"ח (ברירת מחדל: stdout)")
+    args = parser.parse_args()
+
+    report = run(args)
+    data = json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,4 +24,119 @@ DEBUG = True
 # Instructions:
 # 1. Copy this file: cp config_template.py config.py
 # 2. Update config.py with your actual API credentials
-# 3. Never commit config.py to git (it's in .gitignore)
\ No newline at end of file
+# 3. Never commit config.py to git (it's in .gitignore)
+
+# Conversation State Storage
+# "sqlite" (default, per-user rows in a WAL database) or "json" (legacy single file)
+CONVERSATION_BACKEND = "sqlite"
+# Writable directory for local data files (defaults to /tmp on Lambda)
+# DATA_DIR = "/tmp"
+# CONVERSATIONS_DB = "/tmp/conversations.db"
+# Write-behind cache: flush dirty conversations every N changes or X seconds
+CONVERSATION_FLUSH_BATCH_SIZE = 50
+CONVERSATION_FLUSH_INTERVAL_SECONDS = 5.0
+# Journal backend (CONVERSATION_BACKEND = "journal"): compact after N tail records
+JOURNAL_COMPACT_EVERY = 1000
+
+# WhatsApp Cloud API HTTP client (pooled keep-alive session)
+WHATSAPP_POOL_SIZE = 10
+WHATSAPP_MAX_RETRIES = 2
+WHATSAPP_BACKOFF_FACTOR = 0.3
+
+# Outbound dispatcher (concurrent WhatsApp / Sheets sends)
+OUTBOUND_MAX_WORKERS = 8
+OUTBOUND_WAIT_TIMEOUT = 30
+
+# Google Sheets write queue. Rows per request: keep 1 until the Apps Script handles a
+# "rows" list in write_structured (the current script only reads name/inquiry/phone and
+# answers 200 anyway, so the other rows of a batch are lost)
+SHEETS_BATCH_SIZE = 1
+SHEETS_FLUSH_INTERVAL = 2.0
+SHEETS_MAX_RETRIES = 3
+SHEETS_BACKOFF_SECONDS = 0.5
+# SHEETS_SPOOL_FILE = "/tmp/sheets_spool.jsonl"
+
+# Webhook message de-duplication
+DEDUP_MAX_SIZE = 10000
+DEDUP_TTL_SECONDS = 86400
+# "memory" or "sqlite" (durable across cold starts)
+DEDUP_BACKEND = "memory"
+# DEDUP_DB = "/tmp/processed_messages.db"
+
+# Webhook batches: number of senders processed in parallel
+SENDER_MAX_WORKERS = 4
+# Merge a sender's consecutive messages that are at most N seconds apart into one AI call (0 = off)
+COALESCE_WINDOW_SECONDS = 5
+
+# Cached replies for greetings / "what do you do?" (served without an OpenAI call)
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL_SECONDS = 3600
+
+# Webhook mode: "sync" (process before replying 200) or "deferred"
+# (enqueue and reply immediately; worker_handler drains the queue).
+# Deferred needs a queue every container sees: "sqs" (boto3 + EVENT_QUEUE_URL, with a
+# redrive policy maxReceiveCount = EVENT_MAX_ATTEMPTS), or "sqlite" on shared storage (EFS)
+# with EVENT_QUEUE_DB_SHARED = True. Otherwise the webhook falls back to sync processing.
+WEBHOOK_MODE = "sync"
+WORKER_BATCH_SIZE = 10
+EVENT_QUEUE_BACKEND = "sqlite"
+# EVENT_QUEUE_URL = "https://sqs.<region>.amazonaws.com/<account>/<queue>"
+# EVENT_QUEUE_DB = "/tmp/event_queue.db"
+EVENT_QUEUE_DB_SHARED = False
+EVENT_LEASE_SECONDS = 120
+EVENT_MAX_ATTEMPTS = 5
+EVENT_RETRY_BACKOFF_SECONDS = 5
+
+# Registered users directory (legacy dict or compact format, reloaded when mtime changes)
+# USERS_FILE = "users.json"
+USERS_RELOAD_CHECK_SECONDS = 5
+USERS_NEGATIVE_TTL_SECONDS = 60
+
+# Member lookups: in-memory cache -> local users file -> Apps Script sheet
+# (Apps Script should answer "read_user" and "read_users" - the latter lets the whole list sync in one call)
+MEMBER_CACHE_SIZE = 5000
+MEMBER_CACHE_TTL_SECONDS = 600
+MEMBER_NEGATIVE_TTL_SECONDS = 120
+MEMBER_ERROR_TTL_SECONDS = 30
+# Look up numbers missing from users.json in the sheet (needs read_users/read_user in the Apps Script)
+MEMBER_SHEETS_LOOKUP = False
+MEMBER_SYNC_INTERVAL_SECONDS = 900
+# MEMBERS_SYNC_FILE = "/tmp/members_sync.json"
+
+# Stream OpenAI replies and stop as soon as [/PENDING_REQUEST] arrives
+# (the confirmation question is then added locally)
+OPENAI_STREAMING = False
+
+# Request extraction: "tags" ([PENDING_REQUEST] markers) or "json" (structured output,
+# falls back to tag parsing when the JSON does not validate; streaming is not used in this mode)
+OPENAI_OUTPUT_MODE = "tags"
+
+# Prompt assembly: per-call prompt token budget (counted locally; tiktoken is optional)
+PROMPT_TOKEN_BUDGET = 2000
+TOKENIZER_ENCODING = "o200k_base"
+
+# Multi-turn chat: "off", "turns" (last CHAT_HISTORY_TURNS user/assistant pairs) or
+# "tokens" (newest messages within CHAT_HISTORY_TOKENS); older turns are folded into a rolling summary
+CHAT_HISTORY_MODE = "off"
+CHAT_HISTORY_TURNS = 3
+CHAT_HISTORY_TOKENS = 600
+CHAT_HISTORY_SUMMARIZE = True
+
+# Requests waiting for confirmation: "memory" (per container), "sqlite" or "redis" (uses REDIS_* above)
+PENDING_STORE = "memory"
+# PENDING_DB = "/tmp/pending_requests.db"
+PENDING_TTL_SECONDS = 3600
+
+# Per-invocation tracing (span tree per webhook); slow invocations are logged with their tree
+TRACING_ENABLED = False
+TRACE_SLOW_THRESHOLD_MS = 3000
+TRACE_LOG_ALL = False
+
+# Structured logging (one JSON line per record): minimum level, per-level sampling
+# (e.g. {"DEBUG": 0.01, "INFO": 0.2}; unlisted levels are always kept) and phone masking
+LOG_LEVEL = "INFO"
+LOG_SAMPLE_RATES = {}
+LOG_MASK_PHONES = True
+
+# JSON codec: "auto" (orjson when installed, else the standard library), "orjson" or "stdlib"
+JSON_BACKEND = "auto"
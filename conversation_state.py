@@ -1,88 +1,595 @@
 """
 מודול לניהול מצב השיחות עם המשתמשים.
-שומר את היסטוריית השיחה והמצב הנוכחי לכל משתמש בקובץ JSON.
+שומר את היסטוריית השיחה והמצב הנוכחי לכל משתמש.
+
+השיחות הפעילות מוחזקות במטמון בזיכרון (ConversationCache) ונכתבות
+ל-backend במנות, כך שב-container חם רוב הקריאות לא נוגעות בדיסק.
+
+האחסון עצמו מופרד ל-backend נפרד (ברירת מחדל: SQLite במצב WAL עם מפתח לפי
+מספר טלפון), כך שכל פעולה קוראת וכותבת רק את השיחה של המשתמש הרלוונטי
+במקום לטעון ולשכתב את כל הקובץ.
 """
-import json
+import atexit
+import copy
+import heapq
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+import config
+import json_codec
+from local_storage import DATA_DIR
+from structured_log import get_logger
+
+log = get_logger("conversation_state")
 
 # זמן תפוגה לשיחה (בדקות)
 CONVERSATION_TIMEOUT_MINUTES = 30
 
-# נתיב לקובץ השיחות
+# מטמון בזיכרון: כתיבה ל-backend במנות של עד N שיחות או לפחות פעם ב-X שניות
+CONVERSATION_FLUSH_BATCH_SIZE = getattr(config, 'CONVERSATION_FLUSH_BATCH_SIZE', 50)
+CONVERSATION_FLUSH_INTERVAL_SECONDS = getattr(config, 'CONVERSATION_FLUSH_INTERVAL_SECONDS', 5.0)
+
+# נתיב לקובץ השיחות (פורמט JSON הישן - משמש גם למיגרציה חד-פעמית ל-SQLite)
 CONVERSATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'conversations.json')
 
+# סוג האחסון: "sqlite" (ברירת מחדל), "journal" (יומן שורות + snapshot) או "json" (הקובץ הישן)
+CONVERSATION_BACKEND = getattr(config, 'CONVERSATION_BACKEND', 'sqlite')
+
+# נתיב למסד SQLite של השיחות
+CONVERSATIONS_DB = getattr(config, 'CONVERSATIONS_DB', os.path.join(DATA_DIR, 'conversations.db'))
+
+# נתיבים לאחסון מבוסס יומן, ומספר הרשומות בזנב היומן שאחריו מתבצעת דחיסה
+CONVERSATIONS_JOURNAL = getattr(config, 'CONVERSATIONS_JOURNAL', os.path.join(DATA_DIR, 'conversations.journal.jsonl'))
+CONVERSATIONS_SNAPSHOT = getattr(config, 'CONVERSATIONS_SNAPSHOT', os.path.join(DATA_DIR, 'conversations.snapshot.json'))
+JOURNAL_COMPACT_EVERY = getattr(config, 'JOURNAL_COMPACT_EVERY', 1000)
+
+
+def _serialize_conversation(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """ממיר datetime למחרוזות לפני שמירה."""
+    conv_copy = conv.copy()
+    if isinstance(conv_copy.get("last_activity"), datetime):
+        conv_copy["last_activity"] = conv_copy["last_activity"].isoformat()
+    if isinstance(conv_copy.get("created_at"), datetime):
+        conv_copy["created_at"] = conv_copy["created_at"].isoformat()
+    return conv_copy
+
+
+def _deserialize_conversation(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """ממיר מחרוזות תאריך לאובייקטי datetime."""
+    if conv.get("last_activity"):
+        conv["last_activity"] = datetime.fromisoformat(conv["last_activity"])
+    if conv.get("created_at"):
+        conv["created_at"] = datetime.fromisoformat(conv["created_at"])
+    return conv
+
+
+class ConversationBackend:
+    """
+    ממשק בסיסי לאחסון שיחות לפי מספר טלפון.
+    כל backend צריך לממש קריאה, כתיבה ומחיקה של שיחה בודדת.
+    """
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, phone_number: str, conv: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def put_many(self, items) -> None:
+        """כותב מספר שיחות. backend-ים יכולים לממש זאת ביעילות (למשל בטרנזקציה אחת)."""
+        for phone_number, conv in items:
+            self.put(phone_number, conv)
+
+    def write_batch(self, batch: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]) -> None:
+        """
+        כותב מנה מהמטמון: (טלפון, שיחה מלאה, רשימת השינויים שבוצעו בה).
+        ברירת המחדל שומרת את השיחה המלאה; backend מבוסס יומן כותב רק את השינויים.
+        """
+        self.put_many((phone_number, conv) for phone_number, conv, _ in batch)
+
+    def delete(self, phone_number: str) -> None:
+        raise NotImplementedError
+
 
-def _load_conversations() -> Dict[str, Dict[str, Any]]:
-    """טוען את השיחות מהקובץ."""
-    try:
-        if os.path.exists(CONVERSATIONS_FILE):
-            with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # המר מחרוזות תאריך לאובייקטי datetime
-                for phone, conv in data.items():
-                    if conv.get("last_activity"):
-                        conv["last_activity"] = datetime.fromisoformat(conv["last_activity"])
-                    if conv.get("created_at"):
-                        conv["created_at"] = datetime.fromisoformat(conv["created_at"])
+class JsonFileBackend(ConversationBackend):
+    """
+    האחסון הישן - כל השיחות בקובץ JSON אחד.
+    כל כתיבה משכתבת את כל הקובץ, ולכן מתאים רק לפיתוח מקומי.
+    """
+
+    def __init__(self, path: str = CONVERSATIONS_FILE):
+        self.path = path
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """טוען את כל השיחות מהקובץ."""
+        try:
+            if os.path.exists(self.path):
+                data = json_codec.load_file(self.path)
+                for conv in data.values():
+                    _deserialize_conversation(conv)
                 return data
-    except Exception as e:
-        print(f"❌ Error loading conversations: {e}")
-    return {}
-
-
-def _save_conversations(conversations: Dict[str, Dict[str, Any]]) -> None:
-    """שומר את השיחות לקובץ."""
-    try:
-        # המר datetime למחרוזות לפני שמירה
-        data_to_save = {}
-        for phone, conv in conversations.items():
-            conv_copy = conv.copy()
-            if isinstance(conv_copy.get("last_activity"), datetime):
-                conv_copy["last_activity"] = conv_copy["last_activity"].isoformat()
-            if isinstance(conv_copy.get("created_at"), datetime):
-                conv_copy["created_at"] = conv_copy["created_at"].isoformat()
-            data_to_save[phone] = conv_copy
-            
-        with open(CONVERSATIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"❌ Error saving conversations: {e}")
+        except Exception as e:
+            log.error("❌ Error loading conversations: %s", e, path=self.path)
+        return {}
 
+    def save_all(self, conversations: Dict[str, Dict[str, Any]]) -> None:
+        """שומר את כל השיחות לקובץ."""
+        try:
+            data_to_save = {
+                phone: _serialize_conversation(conv)
+                for phone, conv in conversations.items()
+            }
+            json_codec.dump_file(self.path, data_to_save)
+        except Exception as e:
+            log.error("❌ Error saving conversations: %s", e, path=self.path)
 
-def get_conversation(phone_number: str) -> Dict[str, Any]:
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        return self.load_all().get(phone_number)
+
+    def put(self, phone_number: str, conv: Dict[str, Any]) -> None:
+        conversations = self.load_all()
+        conversations[phone_number] = conv
+        self.save_all(conversations)
+
+    def put_many(self, items) -> None:
+        conversations = self.load_all()
+        conversations.update(items)
+        self.save_all(conversations)
+
+    def delete(self, phone_number: str) -> None:
+        conversations = self.load_all()
+        if phone_number in conversations:
+            del conversations[phone_number]
+            self.save_all(conversations)
+
+
+class SQLiteBackend(ConversationBackend):
     """
-    מחזיר את מצב השיחה הנוכחי למשתמש.
-    אם אין שיחה פעילה או שהשיחה פגה, יוצר שיחה חדשה.
+    אחסון שיחות ב-SQLite (מצב WAL) - שורה אחת לכל מספר טלפון.
+    קריאה וכתיבה הן לפי מפתח בודד, ללא תלות במספר המשתמשים הכולל.
     """
-    now = datetime.now()
-    conversations = _load_conversations()
-    
-    if phone_number in conversations:
-        conv = conversations[phone_number]
-        last_activity = conv.get("last_activity")
-        
-        # בדוק אם השיחה עדיין בתוקף
-        if last_activity:
-            time_diff = now - last_activity
-            if time_diff < timedelta(minutes=CONVERSATION_TIMEOUT_MINUTES):
-                # עדכן זמן פעילות אחרון
-                conv["last_activity"] = now
-                _save_conversations(conversations)
-                return conv
-    
-    # צור שיחה חדשה
-    conversations[phone_number] = {
+
+    def __init__(self, path: str = CONVERSATIONS_DB, legacy_json_path: Optional[str] = CONVERSATIONS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " phone TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " last_activity TEXT)"
+        )
+        if legacy_json_path:
+            self._migrate_from_json(legacy_json_path)
+
+    def _migrate_from_json(self, json_path: str) -> None:
+        """מיגרציה חד-פעמית מקובץ ה-JSON הישן, רק אם המסד ריק."""
+        if not os.path.exists(json_path):
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM conversations LIMIT 1").fetchone()
+        if row:
+            return
+        conversations = JsonFileBackend(json_path).load_all()
+        if not conversations:
+            return
+        self.put_many(conversations.items())
+        log.info("✅ Migrated conversations", count=len(conversations), source=json_path)
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM conversations WHERE phone = ?", (phone_number,)
+            ).fetchone()
+        if not row:
+            return None
+        return _deserialize_conversation(json_codec.loads(row[0]))
+
+    def put(self, phone_number: str, conv: Dict[str, Any]) -> None:
+        self.put_many([(phone_number, conv)])
+
+    def put_many(self, items) -> None:
+        """כותב מספר שיחות בטרנזקציה אחת."""
+        rows = []
+        for phone, conv in items:
+            data = _serialize_conversation(conv)
+            rows.append((phone, json_codec.dumps_str(data), data.get("last_activity")))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO conversations (phone, data, last_activity) VALUES (?, ?, ?) "
+                    "ON CONFLICT(phone) DO UPDATE SET data = excluded.data, last_activity = excluded.last_activity",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, phone_number: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE phone = ?", (phone_number,))
+
+
+def _new_conversation(now: datetime) -> Dict[str, Any]:
+    return {
         "messages": [],  # היסטוריית הודעות לשליחה ל-OpenAI
         "state": "chatting",  # מצבים: chatting, confirming_request, completed
         "pending_request": None,  # הפנייה שמחכה לאישור
+        "summary": None,  # סיכום של הודעות ישנות שהוסרו מ-messages
         "last_activity": now,
         "created_at": now
     }
-    _save_conversations(conversations)
-    
-    return conversations[phone_number]
+
+
+class JournalBackend(ConversationBackend):
+    """
+    אחסון שיחות ביומן שורות (JSON Lines) שרק מוסיפים לו - רשומה לכל הודעה או שינוי מצב.
+
+    - הוספה עולה O(גודל ההודעה) במקום שכתוב כל השיחות.
+    - כל רשומה ממוספרת (seq). דחיסה כותבת snapshot של המצב המלא עם ה-seq האחרון
+      ומרוקנת את היומן; בטעינה קוראים את ה-snapshot ומשחזרים רק את הזנב שאחריו.
+    - בדחיסה משמיטים שיחות שפגו - הן מוחלפות בשיחה חדשה בגישה הבאה בכל מקרה.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        snapshot_path: str,
+        compact_every: int = 1000,
+        timeout_minutes: int = CONVERSATION_TIMEOUT_MINUTES,
+    ):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+        self.timeout = timedelta(minutes=timeout_minutes)
+        self._lock = threading.Lock()
+        self._conversations: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._tail_records = 0
+        self._load()
+
+    def _load(self) -> None:
+        """טוען snapshot ומשחזר את רשומות היומן שנכתבו אחריו."""
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            snapshot = json_codec.load_file(self.snapshot_path)
+            snapshot_seq = snapshot.get("seq", 0)
+            self._conversations = {
+                phone: _deserialize_conversation(conv)
+                for phone, conv in snapshot.get("conversations", {}).items()
+            }
+        self._seq = snapshot_seq
+
+        if not os.path.exists(self.journal_path):
+            return
+        offset = 0  # תחילת השורה הנוכחית (בבתים)
+        torn = False
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # רק השורה האחרונה יכולה להיות בלי "\n": כתיבה שנקטעה (קריסה באמצע) - זנב קרוע
+                    torn = True
+                    break
+                try:
+                    record = json_codec.loads(line)
+                    seq = record["seq"]
+                except (ValueError, KeyError, TypeError):
+                    # שורה פגומה באמצע היומן - מדלגים עליה וממשיכים, כדי לא לאבד את הרשומות שאחריה
+                    log.error("❌ Skipping corrupt journal line", path=self.journal_path, offset=offset,
+                              line=line[:200].decode("utf-8", "replace"))
+                    offset += len(line)
+                    continue
+                offset += len(line)
+                if seq <= snapshot_seq:
+                    continue
+                self._apply(record)
+                self._seq = seq
+                self._tail_records += 1
+        if torn:
+            # חיתוך הזנב הקרוע, כדי שהרשומה הבאה לא תיכתב צמודה אליו ותאבד בטעינה הבאה
+            log.warning("⚠️ Truncating torn journal tail", path=self.journal_path, offset=offset)
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """מחיל רשומת יומן על המצב בזיכרון."""
+        phone = record["phone"]
+        op = record["op"]
+        if op == "del":
+            self._conversations.pop(phone, None)
+            return
+        at = datetime.fromisoformat(record["at"])
+        if op == "new" or phone not in self._conversations:
+            self._conversations[phone] = _new_conversation(at)
+        conv = self._conversations[phone]
+        if op == "msg":
+            conv["messages"].append(record["message"])
+        elif op == "set":
+            conv.update(record["fields"])
+        conv["last_activity"] = at
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        """מוסיף רשומות ליומן ומחיל אותן על המצב בזיכרון."""
+        lines = []
+        for record in records:
+            self._seq += 1
+            record["seq"] = self._seq
+            lines.append(json_codec.dumps(record))
+        with open(self.journal_path, 'ab') as f:
+            f.write(b"\n".join(lines) + b"\n")
+        for record in records:
+            self._apply(record)
+        self._tail_records += len(records)
+        if self._tail_records >= self.compact_every:
+            self._compact()
+
+    def _compact(self) -> None:
+        """כותב snapshot אטומי של השיחות הפעילות ומרוקן את היומן."""
+        now = datetime.now()
+        active = {
+            phone: _serialize_conversation(conv)
+            for phone, conv in self._conversations.items()
+            if now - conv["last_activity"] < self.timeout
+        }
+        json_codec.dump_file(self.snapshot_path, {"seq": self._seq, "conversations": active})
+        # אם נקרוס לפני הריקון, הרשומות הישנות ידולגו בטעינה לפי ה-seq
+        open(self.journal_path, 'w', encoding='utf-8').close()
+        self._conversations = {phone: _deserialize_conversation(conv) for phone, conv in active.items()}
+        self._tail_records = 0
+
+    def compact(self) -> None:
+        """מריץ דחיסה ידנית."""
+        with self._lock:
+            self._compact()
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conv = self._conversations.get(phone_number)
+            return copy.deepcopy(conv) if conv is not None else None
+
+    def put(self, phone_number: str, conv: Dict[str, Any]) -> None:
+        self.put_many([(phone_number, conv)])
+
+    def put_many(self, items) -> None:
+        """כותב שיחות מלאות כרשומת new + set (לשימוש כשאין רשימת שינויים)."""
+        records = []
+        for phone, conv in items:
+            data = _serialize_conversation(conv)
+            at = data.pop("last_activity", None) or datetime.now().isoformat()
+            data.pop("created_at", None)
+            records.append({"op": "new", "phone": phone, "at": at})
+            records.append({"op": "set", "phone": phone, "fields": data, "at": at})
+        with self._lock:
+            self._append(records)
+
+    def write_batch(self, batch: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]) -> None:
+        records = []
+        for phone, conv, ops in batch:
+            for op in ops:
+                records.append(dict(op, phone=phone))
+            # עדכון זמן פעילות בלבד (קריאה ללא שינוי) - רשומת touch קטנה
+            if not ops or ops[-1]["at"] != conv["last_activity"].isoformat():
+                records.append({"op": "touch", "phone": phone, "at": conv["last_activity"].isoformat()})
+        if not records:
+            return
+        with self._lock:
+            self._append(records)
+
+    def delete(self, phone_number: str) -> None:
+        with self._lock:
+            self._append([{"op": "del", "phone": phone_number}])
+
+
+def _create_backend() -> ConversationBackend:
+    """יוצר את ה-backend לפי ההגדרות."""
+    if CONVERSATION_BACKEND == "json":
+        return JsonFileBackend(CONVERSATIONS_FILE)
+    if CONVERSATION_BACKEND == "journal":
+        return JournalBackend(CONVERSATIONS_JOURNAL, CONVERSATIONS_SNAPSHOT, JOURNAL_COMPACT_EVERY)
+    return SQLiteBackend(CONVERSATIONS_DB, CONVERSATIONS_FILE)
+
+
+class ConversationCache:
+    """
+    מטמון write-behind לשיחות בזיכרון התהליך.
+
+    - קריאות מוגשות מהזיכרון; טעינה מה-backend רק בפעם הראשונה לכל מספר.
+    - שיחות שפגו מפונות בעזרת ערימת תפוגה (heap) ולא בבדיקה בכל קריאה.
+    - שינויים מסומנים כ"מלוכלכים" ונכתבים ל-backend במנות (put_many)
+      כשמצטברות מספיק שיחות או כשעבר מרווח הזמן שהוגדר.
+    """
+
+    def __init__(
+        self,
+        backend: ConversationBackend,
+        timeout_minutes: int = CONVERSATION_TIMEOUT_MINUTES,
+        flush_batch_size: int = 50,
+        flush_interval_seconds: float = 5.0,
+    ):
+        self.backend = backend
+        self.timeout = timedelta(minutes=timeout_minutes)
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # (זמן תפוגה, מספר טלפון); רשומה שאינה תואמת את _scheduled היא ישנה ומדולגת
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._scheduled: Dict[str, datetime] = {}
+        self._dirty: Set[str] = set()
+        # שינויים שטרם נכתבו לכל שיחה (עבור backend מבוסס יומן)
+        self._ops: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+
+    def _evict_expired(self, now: datetime) -> None:
+        """מפנה מהזיכרון שיחות שפגו. שיחות מלוכלכות נכתבות לפני הפינוי."""
+        evicted_dirty = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            scheduled_at, phone = heapq.heappop(self._expiry_heap)
+            if self._scheduled.get(phone) != scheduled_at:
+                continue
+            conv = self._entries[phone]
+            expires_at = conv["last_activity"] + self.timeout
+            if expires_at > now:
+                # השיחה עודכנה מאז שנכנסה לערימה - החזר אותה עם זמן התפוגה העדכני
+                self._schedule(phone, expires_at)
+                continue
+            del self._entries[phone]
+            del self._scheduled[phone]
+            if phone in self._dirty:
+                self._dirty.discard(phone)
+                evicted_dirty.append((phone, conv, self._ops.pop(phone, [])))
+        if evicted_dirty:
+            self.backend.write_batch(evicted_dirty)
+
+    def _schedule(self, phone_number: str, expires_at: datetime) -> None:
+        self._scheduled[phone_number] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, phone_number))
+
+    def _add(self, phone_number: str, conv: Dict[str, Any]) -> None:
+        self._entries[phone_number] = conv
+        self._schedule(phone_number, conv["last_activity"] + self.timeout)
+
+    def get(self, phone_number: str, now: datetime) -> Dict[str, Any]:
+        """
+        מחזיר את השיחה הפעילה של המשתמש (ללא שמירה).
+        אם אין שיחה פעילה או שהשיחה פגה, מחזיר שיחה חדשה.
+        """
+        with self._lock:
+            self._evict_expired(now)
+            conv = self._entries.get(phone_number)
+            if conv is not None:
+                return conv
+
+            conv = self.backend.get(phone_number)
+            last_activity = conv.get("last_activity") if conv else None
+            # בדוק אם השיחה השמורה עדיין בתוקף
+            if not last_activity or now - last_activity >= self.timeout:
+                conv = _new_conversation(now)
+                self._dirty.add(phone_number)
+                self._ops[phone_number] = [{"op": "new", "at": now.isoformat()}]
+            self._add(phone_number, conv)
+            return conv
+
+    def mark_dirty(self, phone_number: str, op: Optional[Dict[str, Any]] = None) -> None:
+        """
+        מסמן שיחה לכתיבה, וכותב מנה אם הגיע הזמן.
+        op: תיאור השינוי (הוספת הודעה / עדכון שדות); None עבור עדכון זמן פעילות בלבד.
+        """
+        with self._lock:
+            if phone_number in self._entries:
+                self._dirty.add(phone_number)
+                if op is not None:
+                    self._ops.setdefault(phone_number, []).append(op)
+            if (
+                len(self._dirty) >= self.flush_batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval_seconds
+            ):
+                self.flush()
+
+    def discard(self, phone_number: str) -> None:
+        """מסיר שיחה מהזיכרון (הרשומה בערימה תידלג בפינוי)."""
+        with self._lock:
+            self._entries.pop(phone_number, None)
+            self._scheduled.pop(phone_number, None)
+            self._ops.pop(phone_number, None)
+            self._dirty.discard(phone_number)
+
+    def flush(self) -> None:
+        """כותב את כל השיחות המלוכלכות ל-backend במנה אחת."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._dirty:
+                return
+            batch = [
+                (phone, self._entries[phone], self._ops.pop(phone, []))
+                for phone in self._dirty if phone in self._entries
+            ]
+            self._dirty.clear()
+            try:
+                self.backend.write_batch(batch)
+            except Exception as e:
+                # החזר לסימון כדי לנסות שוב בכתיבה הבאה
+                for phone, _, ops in batch:
+                    self._dirty.add(phone)
+                    self._ops[phone] = ops + self._ops.get(phone, [])
+                log.error("❌ Error flushing conversations: %s", e, conversations=len(batch), exc_info=True)
+
+
+_cache: Optional[ConversationCache] = None
+
+
+def _get_cache() -> ConversationCache:
+    global _cache
+    if _cache is None:
+        _cache = ConversationCache(
+            _create_backend(),
+            CONVERSATION_TIMEOUT_MINUTES,
+            CONVERSATION_FLUSH_BATCH_SIZE,
+            CONVERSATION_FLUSH_INTERVAL_SECONDS,
+        )
+    return _cache
+
+
+def get_backend() -> ConversationBackend:
+    """מחזיר את ה-backend הפעיל (נוצר בשימוש הראשון)."""
+    return _get_cache().backend
+
+
+def set_backend(backend: ConversationBackend) -> None:
+    """מחליף את ה-backend הפעיל (למשל לבדיקות או לאחסון חיצוני)."""
+    global _cache
+    if _cache is not None:
+        _cache.flush()
+    _cache = ConversationCache(
+        backend,
+        CONVERSATION_TIMEOUT_MINUTES,
+        CONVERSATION_FLUSH_BATCH_SIZE,
+        CONVERSATION_FLUSH_INTERVAL_SECONDS,
+    )
+
+
+def flush_conversations() -> None:
+    """כותב ל-backend את כל השינויים שממתינים במטמון (למשל בסוף הפעלת Lambda)."""
+    if _cache is not None:
+        _cache.flush()
+
+
+atexit.register(flush_conversations)
+
+
+def get_conversation(phone_number: str) -> Dict[str, Any]:
+    """
+    מחזיר את מצב השיחה הנוכחי למשתמש.
+    אם אין שיחה פעילה או שהשיחה פגה, יוצר שיחה חדשה.
+    """
+    now = datetime.now()
+    cache = _get_cache()
+    conv = cache.get(phone_number, now)
+    # עדכן זמן פעילות אחרון
+    conv["last_activity"] = now
+    cache.mark_dirty(phone_number)
+    return conv
+
+
+def _update_conversation(phone_number: str, **fields: Any) -> Dict[str, Any]:
+    """מעדכן שדות בשיחה בודדת במטמון."""
+    now = datetime.now()
+    cache = _get_cache()
+    conv = cache.get(phone_number, now)
+    conv.update(fields)
+    conv["last_activity"] = now
+    cache.mark_dirty(phone_number, {"op": "set", "fields": copy.deepcopy(fields), "at": now.isoformat()})
+    return conv
 
 
 def add_message(phone_number: str, role: str, content: str) -> None:
@@ -90,15 +597,16 @@ def add_message(phone_number: str, role: str, content: str) -> None:
     מוסיף הודעה להיסטוריית השיחה.
     role: "user" או "assistant"
     """
-    conversations = _load_conversations()
-    conv = get_conversation(phone_number)
-    conv["messages"].append({
+    now = datetime.now()
+    cache = _get_cache()
+    conv = cache.get(phone_number, now)
+    message = {
         "role": role,
         "content": content
-    })
-    conv["last_activity"] = datetime.now()
-    conversations[phone_number] = conv
-    _save_conversations(conversations)
+    }
+    conv["messages"].append(message)
+    conv["last_activity"] = now
+    cache.mark_dirty(phone_number, {"op": "msg", "message": message, "at": now.isoformat()})
 
 
 def get_messages(phone_number: str) -> List[Dict[str, str]]:
@@ -107,14 +615,20 @@ def get_messages(phone_number: str) -> List[Dict[str, str]]:
     return conv["messages"]
 
 
+def get_history(phone_number: str) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """מחזיר (הודעות שמורות, סיכום ההודעות הישנות יותר או None)."""
+    conv = get_conversation(phone_number)
+    return list(conv["messages"]), conv.get("summary")
+
+
+def replace_history(phone_number: str, messages: List[Dict[str, str]], summary: Optional[str]) -> None:
+    """מחליף את ההיסטוריה השמורה (למשל אחרי שהודעות ישנות קופלו לסיכום)."""
+    _update_conversation(phone_number, messages=list(messages), summary=summary)
+
+
 def set_state(phone_number: str, state: str) -> None:
     """מעדכן את מצב השיחה."""
-    conversations = _load_conversations()
-    conv = get_conversation(phone_number)
-    conv["state"] = state
-    conv["last_activity"] = datetime.now()
-    conversations[phone_number] = conv
-    _save_conversations(conversations)
+    _update_conversation(phone_number, state=state)
 
 
 def get_state(phone_number: str) -> str:
@@ -125,12 +639,7 @@ def get_state(phone_number: str) -> str:
 
 def set_pending_request(phone_number: str, request_text: str) -> None:
     """שומר פנייה שמחכה לאישור."""
-    conversations = _load_conversations()
-    conv = get_conversation(phone_number)
-    conv["pending_request"] = request_text
-    conv["last_activity"] = datetime.now()
-    conversations[phone_number] = conv
-    _save_conversations(conversations)
+    _update_conversation(phone_number, pending_request=request_text)
 
 
 def get_pending_request(phone_number: str) -> Optional[str]:
@@ -141,19 +650,11 @@ def get_pending_request(phone_number: str) -> Optional[str]:
 
 def clear_conversation(phone_number: str) -> None:
     """מנקה את השיחה לחלוטין."""
-    conversations = _load_conversations()
-    if phone_number in conversations:
-        del conversations[phone_number]
-        _save_conversations(conversations)
+    cache = _get_cache()
+    cache.discard(phone_number)
+    cache.backend.delete(phone_number)
 
 
 def reset_for_new_request(phone_number: str) -> None:
     """מאפס את השיחה לקבלת פנייה חדשה (שומר היסטוריה מינימלית)."""
-    conversations = _load_conversations()
-    conv = get_conversation(phone_number)
-    conv["messages"] = []
-    conv["state"] = "chatting"
-    conv["pending_request"] = None
-    conv["last_activity"] = datetime.now()
-    conversations[phone_number] = conv
-    _save_conversations(conversations)
+    _update_conversation(phone_number, messages=[], summary=None, state="chatting", pending_request=None)
@@ -0,0 +1,139 @@
+"""
+מניעת כפילויות של הודעות Webhook לפי מזהה ההודעה (message id).
+
+WhatsApp שולח שוב הודעות שלא אושרו בזמן. המבנה כאן זוכר את המזהים האחרונים
+בסדר הכנסה (LRU) עם תפוגה לפי זמן, כך שבדיקה והוספה הן O(1) והזיכרון חסום
+בלי למחוק את כל הרשימה בבת אחת. אפשר לגבות אותו ב-SQLite כדי לזהות
+כפילויות גם אחרי cold start.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import config
+from local_storage import DATA_DIR
+
+# מספר מזהים מקסימלי בזיכרון, וכמה זמן (שניות) מזהה נחשב "נראה"
+DEDUP_MAX_SIZE = getattr(config, 'DEDUP_MAX_SIZE', 10000)
+DEDUP_TTL_SECONDS = getattr(config, 'DEDUP_TTL_SECONDS', 24 * 60 * 60)
+
+# גיבוי קבוע: "memory" (ברירת מחדל) או "sqlite"
+DEDUP_BACKEND = getattr(config, 'DEDUP_BACKEND', 'memory')
+DEDUP_DB = getattr(config, 'DEDUP_DB', os.path.join(DATA_DIR, 'processed_messages.db'))
+
+
+class _SQLiteSeenStore:
+    """טבלת מזהים שנראו, לזיהוי כפילויות בין הפעלות ואחרי cold start."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages (msg_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_messages_at ON seen_messages (seen_at)")
+
+    def check_and_add(self, msg_id: str, now: float, ttl_seconds: float) -> bool:
+        """מוסיף את המזהה. מחזיר True אם הוא כבר נראה בתוך חלון התפוגה."""
+        cursor = self._conn.execute(
+            "INSERT INTO seen_messages (msg_id, seen_at) VALUES (?, ?) "
+            "ON CONFLICT(msg_id) DO UPDATE SET seen_at = excluded.seen_at "
+            "WHERE seen_messages.seen_at <= ?",
+            (msg_id, now, now - ttl_seconds),
+        )
+        # 0 שורות הושפעו = המזהה קיים ועדיין לא פג
+        return cursor.rowcount == 0
+
+    def purge(self, before: float) -> None:
+        self._conn.execute("DELETE FROM seen_messages WHERE seen_at <= ?", (before,))
+
+    def discard(self, msg_id: str) -> None:
+        self._conn.execute("DELETE FROM seen_messages WHERE msg_id = ?", (msg_id,))
+
+
+class MessageDeduplicator:
+    """
+    זוכר מזהי הודעות שטופלו.
+
+    - check_and_add: בדיקה והוספה אטומית ב-O(1).
+    - מעבר ל-max_size, המזהה הוותיק ביותר נמחק (ולא כל הרשימה).
+    - מזהה שעבר ttl_seconds נחשב חדש שוב.
+    - discard מחזיר מזהה להיות "חדש" (הודעה שהטיפול בה נכשל ותעובד שוב בניסיון הבא).
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEDUP_MAX_SIZE,
+        ttl_seconds: float = DEDUP_TTL_SECONDS,
+        db_path: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = _SQLiteSeenStore(db_path) if db_path else None
+        self._inserts_since_purge = 0
+
+    def _expire(self, now: float) -> None:
+        """מסיר מזהים שפגו מתחילת הרשימה (הם הוותיקים ביותר)."""
+        cutoff = now - self.ttl_seconds
+        while self._seen:
+            oldest_id, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            self._seen.popitem(last=False)
+
+    def check_and_add(self, msg_id: str) -> bool:
+        """
+        מחזיר True אם ההודעה כבר טופלה (כפילות), אחרת מסמן אותה ומחזיר False.
+        """
+        if not msg_id:
+            return False
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if msg_id in self._seen:
+                return True
+
+            if self._store is not None:
+                if self._store.check_and_add(msg_id, now, self.ttl_seconds):
+                    self._remember(msg_id, now)
+                    return True
+                self._inserts_since_purge += 1
+                if self._inserts_since_purge >= self.max_size:
+                    self._store.purge(now - self.ttl_seconds)
+                    self._inserts_since_purge = 0
+
+            self._remember(msg_id, now)
+            return False
+
+    def discard(self, msg_id: str) -> None:
+        """שוכח מזהה, כך שהפעם הבאה שהוא מגיע לא תיחשב כפילות."""
+        if not msg_id:
+            return
+        with self._lock:
+            self._seen.pop(msg_id, None)
+            if self._store is not None:
+                self._store.discard(msg_id)
+
+    def _remember(self, msg_id: str, now: float) -> None:
+        self._seen[msg_id] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    def __contains__(self, msg_id: str) -> bool:
+        with self._lock:
+            seen_at = self._seen.get(msg_id)
+            return seen_at is not None and seen_at > time.time() - self.ttl_seconds
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+def create_deduplicator() -> MessageDeduplicator:
+    """יוצר את מנגנון מניעת הכפילויות לפי ההגדרות."""
+    db_path = DEDUP_DB if DEDUP_BACKEND == "sqlite" else None
+    return MessageDeduplicator(DEDUP_MAX_SIZE, DEDUP_TTL_SECONDS, db_path)
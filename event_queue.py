@@ -0,0 +1,267 @@
+"""
+תור אירועי Webhook לעיבוד נדחה (מצב early-ack).
+
+ה-handler רק מאמת את האירוע ומכניס אותו לתור, ומחזיר 200 מיד; worker נפרד
+מושך אירועים מהתור ומריץ עליהם את תהליך העיבוד המלא.
+
+EventQueue מגדיר את הממשק, עם שני מימושים (לפי EVENT_QUEUE_BACKEND):
+- SQSEventQueue: תור SQS, משותף לכל ה-containers (דורש boto3 ו-EVENT_QUEUE_URL).
+- SQLiteEventQueue: קובץ SQLite. ב-Lambda ‏/tmp הוא פרטי לכל container, ולכן
+  ה-worker לא רואה אירועים שנכנסו ב-container אחר; התור נחשב משותף רק אם
+  EVENT_QUEUE_DB_SHARED מסמן שהקובץ על אחסון משותף (למשל EFS). מתאים גם לבדיקות.
+
+מצב deferred ב-lambda_function פעיל רק כשהתור משותף (EventQueue.shared).
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import config
+from local_storage import DATA_DIR
+from structured_log import get_logger
+
+log = get_logger("event_queue")
+
+# סוג התור: "sqlite" (ברירת מחדל) או "sqs"
+EVENT_QUEUE_BACKEND = getattr(config, 'EVENT_QUEUE_BACKEND', 'sqlite')
+EVENT_QUEUE_URL = getattr(config, 'EVENT_QUEUE_URL', None)
+EVENT_QUEUE_DB = getattr(config, 'EVENT_QUEUE_DB', os.path.join(DATA_DIR, 'event_queue.db'))
+# True רק אם EVENT_QUEUE_DB נמצא על אחסון שכל ה-containers רואים (EFS)
+EVENT_QUEUE_DB_SHARED = getattr(config, 'EVENT_QUEUE_DB_SHARED', False)
+
+# זמן (שניות) שבו אירוע שנמשך שמור ל-worker אחד לפני שהוא חוזר לתור
+EVENT_LEASE_SECONDS = getattr(config, 'EVENT_LEASE_SECONDS', 120)
+
+# מספר ניסיונות מקסימלי לאירוע, ובסיס ההשהיה בין ניסיונות (שניות)
+EVENT_MAX_ATTEMPTS = getattr(config, 'EVENT_MAX_ATTEMPTS', 5)
+EVENT_RETRY_BACKOFF_SECONDS = getattr(config, 'EVENT_RETRY_BACKOFF_SECONDS', 5)
+
+
+EventId = Union[int, str]
+
+
+class QueuedEvent(NamedTuple):
+    event_id: EventId
+    body: str
+    attempts: int
+
+
+class EventQueue:
+    """ממשק תור אירועים: הכנסה, משיכה עם חכירה, אישור וכישלון."""
+
+    # האם worker ב-container אחר רואה את האירועים שנכנסו לתור
+    shared = False
+
+    def enqueue(self, body: str) -> EventId:
+        raise NotImplementedError
+
+    def claim(self, limit: int = 10) -> List[QueuedEvent]:
+        """מושך עד limit אירועים זמינים ושומר אותם ל-worker הנוכחי למשך זמן החכירה."""
+        raise NotImplementedError
+
+    def ack(self, event_id: EventId) -> None:
+        """מסמן שהאירוע עובד בהצלחה ומוחק אותו."""
+        raise NotImplementedError
+
+    def fail(self, event_id: EventId, error: str) -> None:
+        """מחזיר את האירוע לתור עם השהיה, או מעביר ל-dead אחרי יותר מדי ניסיונות."""
+        raise NotImplementedError
+
+    def pending_count(self) -> int:
+        raise NotImplementedError
+
+
+class SQLiteEventQueue(EventQueue):
+    """תור קבוע על SQLite (מצב WAL). בטוח לשימוש מכמה threads ומכמה תהליכים."""
+
+    def __init__(
+        self,
+        path: str = EVENT_QUEUE_DB,
+        lease_seconds: float = EVENT_LEASE_SECONDS,
+        max_attempts: int = EVENT_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = EVENT_RETRY_BACKOFF_SECONDS,
+        shared: bool = EVENT_QUEUE_DB_SHARED,
+    ):
+        self.path = path
+        self.shared = shared
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " body TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'ready',"  # ready / dead
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_ready ON events (status, available_at)")
+
+    def enqueue(self, body: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO events (body, available_at) VALUES (?, ?)", (body, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int = 10) -> List[QueuedEvent]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, body, attempts FROM events "
+                    "WHERE status = 'ready' AND available_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                # חכירה: האירוע לא יימשך שוב עד שיעבור זמן החכירה (למשל אם ה-worker קרס)
+                self._conn.executemany(
+                    "UPDATE events SET attempts = attempts + 1, available_at = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [QueuedEvent(event_id, body, attempts + 1) for event_id, body, attempts in rows]
+
+    def ack(self, event_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def fail(self, event_id: int, error: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM events WHERE id = ?", (event_id,)).fetchone()
+            if not row:
+                return
+            attempts = row[0]
+            if attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE events SET status = 'dead', last_error = ? WHERE id = ?", (error, event_id)
+                )
+                log.error("❌ אירוע הועבר ל-dead", event_id=event_id, attempts=attempts, error=error)
+                return
+            delay = self.retry_backoff_seconds * (2 ** (attempts - 1))
+            self._conn.execute(
+                "UPDATE events SET available_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, event_id),
+            )
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events WHERE status = 'ready'").fetchone()[0]
+
+
+class SQSEventQueue(EventQueue):
+    """
+    תור על Amazon SQS. החכירה היא ה-visibility timeout של ההודעה, וכישלון
+    מאריך אותו לפי ההשהיה. העברה ל-dead מתבצעת ע"י ה-redrive policy של התור
+    (maxReceiveCount = EVENT_MAX_ATTEMPTS), ולא בקוד.
+    אפשר להזריק לקוח (למשל לבדיקות); אחרת נוצר לקוח boto3.
+    """
+
+    shared = True
+
+    # SQS מחזיר עד 10 הודעות בקריאה, ו-visibility timeout מוגבל ל-12 שעות
+    MAX_BATCH = 10
+    MAX_VISIBILITY_SECONDS = 12 * 60 * 60
+
+    def __init__(
+        self,
+        queue_url: Optional[str] = EVENT_QUEUE_URL,
+        client=None,
+        lease_seconds: float = EVENT_LEASE_SECONDS,
+        max_attempts: int = EVENT_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = EVENT_RETRY_BACKOFF_SECONDS,
+    ):
+        if not queue_url:
+            raise ValueError("EVENT_QUEUE_BACKEND = 'sqs' דורש EVENT_QUEUE_URL")
+        if client is None:
+            import boto3
+            client = boto3.client("sqs")
+        self.queue_url = queue_url
+        self.client = client
+        self.lease_seconds = int(lease_seconds)
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        # מזהה הודעה -> (receipt handle של המשיכה האחרונה, מספר הניסיון); נדרש ל-ack ול-fail
+        self._receipts: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, body: str) -> str:
+        return self.client.send_message(QueueUrl=self.queue_url, MessageBody=body)["MessageId"]
+
+    def claim(self, limit: int = 10) -> List[QueuedEvent]:
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=max(1, min(limit, self.MAX_BATCH)),
+            VisibilityTimeout=self.lease_seconds,
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        events = []
+        with self._lock:
+            for message in response.get("Messages", []):
+                attempts = int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+                self._receipts[message["MessageId"]] = (message["ReceiptHandle"], attempts)
+                events.append(QueuedEvent(message["MessageId"], message["Body"], attempts))
+        return events
+
+    def _pop_receipt(self, event_id: EventId) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            return self._receipts.pop(event_id, None)
+
+    def ack(self, event_id: EventId) -> None:
+        entry = self._pop_receipt(event_id)
+        if entry:
+            self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=entry[0])
+
+    def fail(self, event_id: EventId, error: str) -> None:
+        entry = self._pop_receipt(event_id)
+        if not entry:
+            return
+        receipt, attempts = entry
+        if attempts >= self.max_attempts:
+            # ה-redrive policy יעביר את ההודעה ל-DLQ במשיכה הבאה
+            log.error("❌ אירוע נכשל בניסיון האחרון", event_id=event_id, attempts=attempts, error=error)
+        delay = self.retry_backoff_seconds * (2 ** (attempts - 1))
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=receipt,
+            VisibilityTimeout=int(min(delay, self.MAX_VISIBILITY_SECONDS)),
+        )
+
+    def pending_count(self) -> int:
+        attributes = self.client.get_queue_attributes(
+            QueueUrl=self.queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+        )["Attributes"]
+        return int(attributes["ApproximateNumberOfMessages"])
+
+
+_queue: Optional[EventQueue] = None
+
+
+def create_event_queue() -> EventQueue:
+    """יוצר את תור האירועים לפי EVENT_QUEUE_BACKEND."""
+    if EVENT_QUEUE_BACKEND == "sqs":
+        return SQSEventQueue()
+    return SQLiteEventQueue()
+
+
+def get_event_queue() -> EventQueue:
+    """מחזיר את תור האירועים המשותף (נוצר בשימוש הראשון)."""
+    global _queue
+    if _queue is None:
+        _queue = create_event_queue()
+    return _queue
+
+
+def set_event_queue(queue: EventQueue) -> None:
+    """מחליף את תור האירועים (למשל בתור מנוהל, או בתור על קובץ זמני בבדיקות)."""
+    global _queue
+    _queue = queue
@@ -1,78 +1,477 @@
 from config import APPS_SCRIPT_URL
-import requests
-import json
+import config
+import json_codec
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from structured_log import get_logger
+from tracing import traced
+from local_storage import (
+    DATA_DIR,
+    DEFAULT_FIELDS,
+    USERS_DB,
+    UserDirectory,
+    normalize_phone_key,
+    save_users_compact,
+)
 # הגדרות
 COLLECTION_NAME = 'users'
 
+log = get_logger("google_sheets_utils")
+
+# תור כתיבה לגיליון: מספר שורות מקסימלי בבקשה, מרווח איסוף שורות ברקע (שניות),
+# מספר ניסיונות חוזרים ובסיס ההשהיה ביניהם.
+# ה-Apps Script הפרוס קורא רק name/inquiry/phone בשורש ה-payload (ומחזיר 200 גם על rows
+# שהוא לא מכיר, כך ששורות אובדות בשקט) - לכן ברירת המחדל היא שורה אחת בבקשה.
+# להגדיל רק אחרי שה-script מטפל ב-rows.
+SHEETS_BATCH_SIZE = getattr(config, 'SHEETS_BATCH_SIZE', 1)
+SHEETS_FLUSH_INTERVAL = getattr(config, 'SHEETS_FLUSH_INTERVAL', 2.0)
+SHEETS_MAX_RETRIES = getattr(config, 'SHEETS_MAX_RETRIES', 3)
+SHEETS_BACKOFF_SECONDS = getattr(config, 'SHEETS_BACKOFF_SECONDS', 0.5)
+SHEETS_TIMEOUT = 10
+
+# קובץ שורות שטרם נשלחו - שורה נמחקת ממנו רק אחרי שה-Apps Script אישר אותה
+SHEETS_SPOOL_FILE = getattr(config, 'SHEETS_SPOOL_FILE', os.path.join(DATA_DIR, 'sheets_spool.jsonl'))
+
+# זיהוי חברים: גודל המטמון בזיכרון ותפוגת תוצאה חיובית/שלילית (שניות)
+MEMBER_CACHE_SIZE = getattr(config, 'MEMBER_CACHE_SIZE', 5000)
+MEMBER_CACHE_TTL_SECONDS = getattr(config, 'MEMBER_CACHE_TTL_SECONDS', 600)
+MEMBER_NEGATIVE_TTL_SECONDS = getattr(config, 'MEMBER_NEGATIVE_TTL_SECONDS', 120)
+# תפוגה קצרה לכשל בקריאה מהגיליון, כדי שמספר לא רשום לא יחכה לבקשה חוסמת בכל הודעה
+MEMBER_ERROR_TTL_SECONDS = getattr(config, 'MEMBER_ERROR_TTL_SECONDS', 30)
+
+# האם לחפש בגיליון מספר שלא נמצא מקומית (דורש read_users או read_user ב-Apps Script -
+# כבוי כברירת מחדל), וכל כמה זמן לרענן את כל רשימת החברים (read_users)
+MEMBER_SHEETS_LOOKUP = getattr(config, 'MEMBER_SHEETS_LOOKUP', False)
+MEMBER_SYNC_INTERVAL_SECONDS = getattr(config, 'MEMBER_SYNC_INTERVAL_SECONDS', 900)
+MEMBERS_SYNC_FILE = getattr(config, 'MEMBERS_SYNC_FILE', os.path.join(DATA_DIR, 'members_sync.json'))
+
+
+class SheetsWriteQueue:
+    """
+    תור כתיבה לגיליון: מקבל פניות מאושרות מיד, ושולח אותן ברקע במנות.
+
+    - כל שורה נכתבת קודם לקובץ spool מקומי, כך ששורות שלא נשלחו נשמרות
+      ונשלחות בהפעלה הבאה.
+    - כל מנה נשלחת כ-payload אחד של write_structured עם רשימת rows. מנה של שורה
+      אחת (ברירת המחדל, SHEETS_BATCH_SIZE) נשלחת גם בפורמט הישן (name/inquiry/phone
+      בשורש ה-payload); מנות גדולות יותר דורשות Apps Script שמכיר את rows.
+    - כשל שליחה מנוסה שוב עם השהיה אקספוננציאלית.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = APPS_SCRIPT_URL,
+        spool_path: str = SHEETS_SPOOL_FILE,
+        batch_size: int = SHEETS_BATCH_SIZE,
+        flush_interval: float = SHEETS_FLUSH_INTERVAL,
+        max_retries: int = SHEETS_MAX_RETRIES,
+        backoff_seconds: float = SHEETS_BACKOFF_SECONDS,
+        timeout: float = SHEETS_TIMEOUT,
+    ):
+        self.url = url
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # נעילה נפרדת לשליחה - שליחה אחת בכל רגע, בלי לחסום הוספה לתור
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._rows: List[Dict[str, Any]] = self._load_spool()
+
+    def _load_spool(self) -> List[Dict[str, Any]]:
+        """טוען שורות שלא נשלחו מהפעלות קודמות."""
+        rows = []
+        if not os.path.exists(self.spool_path):
+            return rows
+        try:
+            with open(self.spool_path, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        rows.append(json_codec.loads(line))
+        except (OSError, ValueError) as e:
+            log.error("❌ כשל בטעינת שורות ממתינות לגיליון: %s", e)
+        if rows:
+            log.info("נטענו %d שורות שממתינות לשליחה לגיליון", len(rows))
+        return rows
+
+    def _rewrite_spool(self) -> None:
+        """שומר את השורות שנותרו בתור (כתיבה אטומית)."""
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            for row in self._rows:
+                f.write(json_codec.dumps(row) + b"\n")
+        os.replace(tmp_path, self.spool_path)
+
+    def enqueue(self, name: str, inquiry: str, phone: str) -> Dict[str, Any]:
+        """מוסיף פנייה לתור (נשמרת מקומית מיד) ומעיר את השליחה ברקע."""
+        row = {
+            "id": uuid.uuid4().hex,  # מאפשר ל-Apps Script לזהות שורה שנשלחה פעמיים
+            "name": name,
+            "inquiry": inquiry,
+            "phone": phone,
+        }
+        with self._lock:
+            with open(self.spool_path, 'ab') as f:
+                f.write(json_codec.dumps(row) + b"\n")
+            self._rows.append(row)
+        self._ensure_worker()
+        self._wakeup.set()
+        return row
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def _build_payload(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"action": "write_structured", "rows": rows}
+        if len(rows) == 1:
+            payload.update({key: rows[0][key] for key in ("name", "inquiry", "phone")})
+        return payload
+
+    @traced("apps_script.write_batch")
+    def _post_batch(self, rows: List[Dict[str, Any]]) -> bool:
+        """שולח מנה אחת עם ניסיונות חוזרים. מחזיר True אם ה-Apps Script אישר."""
+        import requests
+
+        # הגוף מקודד פעם אחת, ונשלח כמו שהוא בכל הניסיונות
+        body = json_codec.dumps(self._build_payload(rows))
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.post(self.url, data=body, headers=json_codec.JSON_HEADERS, timeout=self.timeout)
+                if response.status_code == 200:
+                    log.info("✅ שורות נכתבו לגיליון", rows=len(rows), attempt=attempt)
+                    return True
+                log.warning("❌ שגיאת שרת: ה-Apps Script החזיר קוד %d", response.status_code, attempt=attempt)
+            except requests.exceptions.RequestException as e:
+                log.warning("❌ כשל שליחה ל-Apps Script: %s", e, attempt=attempt)
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+        return False
+
+    def flush(self) -> int:
+        """
+        שולח את כל השורות שבתור במנות. מחזיר את מספר השורות שנשלחו.
+        שורות שלא נשלחו נשארות בתור ובקובץ ה-spool לניסיון הבא.
+        """
+        if not self.url:
+            log.error("APPS_SCRIPT_URL אינו מוגדר.")
+            return 0
+        sent = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._rows[:self.batch_size]
+                if not batch or not self._post_batch(batch):
+                    break
+                sent_ids = {row["id"] for row in batch}
+                with self._lock:
+                    self._rows = [row for row in self._rows if row["id"] not in sent_ids]
+                    self._rewrite_spool()
+                sent += len(batch)
+        return sent
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        """לולאת רקע: ממתינה לשורות, אוספת עוד שורות במשך flush_interval, ושולחת."""
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if self.pending_count():
+                # השליחה נכשלה - ננסה שוב בסבב הבא
+                self._wakeup.set()
+
+
+_write_queue: Optional[SheetsWriteQueue] = None
+
+
+def get_write_queue() -> SheetsWriteQueue:
+    """מחזיר את תור הכתיבה המשותף (נוצר בשימוש הראשון, כולל טעינת שורות ממתינות)."""
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = SheetsWriteQueue()
+    return _write_queue
 
 
 def send_structured_data(name: str, inquiry: str, phone: str):
     """
-    שולח נתונים מובנים (שם, פנייה, טלפון) ל-Apps Script.
+    מכניס נתונים מובנים (שם, פנייה, טלפון) לתור הכתיבה ל-Apps Script.
+    הפונקציה חוזרת מיד; השליחה מתבצעת ברקע או ב-flush_sheet_writes.
     """
     if not APPS_SCRIPT_URL:
-        print("ERROR: APPS_SCRIPT_URL אינו מוגדר.")
+        log.error("APPS_SCRIPT_URL אינו מוגדר.")
         return
 
-    # בניית ה-Payload עם הנתונים המובנים
-    payload = {
-        "action": "write_structured", # פעולה חדשה שתציין ב-Apps Script
-        "name": name,
-        "inquiry": inquiry,
-        "phone": phone
-    }
-    
-    print(f"INFO: מנסה לשלוח נתונים לגיליון: {json.dumps(payload)}")
-
-    try:
-        response = requests.post(APPS_SCRIPT_URL, json=payload, timeout=10)
-        print(f"SUCCESS: סטטוס תגובה: {response.status_code}")
-        print(f"SUCCESS: גוף תגובה: {response.text}")
-        
-        if response.status_code == 200:
-            print("✅ הכתיבה הושלמה בהצלחה (מנקודת מבט השרת).")
+    row = get_write_queue().enqueue(name, inquiry, phone)
+    log.info("פנייה נוספה לתור הכתיבה לגיליון", row_id=row["id"], phone=phone)
+
+
+def flush_sheet_writes() -> int:
+    """
+    שולח מיד את כל השורות שבתור (למשל לפני סיום הפעלת Lambda, שאחריה התהליך מוקפא).
+    מחזיר את מספר השורות שנשלחו.
+    """
+    return get_write_queue().flush()
+
+
+class _Flight:
+    """בקשה אחת שבדרך - threads נוספים שמבקשים את אותו מפתח ממתינים לתוצאה שלה."""
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class MemberResolver:
+    """
+    זיהוי חברים רשומים במדרג: מטמון בזיכרון (LRU) -> מאגר המשתמשים המקומי -> הגיליון
+    (הגיליון רק כש-sheets_lookup פעיל).
+
+    - תוצאות נשמרות במטמון עם תפוגה נפרדת לתוצאה חיובית ולשלילית.
+    - בקשות במקביל לאותו מספר חולקות קריאת HTTP אחת.
+    - read_users מושך את כל רשימת החברים בבקשה אחת ושומר אותה בקובץ מקומי
+      (בפורמט compact); כל עוד הרשימה עדכנית, מספר שלא נמצא בה נחשב לא רשום
+      בלי קריאה נוספת. אם ה-Apps Script לא תומך ב-read_users, נעשית קריאת
+      read_user למספר הבודד.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = APPS_SCRIPT_URL,
+        local_directory: Optional[UserDirectory] = None,
+        sync_path: str = MEMBERS_SYNC_FILE,
+        cache_size: int = MEMBER_CACHE_SIZE,
+        positive_ttl: float = MEMBER_CACHE_TTL_SECONDS,
+        negative_ttl: float = MEMBER_NEGATIVE_TTL_SECONDS,
+        error_ttl: float = MEMBER_ERROR_TTL_SECONDS,
+        sync_interval: float = MEMBER_SYNC_INTERVAL_SECONDS,
+        timeout: float = SHEETS_TIMEOUT,
+        sheets_lookup: bool = MEMBER_SHEETS_LOOKUP,
+    ):
+        self.url = url
+        self.local_directory = local_directory if local_directory is not None else USERS_DB
+        self.sync_path = sync_path
+        self.cache_size = cache_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.sync_interval = sync_interval
+        self.timeout = timeout
+        self.sheets_lookup = sheets_lookup
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        # העותק המקומי של רשימת החברים מהגיליון; העדכניות נמדדת לפי זמן שינוי הקובץ
+        self._synced = UserDirectory(sync_path, reload_check_seconds=sync_interval, negative_ttl_seconds=0)
+        try:
+            self._synced_at: Optional[float] = os.stat(sync_path).st_mtime
+        except OSError:
+            self._synced_at = None
+        self._sync_failed_at: Optional[float] = None
+
+    # --- מטמון ---
+
+    def _cache_get(self, key: str):
+        """מחזיר (True, משתמש או None) אם יש תוצאה בתוקף, אחרת (False, None)."""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return False, None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._cache[key]
+                return False, None
+            self._cache.move_to_end(key)
+            return True, user
+
+    def _cache_put(self, key: str, user: Optional[Dict[str, Any]], ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.positive_ttl if user is not None else self.negative_ttl
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, user)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, phone_number: Optional[str] = None) -> None:
+        """מוחק מספר אחד מהמטמון (למשל אחרי רישום), או את כל המטמון."""
+        with self._lock:
+            if phone_number is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(normalize_phone_key(phone_number), None)
+
+    def _single_flight(self, key: str, fn):
+        """מריץ את fn פעם אחת לכל מפתח; קריאות מקבילות לאותו מפתח מקבלות את אותה תוצאה."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    # --- הגיליון ---
+
+    @traced("apps_script.read")
+    def _post(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """שולח בקשה ל-Apps Script ומחזיר את ה-JSON שחזר, או None בכשל."""
+        import requests
+
+        try:
+            response = requests.post(
+                self.url, data=json_codec.dumps(payload), headers=json_codec.JSON_HEADERS, timeout=self.timeout
+            )
+            response.raise_for_status()  # יזרוק שגיאה אם הסטטוס אינו 200
+            data = json_codec.loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.error("❌ כשל בקריאה מ-Apps Script (%s): %s", payload["action"], e)
+            return None
+        return data if isinstance(data, dict) else None
+
+    def read_user(self, phone_number: str):
+        """
+        קריאת read_user למספר בודד (בלי מטמון).
+        מחזיר (True, נתונים), (False, None) אם לא נמצא, או (None, None) בשגיאה.
+        """
+        data = self._post({"action": "read_user", "phone": phone_number})
+        if data is None:
+            return None, None
+        if data.get("status") == "not_found":
+            return False, None
+        if "name" not in data:
+            # תשובה בלי נתוני משתמש (למשל פעולה לא מוכרת) - לא מסמנים כרשום
+            log.error("❌ תשובה לא צפויה מ-Apps Script ל-read_user: %s", data.get("status"))
+            return None, None
+        return True, {key: value for key, value in data.items() if key != "status"}
+
+    def _sync_is_fresh(self) -> bool:
+        return self._synced_at is not None and time.time() - self._synced_at < self.sync_interval
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        מושך את כל רשימת החברים בבקשת read_users אחת ושומר אותה מקומית.
+        מחזיר True אם יש רשימה עדכנית. אחרי כשל לא מנסים שוב עד סוף המרווח.
+        """
+        if not self.url:
+            return False
+        if not force:
+            if self._sync_is_fresh():
+                return True
+            if self._sync_failed_at is not None and time.monotonic() - self._sync_failed_at < self.sync_interval:
+                return False
+        return self._single_flight("\x00sync", self._sync_now)
+
+    def _sync_now(self) -> bool:
+        data = self._post({"action": "read_users"})
+        users = data.get("users") if data else None
+        if not isinstance(users, list):
+            self._sync_failed_at = time.monotonic()
+            return False
+
+        fields = list(DEFAULT_FIELDS)
+        for user in users:
+            for key in user:
+                if key != "phone" and key not in fields:
+                    fields.append(key)
+        by_phone = {str(user["phone"]): user for user in users if user.get("phone")}
+        try:
+            save_users_compact(by_phone, self.sync_path, fields)
+        except OSError as e:
+            log.error("❌ כשל בשמירת רשימת החברים: %s", e)
+            self._sync_failed_at = time.monotonic()
+            return False
+        self._synced.reload(force=True)
+        self._synced_at = time.time()
+        self._sync_failed_at = None
+        # המטמון עלול להכיל תוצאות שליליות ישנות למספרים שנוספו
+        self.invalidate()
+        log.info("✅ רשימת החברים סונכרנה מהגיליון", total=len(by_phone))
+        return True
+
+    def _resolve_remote(self, key: str, phone_number: str) -> Optional[Dict[str, Any]]:
+        if self.sync():
+            user = self._synced.get(key)
         else:
-            print("❌ שגיאת שרת: ה-Apps Script החזיר קוד שאינו 200.")
+            # הגיליון שומר את המספר כפי ש-WhatsApp שולח אותו, לכן שולחים את המקורי
+            found, user = self.read_user(phone_number)
+            if found is None:
+                # שגיאה - נשמרת לזמן קצר בלבד, ואחריו ננסה שוב
+                self._cache_put(key, None, self.error_ttl)
+                return None
+        self._cache_put(key, user)
+        return user
+
+    # --- ממשק ---
+
+    def resolve(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        """מחזיר את נתוני החבר (מילון) או None אם אינו רשום."""
+        key = normalize_phone_key(phone_number)
+        hit, user = self._cache_get(key)
+        if hit:
+            return user
+
+        user = self.local_directory.get(key)
+        if user is not None:
+            self._cache_put(key, user)
+            return user
+
+        if not self.url or not self.sheets_lookup:
+            self._cache_put(key, None)
+            return None
+        return self._single_flight(key, lambda: self._resolve_remote(key, phone_number))
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ ERROR: כשל שליחה ל-Apps Script: {e}")
+
+_member_resolver: Optional[MemberResolver] = None
+
+
+def get_member_resolver() -> MemberResolver:
+    """מחזיר את מנגנון זיהוי החברים המשותף (נוצר בשימוש הראשון)."""
+    global _member_resolver
+    if _member_resolver is None:
+        _member_resolver = MemberResolver()
+    return _member_resolver
+
+
+def sync_members(force: bool = True) -> bool:
+    """מרענן את רשימת החברים מהגיליון בבקשה אחת (read_users)."""
+    return get_member_resolver().sync(force=force)
 
 
 def check_user_in_sheets(phone_number):
     """
-    שולח בקשה ל-Apps Script לבדוק אם המשתמש קיים
-    ומחזיר את נתוני המשתמש (שם ושפה) אם נמצא.
+    בודק אם המשתמש רשום: מטמון בזיכרון, מאגר המשתמשים המקומי, ורק אז הגיליון.
+    מחזיר (True, נתוני המשתמש - שם ושפה) אם נמצא, אחרת (False, None).
     """
-    url = getattr(config, 'APPS_SCRIPT_URL', None)
-    if not url:
-        print("ERROR: APPS_SCRIPT_URL אינו מוגדר.")
-        return False, None
-
-    # Payload לקריאת נתונים
-    payload = {
-        "action": "read_user", # פעולה חדשה שנצטרך להוסיף ב-Apps Script
-        "phone": phone_number
-    }
-    
-    print(f"INFO: מנסה לקרוא נתונים למספר {phone_number} מגיליון")
-
-    try:
-        # שליחת בקשת POST עם הגדרת Timeout בטוחה
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status() # יזרוק שגיאה אם הסטטוס אינו 200
-        
-        # המידע המוחזר מה-Apps Script
-        sheet_data = response.json() 
-        
-        if sheet_data.get("status") == "not_found":
-            return False, None # המשתמש לא נמצא
-        
-        # אם קיבלנו שם ושפה, המשתמש קיים
-        return True, sheet_data
-
-    except requests.exceptions.RequestException as e:
-        print(f"❌ ERROR: כשל בקריאה מ-Apps Script: {e}")
-        return False, None
+    user_data = get_member_resolver().resolve(phone_number)
+    if user_data:
+        log.debug("✅ User found", phone=phone_number)
+        return True, user_data
+    log.info("❌ User not found", phone=phone_number)
+    return False, None
 
 
 def new_request(phone_number, message_data):
@@ -80,12 +479,9 @@ def new_request(phone_number, message_data):
 
 if __name__ == "__main__":
     
-    # 1. נניח שזה שלב הרישום - אנחנו מכניסים מידע למאגר
+    # 1. סנכרון כל רשימת החברים מהגיליון בבקשה אחת
     # חשוב: וואטסאפ שולח מספרים בפורמט בינלאומי ללא פלוס (למשל 972)
-    my_phone = "972501234567" 
-    
-    # הוספת משתמש לדוגמה (תריץ את זה פעם אחת כדי שיהיה מידע)
-    add_phone_number(my_phone, "דני דניאל", "he")
+    sync_members()
     
     # 2. נניח שזה הקוד שרץ ב-AWS Lambda כשמתקבלת הודעה
     incoming_phone = "972501234567" # המספר שהגיע מה-Webhook
@@ -96,4 +492,4 @@ if __name__ == "__main__":
         print(f"משתמש מאומת! שם: {user_data['name']}, שפה: {user_data['language']}")
         # כאן הבוט ימשיך לעבוד בשפה של המשתמש
     else:
-        print("משתמש לא רשום. נא להעביר לתהליך הרשמה.")
\ No newline at end of file
+        print("משתמש לא רשום. נא להעביר לתהליך הרשמה.")
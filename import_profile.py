@@ -0,0 +1,103 @@
+"""
+פרופיל זמני ייבוא (cold start) של נקודת הכניסה ל-Lambda.
+
+מריץ תהליך פייתון חדש עם -X importtime, ומדווח על העלות של כל מודול
+(זמן עצמי וזמן מצטבר כולל תלויות), וגם על זמן הקריאה הראשונה ל-handler
+בבקשת אימות (GET) - המסלול שלא אמור לטעון את openai/requests בכלל.
+
+שימוש:
+    python import_profile.py                 # טבלה של 20 המודולים היקרים
+    python import_profile.py --top 40
+    python import_profile.py --json > profile.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# קוד שרץ בתהליך הנמדד: ייבוא + קריאת GET ראשונה, ודיווח אילו מודולים כבדים נטענו
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+event = {{"httpMethod": "GET", "queryStringParameters": {{"hub.verify_token": "x", "hub.challenge": "1"}}}}
+{module}.lambda_handler(event, None)
+t2 = time.perf_counter()
+heavy = [name for name in ("openai", "requests", "urllib3") if name in sys.modules]
+print("__PROBE__" + json.dumps({{"import_ms": (t1 - t0) * 1000, "first_get_ms": (t2 - t1) * 1000, "heavy_loaded": heavy}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """מפרק את הפלט של -X importtime לרשימת מודולים עם זמן עצמי ומצטבר (מיקרו-שניות)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return rows
+
+
+def profile(module: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    # הלקוחות נוצרים בעצלות, אבל נותנים מפתח דמה למקרה שמשהו עדיין יוצר אותם בייבוא
+    env.setdefault("OPENAI_API_KEY", "profile-dummy-key")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiling {module} failed:\n{result.stderr[-2000:]}")
+
+    probe = {}
+    for line in result.stdout.splitlines():
+        if line.startswith("__PROBE__"):
+            probe = json.loads(line[len("__PROBE__"):])
+
+    modules = parse_importtime(result.stderr)
+    top_level = [row for row in modules if row["depth"] == 0]
+    return {
+        "module": module,
+        "total_import_us": sum(row["cumulative_us"] for row in top_level),
+        "modules": modules,
+        **probe,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="lambda_function")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="פלט JSON מלא (להשוואה בין commits)")
+    args = parser.parse_args()
+
+    report = profile(args.module)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📦 {report['module']}: ייבוא {report['import_ms']:.1f}ms, "
+          f"GET ראשון {report['first_get_ms']:.1f}ms, "
+          f"סה\"כ importtime (כולל אתחול המפרש) {report['total_import_us'] / 1000:.1f}ms")
+    print(f"   מודולים כבדים שנטענו: {', '.join(report['heavy_loaded']) or 'אין'}")
+    print()
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    rows = sorted(report["modules"], key=lambda row: row["cumulative_us"], reverse=True)
+    for row in rows[:args.top]:
+        print(f"{row['cumulative_us'] / 1000:>14.1f} {row['self_us'] / 1000:>9.1f}  {'  ' * row['depth']}{row['module']}")
+
+
+if __name__ == "__main__":
+    main()
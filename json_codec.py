@@ -0,0 +1,83 @@
+"""
+קידוד JSON אחיד לכל המסלולים: גוף ה-Webhook, אחסון השיחות, קובץ המשתמשים,
+תור הכתיבה לגיליון והבקשות ל-WhatsApp ול-Apps Script.
+
+- משתמש ב-orjson אם הוא מותקן (מהיר פי כמה בפענוח ובקידוד), אחרת ב-json של
+  הספרייה הסטנדרטית. אפשר לכפות backend עם JSON_BACKEND ("auto", "orjson", "stdlib").
+- dumps מחזיר bytes קומפקטיים ב-UTF-8 (בלי רווחים ובלי escape לעברית) - בדיוק
+  מה שנכתב לקובץ או נשלח כגוף HTTP, בלי המרה נוספת.
+- loads מקבל str או bytes. שגיאת פענוח היא ValueError בשני ה-backends.
+
+שימוש:
+    body = json_codec.dumps(payload)            # bytes לשליחה: requests.post(url, data=body, headers=JSON_HEADERS)
+    data = json_codec.loads(response.content)
+    json_codec.dump_file(path, data)            # כתיבה אטומית
+"""
+import json
+import os
+from typing import Any, Callable, Optional
+
+import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = getattr(config, 'JSON_BACKEND', 'auto')
+
+# כותרות לבקשת HTTP עם גוף שכבר קודד ב-dumps
+JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+
+def _stdlib_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+
+def _tuple_as_list(value: Any) -> Any:
+    # orjson לא מקודד תת-מחלקות של tuple (NamedTuple); json מקודד אותן כרשימה
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _orjson_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    fallback = _tuple_as_list
+    if default is not None:
+        def fallback(value: Any) -> Any:
+            return list(value) if isinstance(value, tuple) else default(value)
+
+    # OPT_NON_STR_KEYS: מפתחות שאינם מחרוזת (למשל int) מומרים למחרוזת, כמו ב-json
+    return orjson.dumps(obj, default=fallback, option=orjson.OPT_NON_STR_KEYS)
+
+
+BACKENDS = {"stdlib": (_stdlib_dumps, json.loads)}
+if orjson is not None:
+    BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)
+
+if JSON_BACKEND == "auto":
+    BACKEND = "orjson" if orjson is not None else "stdlib"
+elif JSON_BACKEND in BACKENDS:
+    BACKEND = JSON_BACKEND
+else:
+    raise ValueError(f"JSON_BACKEND לא זמין: {JSON_BACKEND} (זמינים: {', '.join(BACKENDS)})")
+
+dumps, loads = BACKENDS[BACKEND]
+
+
+def dumps_str(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """כמו dumps, כמחרוזת (לעמודות טקסט ולשורות לוג)."""
+    return dumps(obj, default).decode("utf-8")
+
+
+def load_file(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(path: str, obj: Any) -> None:
+    """כותב JSON קומפקטי לקובץ בכתיבה אטומית (קובץ זמני ו-os.replace)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(obj))
+    os.replace(tmp_path, path)
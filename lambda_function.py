@@ -1,18 +1,39 @@
-import json
-import traceback
+import json_codec
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 import config
-from whatsApp import (
-    extract_message_info, 
-    send_message, 
-    send_contact,
-    send_typing_state
-)
-from local_storage import check_user_local
-from google_sheets_utils import send_structured_data
+from whatsApp import iter_messages, IncomingMessage
+from outbound import OutboundBatch
+from dedup import create_deduplicator
+from event_queue import get_event_queue
+from conversation_state import flush_conversations
+from tracing import bind, span, start_trace
+from structured_log import get_logger
+from google_sheets_utils import check_user_in_sheets, send_structured_data, flush_sheet_writes
 from ai_chat import chat_with_ai, process_confirmation, has_pending_request
 
-# מניעת כפילויות - זוכר הודעות שכבר טופלו
-processed_messages = set()
+# מניעת כפילויות - זוכר הודעות שכבר טופלו (LRU חסום עם תפוגה)
+processed_messages = create_deduplicator()
+
+log = get_logger("lambda_function")
+
+# עיבוד במקביל של שולחים שונים באותו Webhook (הודעות של אותו שולח מעובדות לפי הסדר)
+SENDER_MAX_WORKERS = getattr(config, 'SENDER_MAX_WORKERS', 4)
+_sender_executor = None
+
+# חלון איחוד (שניות): הודעות רצופות של אותו שולח שהפער ביניהן קטן מהחלון
+# נשלחות ל-OpenAI כקריאה אחת. 0 מבטל את האיחוד.
+COALESCE_WINDOW_SECONDS = getattr(config, 'COALESCE_WINDOW_SECONDS', 5)
+
+# מצב Webhook: "sync" - עיבוד מלא לפני החזרת 200;
+# "deferred" - אימות והכנסה לתור בלבד, והעיבוד מתבצע ב-worker_handler.
+# deferred דורש תור משותף (SQS, או SQLite על EFS); עם תור מקומי ב-/tmp העיבוד נשאר sync.
+WEBHOOK_MODE = getattr(config, 'WEBHOOK_MODE', 'sync')
+_deferred_enabled = None
+
+# מספר אירועים שה-worker מושך בכל סבב, ומרווח ביטחון (מילישניות) לפני timeout של Lambda
+WORKER_BATCH_SIZE = getattr(config, 'WORKER_BATCH_SIZE', 10)
+WORKER_TIME_MARGIN_MS = 10000
 
 # הגדרות שפה
 RESPONSES = {
@@ -33,8 +54,282 @@ RESPONSES = {
     "default": "he"
 }
 
+def _get_sender_executor() -> ThreadPoolExecutor:
+    global _sender_executor
+    if _sender_executor is None:
+        _sender_executor = ThreadPoolExecutor(max_workers=SENDER_MAX_WORKERS, thread_name_prefix="sender")
+    return _sender_executor
+
+
+def handle_message(message: IncomingMessage) -> str:
+    """
+    מטפל בהודעה נכנסת בודדת (או בכמה הודעות שאוחדו): זיהוי המשתמש, שיחה עם AI ושליחת התשובות.
+    מניעת כפילויות מתבצעת לפני כן ב-process_messages.
+    """
+    from_number, message_text, msg_id = message.from_number, message.text, message.msg_id
+    # תוכן ההודעה נכתב רק ברמת DEBUG (מידע אישי ונפח לוג)
+    log.info("📩 הודעה נכנסת", phone=from_number, msg_id=msg_id, chars=len(message_text))
+    log.debug("📩 תוכן ההודעה: %s", message_text, phone=from_number)
+
+    # כל השליחות היוצאות של ההודעה - ממתינים לסיומן ביציאה מהבלוק
+    with span("handle_message", msg_id=msg_id), OutboundBatch() as outbound:
+        # שליחת מצב הקלדה מיידית - רץ במקביל לבדיקת המשתמש ולקריאה ל-OpenAI
+        if msg_id:
+            outbound.send_typing_state(msg_id)
+
+        # ============================================
+        # שלב א': זיהוי המשתמש (מטמון -> קובץ JSON מקומי -> גיליון)
+        # ============================================
+        with span("check_user"):
+            exists, user_data = check_user_in_sheets(from_number)
+
+        user_name = "חבר"
+        user_lang = RESPONSES["default"]
+
+        if exists and user_data:
+            user_name = user_data.get("name") or "חבר"
+            user_lang = user_data.get("language") or RESPONSES["default"]
+
+        lang_res = RESPONSES.get(user_lang, RESPONSES["default"])
+
+        # ============================================
+        # שלב ב': שליחת תגובה - בוט AI
+        # ============================================
+        if exists:
+            # --- משתמש רשום - שיחה עם AI ---
+            log.debug("✅ משתמש רשום: %s", user_name)
+
+            # בדוק אם יש פנייה שמחכה לאישור
+            if has_pending_request(from_number):
+                log.debug("📊 יש פנייה שמחכה לאישור", phone=from_number)
+
+                # המשתמש צריך לאשר/לדחות פנייה
+                with span("process_confirmation"):
+                    response_text, is_confirmed, request_text = process_confirmation(
+                        from_number,
+                        message_text,
+                        user_lang
+                    )
+
+                if is_confirmed and request_text:
+                    # הפנייה אושרה - נשמרת בתור הכתיבה לגיליון, והשליחה רצה במקביל לתשובה למשתמש
+                    log.info("📝 פנייה אושרה", phone=from_number, chars=len(request_text))
+                    with span("send_structured_data"):
+                        send_structured_data(user_name, request_text, from_number)
+                    outbound.submit(flush_sheet_writes)
+
+                outbound.send_message(from_number, response_text)
+
+            else:
+                # שיחה רגילה עם AI; שמירת הסבב בהיסטוריה (וקיפול/סיכום) רצה אחרי שליחת התשובה
+                after_reply = []
+                with span("chat_with_ai"):
+                    response_text, pending_request = chat_with_ai(
+                        from_number,
+                        message_text,
+                        user_name,
+                        user_lang,
+                        after_reply=after_reply.append,
+                    )
+
+                if pending_request:
+                    log.info("⏳ פנייה מחכה לאישור", phone=from_number, chars=len(pending_request))
+
+                outbound.send_message(from_number, response_text)
+                for task in after_reply:
+                    outbound.submit(task, key=from_number)
+
+        else:
+            # --- משתמש לא רשום ---
+            # שלוש ההודעות נשלחות לפי הסדר (אותו נמען), במקביל לחיווי ההקלדה
+            log.info("❌ משתמש לא רשום", phone=from_number)
+            outbound.send_message(from_number, lang_res["not_found_msg"])
+
+            policy_text = lang_res["not_found_policy"]
+            policy_url = getattr(config, 'BEIT_LEAH_URL', 'https://example.com')
+            outbound.send_message(from_number, f"{policy_text}\n{policy_url}")
+
+            contact_phone = getattr(config, 'CONTACT_PHONE', "0532787416")
+            outbound.send_contact(from_number, lang_res["contact_person_name"], contact_phone)
+
+    return "processed"
+
+
+def coalesce_groups(
+    messages: List[IncomingMessage],
+    window_seconds: float = COALESCE_WINDOW_SECONDS,
+) -> List[List[IncomingMessage]]:
+    """
+    מחלק הודעות של שולח אחד (ממוינות לפי זמן) לקבוצות של הודעות רצופות, כשהפער
+    בין הודעה להודעה שלפניה הוא עד window_seconds. כל הודעה מאריכה את החלון.
+    """
+    if window_seconds <= 0:
+        return [[message] for message in messages]
+    groups: List[List[IncomingMessage]] = []
+    for message in messages:
+        previous = groups[-1][-1] if groups else None
+        if (
+            previous is not None
+            and previous.timestamp is not None
+            and message.timestamp is not None
+            and message.timestamp - previous.timestamp <= window_seconds
+        ):
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+def _merge_group(group: List[IncomingMessage]) -> IncomingMessage:
+    """הודעה אחת מקבוצה: הטקסטים מחוברים, והמזהה והזמן הם של ההודעה האחרונה."""
+    if len(group) == 1:
+        return group[0]
+    return group[-1]._replace(text="\n".join(message.text for message in group))
+
+
+def coalesce_messages(
+    messages: List[IncomingMessage],
+    window_seconds: float = COALESCE_WINDOW_SECONDS,
+) -> List[IncomingMessage]:
+    """
+    מאחד הודעות רצופות של שולח אחד (ממוינות לפי זמן) להודעה אחת, כשהפער בין
+    הודעה להודעה שלפניה הוא עד window_seconds. כל הודעה מאריכה את החלון.
+    ההודעה המאוחדת נושאת את המזהה והזמן של ההודעה האחרונה.
+    """
+    return [_merge_group(group) for group in coalesce_groups(messages, window_seconds)]
+
+
+def _handle_sender_messages(messages: List[IncomingMessage]) -> List[str]:
+    """
+    מעבד את ההודעות של שולח אחד לפי הסדר, אחרי איחוד הודעות רצופות.
+    אם הטיפול נכשל, המזהים של ההודעות שלא טופלו נמחקים ממניעת הכפילויות, כדי
+    שניסיון חוזר (worker במצב deferred, או שליחה חוזרת של WhatsApp) יעבד אותן שוב.
+    """
+    if has_pending_request(messages[0].from_number):
+        # תשובה לבקשת אישור מטופלת לבד, כדי ש"כן" לא יאוחד עם בקשה חדשה
+        groups = [messages[:1]] + coalesce_groups(messages[1:])
+    else:
+        groups = coalesce_groups(messages)
+    if len(groups) < len(messages):
+        log.info("🔗 אוחדו %d הודעות ל-%d קריאות", len(messages), len(groups))
+    results = []
+    for index, group in enumerate(groups):
+        try:
+            results.append(handle_message(_merge_group(group)))
+        except Exception:
+            for message in (m for unhandled in groups[index:] for m in unhandled):
+                processed_messages.discard(message.msg_id)
+            raise
+    return results
+
+
+def process_messages(messages: List[IncomingMessage]) -> List[str]:
+    """
+    מעבד את כל הודעות הטקסט באירוע. ההודעות מקובצות לפי שולח: הודעות של אותו
+    שולח מטופלות לפי סדר הזמן, ושולחים שונים מטופלים במקביל.
+    מחזיר סטטוס לכל הודעה שטופלה ו-"duplicate" לכל הודעה כפולה.
+    זורק את השגיאה הראשונה אם הטיפול באחד השולחים נכשל.
+    """
+    by_sender: Dict[str, List[IncomingMessage]] = {}
+    duplicates: List[str] = []
+    for message in messages:
+        # מניעת כפילויות - בדוק אם כבר טיפלנו בהודעה הזו
+        with span("dedup"):
+            duplicate = processed_messages.check_and_add(message.msg_id)
+        if duplicate:
+            log.info("⚠️ הודעה כפולה, מתעלם", msg_id=message.msg_id)
+            duplicates.append("duplicate")
+            continue
+        by_sender.setdefault(message.from_number, []).append(message)
+    groups = [
+        sorted(group, key=lambda m: m.timestamp or 0)
+        for group in by_sender.values()
+    ]
+
+    if len(groups) <= 1:
+        return duplicates + [r for group in groups for r in _handle_sender_messages(group)]
+
+    futures = [_get_sender_executor().submit(bind(_handle_sender_messages), group) for group in groups]
+    results: List[str] = duplicates
+    errors = []
+    for future in futures:
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
+
+
+def _use_deferred_mode() -> bool:
+    """
+    האם להכניס אירועים לתור במקום לעבד אותם. תור מקומי ל-container לא נראה
+    ל-worker (שרץ ב-container אחר), ואירועים בו עלולים לא להיות מעובדים לעולם.
+    """
+    global _deferred_enabled
+    if _deferred_enabled is None:
+        _deferred_enabled = WEBHOOK_MODE == "deferred" and get_event_queue().shared
+        if WEBHOOK_MODE == "deferred" and not _deferred_enabled:
+            log.error("⚠️ WEBHOOK_MODE=deferred דורש תור משותף (EVENT_QUEUE_BACKEND='sqs' או "
+                      "EVENT_QUEUE_DB_SHARED) - מעבד במצב sync")
+    return _deferred_enabled
+
+
+def _parse_text_messages(raw_body) -> List[IncomingMessage]:
+    """מפרק את גוף ה-Webhook ומחזיר את כל הודעות הטקסט שבו."""
+    body_data = json_codec.loads(raw_body) if isinstance(raw_body, (str, bytes)) else raw_body
+    # חילוץ כל ההודעות מוואטסאפ (ייתכנו כמה הודעות בבקשה אחת)
+    return [m for m in iter_messages(body_data) if m.from_number and m.text]
+
+
+def worker_handler(event, context):
+    """
+    נקודת כניסה ל-worker במצב deferred: מושך אירועים מהתור ומריץ עליהם את
+    תהליך העיבוד הרגיל, עד שהתור מתרוקן או שנגמר הזמן של ההפעלה.
+    אירוע שנכשל חוזר לתור עם השהיה (ואחרי מספר ניסיונות מועבר ל-dead).
+    """
+    queue = get_event_queue()
+    processed = failed = 0
+    while True:
+        if context is not None and context.get_remaining_time_in_millis() < WORKER_TIME_MARGIN_MS:
+            break
+        events = queue.claim(WORKER_BATCH_SIZE)
+        if not events:
+            break
+        for queued in events:
+            try:
+                with start_trace("worker_event", event_id=queued.event_id, attempt=queued.attempts):
+                    process_messages(_parse_text_messages(queued.body))
+                queue.ack(queued.event_id)
+                processed += 1
+            except Exception as e:
+                log.error("🔥 WORKER ERROR: %s", e, event_id=queued.event_id, attempt=queued.attempts, exc_info=True)
+                queue.fail(queued.event_id, str(e))
+                failed += 1
+
+    # Lambda מקפיא את ה-container בסוף ההפעלה (atexit לא מובטח) - כותבים עכשיו את שינויי השיחות
+    with span("flush_conversations"):
+        flush_conversations()
+    log.info("🏁 Worker done", processed=processed, failed=failed)
+    return {"processed": processed, "failed": failed}
+
+
 def lambda_handler(event, context):
-    print("🚀 Lambda Started")
+    with start_trace("lambda_handler") as trace:
+        try:
+            response = _handle_event(event, context)
+        finally:
+            # אחרי OutboundBatch.wait (כולל save_turn שרץ אחרי התשובה): Lambda מקפיא את
+            # ה-container בסוף ההפעלה ו-atexit לא מובטח, ולכן שינויי השיחות נכתבים עכשיו
+            with span("flush_conversations"):
+                flush_conversations()
+        trace.set(status=response["statusCode"])
+        return response
+
+
+def _handle_event(event, context):
+    log.debug("🚀 Lambda Started")
     
     # --- תיקון קריטי לזיהוי גרסת API Gateway (V1 vs V2) ---
     method = event.get("httpMethod") # ניסיון גרסה 1
@@ -42,7 +337,7 @@ def lambda_handler(event, context):
         # ניסיון גרסה 2 (לפי הלוג ששלחת)
         method = event.get("requestContext", {}).get("http", {}).get("method")
     
-    print(f"👉 Method Identified: {method}")
+    log.debug("👉 Method Identified: %s", method)
 
     # --- 1. אימות Webhook (GET) ---
     if method == "GET":
@@ -51,110 +346,36 @@ def lambda_handler(event, context):
             return {"statusCode": 200, "body": params.get("hub.challenge")}
         return {"statusCode": 403, "body": "Forbidden"}
 
-    # --- 2. עיבוד הודעה (POST) ---
+    # --- 2. עיבוד הודעות (POST) ---
     if method == "POST":
         try:
             # חילוץ הגוף (Body)
             raw_body = event.get("body", "{}")
-            body_data = json.loads(raw_body) if isinstance(raw_body, str) else raw_body
-            
-            # חילוץ נתונים מוואטסאפ
-            from_number, message_text, msg_id = extract_message_info(body_data)
+            with span("parse_body"):
+                messages = _parse_text_messages(raw_body)
             
-            if not from_number or not message_text:
-                print("⚠️ הודעה ללא טקסט או מספר (אולי סטטוס/תמונה)")
+            if not messages:
+                log.debug("⚠️ הודעה ללא טקסט או מספר (אולי סטטוס/תמונה)")
                 return {"statusCode": 200, "body": "Event processed"}
-            
-            print(f"📩 הודעה נכנסת מ-{from_number}: {message_text}")
 
-            # מניעת כפילויות - בדוק אם כבר טיפלנו בהודעה הזו
-            if msg_id in processed_messages:
-                print(f"⚠️ הודעה כפולה, מתעלם: {msg_id}")
-                return {"statusCode": 200, "body": "Duplicate ignored"}
-            processed_messages.add(msg_id)
-            
-            # מגביל את הזיכרון - שומר רק 1000 הודעות אחרונות
-            if len(processed_messages) > 1000:
-                processed_messages.clear()
-
-            # שליחת מצב הקלדה מיידית
-            if msg_id:
-                send_typing_state(msg_id)
-
-            # ============================================
-            # שלב א': בדיקה בקובץ JSON מקומי
-            # ============================================
-            exists, user_data = check_user_local(from_number)
-            
-            user_name = "חבר"
-            user_lang = RESPONSES["default"]
-            
-            if exists and user_data:
-                user_name = user_data.get("name") or "חבר"
-                user_lang = user_data.get("language") or RESPONSES["default"]
+            if _use_deferred_mode():
+                # אישור מהיר - העיבוד (OpenAI, גיליון, שליחות) מתבצע ב-worker_handler
+                if not isinstance(raw_body, str):
+                    raw_body = json_codec.dumps_str(raw_body)
+                with span("enqueue"):
+                    event_id = get_event_queue().enqueue(raw_body)
+                log.info("📥 האירוע נכנס לתור", event_id=event_id)
+                return {"statusCode": 200, "body": "EVENT_QUEUED"}
 
-            lang_res = RESPONSES.get(user_lang, RESPONSES["default"])
-            
-            # ============================================
-            # שלב ב': שליחת תגובה - בוט AI
-            # ============================================
-            if exists:
-                # --- משתמש רשום - שיחה עם AI ---
-                print(f"✅ משתמש רשום: {user_name}")
-                
-                # שלח אינדיקציית הקלדה
-                if msg_id:
-                    send_typing_state(msg_id)
-                
-                # בדוק אם יש פנייה שמחכה לאישור
-                if has_pending_request(from_number):
-                    print(f"📊 יש פנייה שמחכה לאישור")
-                    
-                    # המשתמש צריך לאשר/לדחות פנייה
-                    response_text, is_confirmed, request_text = process_confirmation(
-                        from_number, 
-                        message_text, 
-                        user_lang
-                    )
-                    
-                    if is_confirmed and request_text:
-                        # הפנייה אושרה - שלח לגיליון
-                        print(f"📝 פנייה אושרה: {request_text}")
-                        send_structured_data(user_name, request_text, from_number)
-                    
-                    send_message(from_number, response_text)
-                    
-                else:
-                    # שיחה רגילה עם AI
-                    response_text, pending_request = chat_with_ai(
-                        from_number,
-                        message_text,
-                        user_name,
-                        user_lang
-                    )
-                    
-                    if pending_request:
-                        print(f"⏳ פנייה מחכה לאישור: {pending_request}")
-                    
-                    send_message(from_number, response_text)
-                
-            else:
-                # --- משתמש לא רשום ---
-                print(f"❌ משתמש לא רשום: {from_number}")
-                send_message(from_number, lang_res["not_found_msg"])
-                
-                policy_text = lang_res["not_found_policy"]
-                policy_url = getattr(config, 'BEIT_LEAH_URL', 'https://example.com')
-                send_message(from_number, f"{policy_text}\n{policy_url}")
-                
-                contact_phone = getattr(config, 'CONTACT_PHONE', "0532787416")
-                send_contact(from_number, lang_res["contact_person_name"], contact_phone) 
+            with span("process_messages", messages=len(messages)):
+                results = process_messages(messages)
+            if all(result == "duplicate" for result in results):
+                return {"statusCode": 200, "body": "Duplicate ignored"}
 
         except Exception as e:
-            print(f"🔥 FATAL ERROR: {e}")
-            traceback.print_exc()
+            log.error("🔥 FATAL ERROR: %s", e, exc_info=True)
             return {"statusCode": 500, "body": "Internal Error"}
             
         return {"statusCode": 200, "body": "EVENT_PROCESSED"}
     
-    return {"statusCode": 404, "body": "Method Not Allowed"}
\ No newline at end of file
+    return {"statusCode": 404, "body": "Method Not Allowed"}
@@ -1,42 +1,187 @@
-import json
 import os
+import threading
+import time
+from collections import OrderedDict
 
-USERS_DB = {}
+import config
+import json_codec
+from structured_log import get_logger
+from whatsApp import normalize_phone_relaxed
 
-def load_users():
-    global USERS_DB
+log = get_logger("local_storage")
+
+# תיקייה לקבצי נתונים הניתנים לכתיבה (ב-Lambda רק /tmp ניתן לכתיבה)
+DATA_DIR = getattr(
+    config,
+    'DATA_DIR',
+    '/tmp' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else os.path.dirname(os.path.abspath(__file__)),
+)
+
+# קובץ המשתמשים (פורמט ישן: {"972...": {"name": ..., "language": ...}} או פורמט compact)
+USERS_FILE = getattr(config, 'USERS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json'))
+
+# כל כמה שניות לבדוק אם הקובץ השתנה (mtime), וכמה זמן לזכור "לא נמצא"
+USERS_RELOAD_CHECK_SECONDS = getattr(config, 'USERS_RELOAD_CHECK_SECONDS', 5)
+USERS_NEGATIVE_TTL_SECONDS = getattr(config, 'USERS_NEGATIVE_TTL_SECONDS', 60)
+USERS_NEGATIVE_CACHE_SIZE = 10000
+
+# שדות ברירת מחדל לכל משתמש בפורמט compact
+COMPACT_FORMAT = "compact-v1"
+DEFAULT_FIELDS = ("name", "language")
+
+
+def normalize_phone_key(phone_number):
+    """מפתח אחיד למספר טלפון (E.164). מספר שאי אפשר לנרמל נשמר כמו שהוא."""
     try:
-        # קבלת הנתיב המוחלט של התיקייה שבה הקובץ הזה נמצא
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        json_path = os.path.join(current_dir, 'users.json')
-        
-        print(f"📂 מנסה לטעון את הקובץ מ: {json_path}") # הדפסה לדיבאג
-
-        if not os.path.exists(json_path):
-            print(f"❌ הקובץ users.json לא נמצא בנתיב המצופה!")
-            USERS_DB = {}
-            return
-
-        with open(json_path, 'r', encoding='utf-8') as f:
-            USERS_DB = json.load(f)
-        print(f"✅ Users loaded successfully. Total: {len(USERS_DB)}")
-        
-    except Exception as e:
-        print(f"❌ Error loading users.json: {e}")
-        USERS_DB = {}
-
-# טעינה ראשונית
-load_users()
+        return normalize_phone_relaxed(phone_number)
+    except ValueError:
+        return phone_number
+
+
+class UserDirectory:
+    """
+    מאגר המשתמשים הרשומים, עם אינדקס לפי מספר טלפון מנורמל (E.164).
+
+    - הקובץ נטען מחדש רק כשה-mtime שלו משתנה (נבדק לכל היותר פעם ב-X שניות),
+      כך שקובץ חסר או ריק לא גורם לקריאה מהדיסק בכל הודעה.
+    - חיפושים שלא נמצאו נשמרים במטמון שלילי עם תפוגה.
+    - המשתמשים נשמרים כ-tuple לפי רשימת שדות (חסכוני בזיכרון), והמילון נבנה רק בהחזרה.
+    """
+
+    def __init__(self, path=USERS_FILE,
+                 reload_check_seconds=USERS_RELOAD_CHECK_SECONDS,
+                 negative_ttl_seconds=USERS_NEGATIVE_TTL_SECONDS):
+        self.path = path
+        self.reload_check_seconds = reload_check_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.fields = DEFAULT_FIELDS
+        self._index = {}
+        self._negative = OrderedDict()
+        self._mtime = None
+        self._loaded = False
+        self._last_check = None
+        self._lock = threading.Lock()
+
+    def _read_file(self):
+        """קורא את הקובץ (בשני הפורמטים) ומחזיר (שדות, אינדקס)."""
+        data = json_codec.load_file(self.path)
+
+        if isinstance(data, dict) and data.get("format") == COMPACT_FORMAT:
+            # המפתחות בפורמט compact כבר מנורמלים בשמירה - טעינה בלי עיבוד נוסף
+            fields = tuple(data["fields"])
+            index = {row[0]: tuple(row[1:]) for row in data["rows"]}
+            return fields, index
+
+        # פורמט ישן - מילון לפי המחרוזת ש-WhatsApp שולח
+        fields = list(DEFAULT_FIELDS)
+        for user in data.values():
+            for key in user:
+                if key not in fields:
+                    fields.append(key)
+        fields = tuple(fields)
+        index = {
+            normalize_phone_key(phone): tuple(user.get(field) for field in fields)
+            for phone, user in data.items()
+        }
+        return fields, index
+
+    def reload(self, force=False):
+        """טוען את הקובץ מחדש אם ה-mtime השתנה (או תמיד, עם force)."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_check is not None and now - self._last_check < self.reload_check_seconds:
+                return
+            self._last_check = now
+
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if not force and self._loaded and mtime == self._mtime:
+                return
+            self._mtime = mtime
+            self._loaded = True
+            self._negative.clear()
+
+            if mtime is None:
+                log.error("❌ הקובץ %s לא נמצא בנתיב המצופה!", self.path)
+                self._index = {}
+                return
+            log.debug("📂 מנסה לטעון את הקובץ מ: %s", self.path)
+            try:
+                self.fields, self._index = self._read_file()
+                log.info("✅ Users loaded successfully", path=self.path, total=len(self._index))
+            except Exception as e:
+                log.error("❌ Error loading %s: %s", self.path, e)
+                self._index = {}
+
+    def get(self, phone_number):
+        """מחזיר את נתוני המשתמש (מילון) או None."""
+        self.reload()
+        key = normalize_phone_key(phone_number)
+        with self._lock:
+            expires_at = self._negative.get(key)
+            if expires_at is not None:
+                if expires_at > time.monotonic():
+                    return None
+                del self._negative[key]
+
+            row = self._index.get(key)
+            if row is None:
+                self._negative[key] = time.monotonic() + self.negative_ttl_seconds
+                if len(self._negative) > USERS_NEGATIVE_CACHE_SIZE:
+                    self._negative.popitem(last=False)
+                return None
+            return {field: value for field, value in zip(self.fields, row) if value is not None}
+
+    def __len__(self):
+        self.reload()
+        return len(self._index)
+
+    def __contains__(self, phone_number):
+        return self.get(phone_number) is not None
+
+
+def save_users_compact(users, path, fields=DEFAULT_FIELDS, normalized=False):
+    """
+    שומר משתמשים בפורמט compact (שורות במקום מילונים, בלי הזחה) בכתיבה אטומית.
+    המספרים נשמרים מנורמלים, כך שהטעינה לא צריכה לנרמל אותם שוב.
+    users: מילון {טלפון: {שדה: ערך}}.
+    normalized: המפתחות כבר מנורמלים (למשל אחרי normalize_phones) - בלי נרמול נוסף.
+    """
+    key = (lambda phone: phone) if normalized else normalize_phone_key
+    data = {
+        "format": COMPACT_FORMAT,
+        "fields": list(fields),
+        "rows": [
+            [key(phone)] + [user.get(field) for field in fields]
+            for phone, user in users.items()
+        ],
+    }
+    json_codec.dump_file(path, data)
+
+
+USERS_DB = UserDirectory()
+
+def load_users():
+    """טוען מחדש את מאגר המשתמשים מהדיסק."""
+    USERS_DB.reload(force=True)
 
 def check_user_local(phone_number):
-    if not USERS_DB:
-        load_users()
-    
     user_data = USERS_DB.get(phone_number)
-    
+
     if user_data:
-        print(f"✅ User found locally: {user_data.get('name')}")
+        log.debug("✅ User found locally", phone=phone_number)
         return True, user_data
     else:
-        print(f"❌ User {phone_number} not found in local JSON.")
-        return False, None
\ No newline at end of file
+        log.debug("❌ User not found in local JSON", phone=phone_number)
+        return False, None
+
+
+if __name__ == "__main__":
+    # המרת קובץ משתמשים לפורמט compact: python local_storage.py users.json users.compact.json
+    import sys
+    source, target = sys.argv[1], sys.argv[2]
+    users = json_codec.load_file(source)
+    save_users_compact(users, target)
+    print(f"✅ {len(users)} users written to {target}")
@@ -0,0 +1,167 @@
+"""
+ייבוא חברים בכמות מקובץ CSV או XLSX (יצוא מהגיליון / ממערכת החברים) למאגר המשתמשים.
+
+- עמודות מזוהות לפי שם (עברית או אנגלית): טלפון, שם, שפה. שאר העמודות נשמרות כשדות נוספים.
+- כל המספרים מנורמלים במעבר אחד (whatsApp.normalize_phones).
+- שורות לא תקינות (מספר שאי אפשר לנרמל, שפה לא נתמכת) ומספרים כפולים נאספים
+  לדו"ח דחיות; במספר כפול נשמרת השורה הראשונה.
+- המאגר נכתב בכתיבה אטומית בפורמט compact (save_users_compact).
+- קובצי XLSX דורשים openpyxl (pip install openpyxl); CSV לא דורש כלום.
+
+שימוש:
+    python member_import.py members.csv
+    python member_import.py members.xlsx --output users.json --rejects rejects.csv
+    python member_import.py members.csv --dry-run
+"""
+import csv
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from local_storage import DEFAULT_FIELDS, USERS_FILE, save_users_compact
+from whatsApp import normalize_phones
+
+SUPPORTED_LANGUAGES = ("he", "en")
+DEFAULT_LANGUAGE = "he"
+
+# שמות עמודות מוכרים (אחרי הסרת רווחים והמרה לאותיות קטנות)
+COLUMN_ALIASES = {
+    "phone": ("phone", "phone_number", "mobile", "טלפון", "נייד", "מספר טלפון"),
+    "name": ("name", "full_name", "שם", "שם מלא"),
+    "language": ("language", "lang", "שפה"),
+}
+
+
+class Reject(NamedTuple):
+    row: int      # מספר השורה בקובץ (כולל שורת הכותרת)
+    phone: str
+    reason: str
+
+
+class ImportResult(NamedTuple):
+    users: Dict[str, Dict[str, Any]]   # {טלפון מנורמל: {שדה: ערך}}
+    fields: Tuple[str, ...]
+    rejects: List[Reject]
+    total_rows: int
+
+
+def _canonical_header(header: Any) -> str:
+    name = str(header or "").strip().lower()
+    for field, aliases in COLUMN_ALIASES.items():
+        if name in aliases:
+            return field
+    return name
+
+
+def read_csv(path: str) -> Tuple[List[str], List[List[Any]]]:
+    """(כותרות, שורות) מקובץ CSV (גם עם BOM, כמו ביצוא מ-Excel)."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        return header, list(reader)
+
+
+def read_xlsx(path: str) -> Tuple[List[str], List[List[Any]]]:
+    """(כותרות, שורות) מהגיליון הראשון בקובץ XLSX."""
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise RuntimeError("ייבוא XLSX דורש את openpyxl (pip install openpyxl), או יצוא ל-CSV") from e
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        return header, [list(row) for row in rows]
+    finally:
+        workbook.close()
+
+
+def read_table(path: str) -> Tuple[List[str], List[List[Any]]]:
+    if os.path.splitext(path)[1].lower() in (".xlsx", ".xlsm"):
+        return read_xlsx(path)
+    return read_csv(path)
+
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # מספר טלפון שנשמר כמספר ב-Excel (למשל 972501234567.0)
+        value = int(value)
+    return str(value).strip()
+
+
+def import_members(header: List[Any], rows: Iterable[List[Any]]) -> ImportResult:
+    """בונה את מאגר המשתמשים מטבלה: נרמול, ולידציה והסרת כפילויות."""
+    columns = [_canonical_header(name) for name in header]
+    if "phone" not in columns:
+        raise ValueError(f"לא נמצאה עמודת טלפון בכותרות: {header}")
+    phone_index = columns.index("phone")
+    fields = tuple(DEFAULT_FIELDS) + tuple(
+        name for name in dict.fromkeys(columns) if name and name != "phone" and name not in DEFAULT_FIELDS
+    )
+
+    # (מספר שורה בקובץ, ערכי התאים כטקסט), בלי שורות ריקות
+    numbered = []
+    for line, row in enumerate(rows, start=2):
+        cells = [_cell_text(cell) for cell in row]
+        if any(cells):
+            numbered.append((line, cells))
+    raw_phones = [cells[phone_index] if phone_index < len(cells) else "" for _, cells in numbered]
+    normalized = normalize_phones(raw_phones)
+
+    users: Dict[str, Dict[str, Any]] = {}
+    rejects: List[Reject] = []
+    for (line, cells), raw_phone, phone in zip(numbered, raw_phones, normalized):
+        if phone is None:
+            rejects.append(Reject(line, raw_phone, "missing phone" if not raw_phone else "invalid phone"))
+            continue
+        if phone in users:
+            rejects.append(Reject(line, raw_phone, f"duplicate of {phone}"))
+            continue
+        user = {name: value for name, value in zip(columns, cells) if value and name and name != "phone"}
+        language = user.get("language", DEFAULT_LANGUAGE).lower()
+        if language not in SUPPORTED_LANGUAGES:
+            rejects.append(Reject(line, raw_phone, f"unsupported language: {language}"))
+            continue
+        user["language"] = language
+        users[phone] = user
+    return ImportResult(users, fields, rejects, len(numbered))
+
+
+def write_rejects(rejects: List[Reject], path: str) -> None:
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(Reject._fields)
+        writer.writerows(rejects)
+
+
+def import_file(path: str, output: str = USERS_FILE, dry_run: bool = False) -> ImportResult:
+    """קורא קובץ, בונה את המאגר וכותב אותו (אטומית) ל-output, אלא אם dry_run."""
+    header, rows = read_table(path)
+    result = import_members(header, rows)
+    if not dry_run:
+        save_users_compact(result.users, output, result.fields, normalized=True)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="קובץ CSV או XLSX")
+    parser.add_argument("--output", default=USERS_FILE, help="קובץ המשתמשים לכתיבה (ברירת מחדל: USERS_FILE)")
+    parser.add_argument("--rejects", help="קובץ CSV לדו\"ח השורות שנדחו")
+    parser.add_argument("--dry-run", action="store_true", help="בדיקה בלבד, בלי לכתוב את המאגר")
+    args = parser.parse_args()
+
+    result = import_file(args.source, args.output, args.dry_run)
+    print(f"✅ {len(result.users)} חברים מתוך {result.total_rows} שורות"
+          + (" (dry run)" if args.dry_run else f" נכתבו ל-{args.output}"))
+    if result.rejects:
+        print(f"⚠️ {len(result.rejects)} שורות נדחו")
+        if args.rejects:
+            write_rejects(result.rejects, args.rejects)
+            print(f"📄 דו\"ח דחיות: {args.rejects}")
+        else:
+            for reject in result.rejects[:20]:
+                print(f"  שורה {reject.row}: {reject.phone!r} - {reject.reason}")
@@ -0,0 +1,102 @@
+"""
+מודול שליחה יוצאת - הפעלת שליחות עצמאיות במקביל.
+
+שליחות לאותו נמען (הודעות ואנשי קשר שמוצגים בצ'אט) נשמרות בסדר שבו נשלחו,
+ושליחות שאינן מוצגות כהודעה (חיווי הקלדה, כתיבה לגיליון) רצות במקביל
+לשאר העבודה - למשל חיווי ההקלדה רץ בזמן הקריאה ל-OpenAI.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from structured_log import get_logger
+from tracing import bind, span
+from whatsApp import send_message, send_contact, send_typing_state
+
+# מספר התהליכונים לשליחה (משותף לכל ההפעלות ב-container חם)
+OUTBOUND_MAX_WORKERS = getattr(config, 'OUTBOUND_MAX_WORKERS', 8)
+
+# זמן מקסימלי להמתנה לסיום כל השליחות לפני שה-handler מחזיר תשובה (שניות)
+OUTBOUND_WAIT_TIMEOUT = getattr(config, 'OUTBOUND_WAIT_TIMEOUT', 30)
+
+log = get_logger("outbound")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=OUTBOUND_MAX_WORKERS,
+                    thread_name_prefix="outbound",
+                )
+    return _executor
+
+
+class OutboundBatch:
+    """
+    קבוצת שליחות של הפעלה אחת.
+
+    - submit עם key: רץ רק אחרי שהשליחה הקודמת עם אותו key הסתיימה (שמירת סדר לנמען).
+    - submit בלי key: רץ מיד במקביל.
+    - ביציאה מבלוק ה-with ממתינים לכל השליחות, כי Lambda מקפיא את התהליך אחרי החזרת התשובה.
+    """
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None):
+        self._executor = executor or _get_executor()
+        self._futures: List[Future] = []
+        self._tails: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, key: Optional[str] = None, **kwargs: Any) -> Future:
+        with self._lock:
+            previous = self._tails.get(key) if key is not None else None
+
+            def run():
+                if previous is not None:
+                    # התור של ה-executor הוא FIFO, ולכן הקודם כבר רץ או הסתיים
+                    wait([previous])
+                with span(getattr(fn, "__name__", "outbound")):
+                    return fn(*args, **kwargs)
+
+            future = self._executor.submit(bind(run))
+            self._futures.append(future)
+            if key is not None:
+                self._tails[key] = future
+            return future
+
+    def send_message(self, to: str, text: str) -> Future:
+        """הודעת טקסט - בסדר ביחס לשאר השליחות לאותו נמען."""
+        return self.submit(send_message, to, text, key=to)
+
+    def send_contact(self, to: str, name: str, phone_number: str, **kwargs: Any) -> Future:
+        """כרטיס איש קשר - בסדר ביחס לשאר השליחות לאותו נמען."""
+        return self.submit(send_contact, to, name, phone_number, key=to, **kwargs)
+
+    def send_typing_state(self, msg_id: str) -> Future:
+        """חיווי הקלדה - לא מוצג כהודעה, ולכן רץ במקביל."""
+        return self.submit(send_typing_state, msg_id)
+
+    def wait(self, timeout: Optional[float] = OUTBOUND_WAIT_TIMEOUT) -> None:
+        """ממתין לסיום כל השליחות ורושם שגיאות ללוג (לא זורק)."""
+        with self._lock:
+            futures = list(self._futures)
+        with span("outbound_wait", sends=len(futures)):
+            done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                log.error("❌ OUTBOUND_ERROR: %s", error, exc_info=error)
+        if not_done:
+            log.warning("⚠️ OUTBOUND_TIMEOUT: %d שליחות לא הסתיימו בזמן", len(not_done))
+
+    def __enter__(self) -> "OutboundBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.wait()
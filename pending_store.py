@@ -0,0 +1,221 @@
+"""
+אחסון פניות שמחכות לאישור, משותף בין containers של Lambda.
+
+כשה"כן" של המשתמש מגיע ל-container אחר או אחרי cold start, מילון בזיכרון
+לא מכיר את הפנייה. לכן יש ממשק אחד עם שלושה מימושים:
+- InMemoryPendingStore: בתוך התהליך (ברירת מחדל, כמו קודם).
+- SQLitePendingStore: קובץ SQLite (למשל על EFS, או /tmp ל-container יחיד).
+- RedisPendingStore: כל שרת תואם Redis; אפשר להזריק לקוח (למשל FakeRedis מ-stub_servers).
+
+בכל המימושים יש תפוגה (TTL), ו-pop הוא קריאה-ומחיקה אטומית - כך שאישור
+כפול מאותו משתמש מגיש את הפנייה פעם אחת בלבד.
+
+המחלקות תומכות גם בגישה כמו מילון (in / [] / del), לתאימות עם קוד קיים.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import config
+from local_storage import DATA_DIR
+from structured_log import get_logger
+
+log = get_logger("pending_store")
+
+# סוג האחסון: "memory" (ברירת מחדל), "sqlite" או "redis"
+PENDING_STORE = getattr(config, 'PENDING_STORE', 'memory')
+PENDING_DB = getattr(config, 'PENDING_DB', os.path.join(DATA_DIR, 'pending_requests.db'))
+
+# כמה זמן (שניות) פנייה מחכה לאישור לפני שהיא נמחקת
+PENDING_TTL_SECONDS = getattr(config, 'PENDING_TTL_SECONDS', 60 * 60)
+PENDING_KEY_PREFIX = "pending:"
+
+
+class PendingRequestStore:
+    """ממשק: שמירה עם תפוגה, קריאה, מחיקה, וקריאה-ומחיקה אטומית."""
+
+    def get(self, phone_number: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, phone_number: str, request_text: str) -> None:
+        raise NotImplementedError
+
+    def pop(self, phone_number: str) -> Optional[str]:
+        """מחזיר את הפנייה ומוחק אותה בפעולה אחת (None אם אין)."""
+        raise NotImplementedError
+
+    def delete(self, phone_number: str) -> None:
+        raise NotImplementedError
+
+    # --- תאימות למילון (pending_requests[phone] = ..., phone in pending_requests, del ...) ---
+
+    def __contains__(self, phone_number: str) -> bool:
+        return self.get(phone_number) is not None
+
+    def __getitem__(self, phone_number: str) -> str:
+        request_text = self.get(phone_number)
+        if request_text is None:
+            raise KeyError(phone_number)
+        return request_text
+
+    def __setitem__(self, phone_number: str, request_text: str) -> None:
+        self.set(phone_number, request_text)
+
+    def __delitem__(self, phone_number: str) -> None:
+        self.delete(phone_number)
+
+
+class InMemoryPendingStore(PendingRequestStore):
+    """מילון בזיכרון התהליך, עם תפוגה."""
+
+    def __init__(self, ttl_seconds: float = PENDING_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._items: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, phone_number: str, now: float) -> Optional[str]:
+        item = self._items.get(phone_number)
+        if item is None:
+            return None
+        request_text, expires_at = item
+        if expires_at <= now:
+            del self._items[phone_number]
+            return None
+        return request_text
+
+    def get(self, phone_number: str) -> Optional[str]:
+        with self._lock:
+            return self._live(phone_number, time.time())
+
+    def set(self, phone_number: str, request_text: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._items[phone_number] = (request_text, now + self.ttl_seconds)
+
+    def pop(self, phone_number: str) -> Optional[str]:
+        with self._lock:
+            request_text = self._live(phone_number, time.time())
+            self._items.pop(phone_number, None)
+            return request_text
+
+    def delete(self, phone_number: str) -> None:
+        with self._lock:
+            self._items.pop(phone_number, None)
+
+
+class SQLitePendingStore(PendingRequestStore):
+    """טבלת פניות בקובץ SQLite (מצב WAL), בטוחה לכמה threads ולכמה תהליכים."""
+
+    def __init__(self, path: str = PENDING_DB, ttl_seconds: float = PENDING_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_requests ("
+            " phone TEXT PRIMARY KEY, request_text TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, phone_number: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT request_text FROM pending_requests WHERE phone = ? AND expires_at > ?",
+                (phone_number, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, phone_number: str, request_text: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending_requests (phone, request_text, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(phone) DO UPDATE SET request_text = excluded.request_text, "
+                "expires_at = excluded.expires_at",
+                (phone_number, request_text, now + self.ttl_seconds),
+            )
+            # ניקוי פניות שפגו - זול בזכות מספר השורות הקטן
+            self._conn.execute("DELETE FROM pending_requests WHERE expires_at <= ?", (now,))
+
+    def pop(self, phone_number: str) -> Optional[str]:
+        with self._lock:
+            # DELETE ... RETURNING - קריאה ומחיקה בפקודה אחת, גם מול תהליכים אחרים
+            row = self._conn.execute(
+                "DELETE FROM pending_requests WHERE phone = ? RETURNING request_text, expires_at",
+                (phone_number,),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def delete(self, phone_number: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_requests WHERE phone = ?", (phone_number,))
+
+
+class RedisPendingStore(PendingRequestStore):
+    """
+    פניות ב-Redis (או שרת תואם). התפוגה מנוהלת ע"י Redis (SET ... EX),
+    ו-pop משתמש ב-GETDEL (Redis 6.2+), או ב-GET+DEL בטרנזקציה בשרתים ישנים.
+    """
+
+    def __init__(self, client=None, ttl_seconds: float = PENDING_TTL_SECONDS, prefix: str = PENDING_KEY_PREFIX):
+        if client is None:
+            import redis
+            client = redis.Redis(
+                host=getattr(config, 'REDIS_HOST', 'localhost'),
+                port=getattr(config, 'REDIS_PORT', 6379),
+                db=getattr(config, 'REDIS_DB', 0),
+                password=getattr(config, 'REDIS_PASSWORD', None),
+                decode_responses=True,
+            )
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+        self._has_getdel = True
+
+    def _key(self, phone_number: str) -> str:
+        return self.prefix + phone_number
+
+    @staticmethod
+    def _decode(value) -> Optional[str]:
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def get(self, phone_number: str) -> Optional[str]:
+        return self._decode(self.client.get(self._key(phone_number)))
+
+    def set(self, phone_number: str, request_text: str) -> None:
+        self.client.set(self._key(phone_number), request_text, ex=self.ttl_seconds)
+
+    def pop(self, phone_number: str) -> Optional[str]:
+        key = self._key(phone_number)
+        if self._has_getdel:
+            try:
+                return self._decode(self.client.getdel(key))
+            except Exception as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                # שרת שלא מכיר GETDEL - עוברים ל-GET+DEL בטרנזקציה
+                log.info("GETDEL לא נתמך (%s) - משתמש ב-MULTI", e)
+                self._has_getdel = False
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.get(key)
+        pipeline.delete(key)
+        value, _ = pipeline.execute()
+        return self._decode(value)
+
+    def delete(self, phone_number: str) -> None:
+        self.client.delete(self._key(phone_number))
+
+
+def create_pending_store() -> PendingRequestStore:
+    """יוצר את אחסון הפניות לפי PENDING_STORE."""
+    if PENDING_STORE == "sqlite":
+        return SQLitePendingStore(PENDING_DB)
+    if PENDING_STORE == "redis":
+        return RedisPendingStore()
+    return InMemoryPendingStore()
@@ -0,0 +1,236 @@
+"""
+בניית ה-prompt לקריאות OpenAI עם תקציב טוקנים.
+
+- ה-system prompt הסטטי נשלח תמיד כהודעה הראשונה, זהה בית-לבית לכל שפה ומצב
+  פלט, כדי שה-prompt caching של הספק יפגע בו (הספק שומר רק תחילית זהה).
+- המשתנים של כל משתמש (שם) באים אחריו, בשפת המשתמש.
+- הטוקנים נספרים מקומית: עם tiktoken אם הוא מותקן, אחרת בהערכה לפי תווים.
+- כל קריאה מוגבלת לתקציב PROMPT_TOKEN_BUDGET; הודעה ארוכה מדי נחתכת.
+- prompt_metrics סופר טוקנים לכל קריאה (הערכה מקומית ומה שה-API דיווח).
+"""
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import config
+from structured_log import get_logger
+
+PROMPT_TOKEN_BUDGET = getattr(config, 'PROMPT_TOKEN_BUDGET', 2000)
+TOKENIZER_ENCODING = getattr(config, 'TOKENIZER_ENCODING', 'o200k_base')  # הקידוד של gpt-4o-mini
+
+log = get_logger("prompt_builder")
+
+# תוספת טוקנים קבועה לכל הודעה (תפקיד ומפרידים) ולתחילת התשובה
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+USER_CONTEXT_TEMPLATES = {
+    "he": "שם המשתמש: {name}. פנה אליו בשמו בתחילת השיחה.",
+    "en": "The user's name is {name}. Address them by name at the start of the conversation.",
+}
+SUMMARY_TEMPLATES = {
+    "he": "סיכום השיחה הקודמת: {summary}",
+    "en": "Summary of the earlier conversation: {summary}",
+}
+TRUNCATION_MARKER = "…"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """טוען את הקידוד של tiktoken פעם אחת; None אם tiktoken לא זמין."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:  # לא מותקן, או שאי אפשר להוריד את קובץ הקידוד
+                    log.info("tiktoken לא זמין (%s) - ספירת טוקנים בהערכה", e)
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """מספר הטוקנים בטקסט (מדויק עם tiktoken, אחרת הערכה שמרנית)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # הערכה: כ-4 תווים לטוקן באנגלית, וכ-2 תווים לטוקן בעברית ובשאר התווים שאינם ASCII
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return max(1, (len(text) - non_ascii + 3) // 4 + (non_ascii + 1) // 2)
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message["content"]) for message in messages) + TOKENS_PER_REPLY
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """חותך טקסט כך שיכיל לכל היותר max_tokens טוקנים (שומר את ההתחלה)."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens - 1]) + TRUNCATION_MARKER
+    # חיפוש בינארי על אורך התחילית
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + TRUNCATION_MARKER
+
+
+class PromptMetrics:
+    """מונים לטוקנים של ה-prompt בכל קריאה, לחישוב עלות להודעה."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.estimated_prompt_tokens = 0
+            self.max_estimated_prompt_tokens = 0
+            self.truncated_calls = 0
+            self.reported_calls = 0
+            self.reported_prompt_tokens = 0
+            self.reported_cached_tokens = 0
+            self.reported_completion_tokens = 0
+
+    def record_prompt(self, estimated_tokens: int, truncated: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.estimated_prompt_tokens += estimated_tokens
+            self.max_estimated_prompt_tokens = max(self.max_estimated_prompt_tokens, estimated_tokens)
+            self.truncated_calls += truncated
+
+    def record_usage(self, usage: Any, call: str = "chat", **fields: Any) -> None:
+        """
+        רושם את ה-usage שה-API החזיר (כולל טוקנים שהוגשו מה-cache של הספק),
+        וכותב שורת INFO לכל קריאה עם שדות נוספים (למשל הערכת הטוקנים לפני השליחה).
+        usage=None (הזרמה שנעצרה לפני ה-chunk האחרון) נכתב ללוג בלי מונים.
+        """
+        if usage is None:
+            log.info("📊 OpenAI usage", call=call, reported=False, **fields)
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        with self._lock:
+            self.reported_calls += 1
+            self.reported_prompt_tokens += prompt_tokens
+            self.reported_cached_tokens += cached
+            self.reported_completion_tokens += completion_tokens
+        log.info("📊 OpenAI usage", call=call, reported=True, prompt_tokens=prompt_tokens,
+                 cached_tokens=cached, completion_tokens=completion_tokens, **fields)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "estimated_prompt_tokens_mean": self.estimated_prompt_tokens / self.calls if self.calls else 0,
+                "estimated_prompt_tokens_max": self.max_estimated_prompt_tokens,
+                "truncated_calls": self.truncated_calls,
+                "reported_prompt_tokens_mean": (
+                    self.reported_prompt_tokens / self.reported_calls if self.reported_calls else 0
+                ),
+                "reported_completion_tokens_mean": (
+                    self.reported_completion_tokens / self.reported_calls if self.reported_calls else 0
+                ),
+                "cached_prompt_ratio": (
+                    self.reported_cached_tokens / self.reported_prompt_tokens if self.reported_prompt_tokens else 0
+                ),
+            }
+
+
+prompt_metrics = PromptMetrics()
+
+
+class Prompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    prompt_tokens: int   # הערכה מקומית
+    truncated: bool      # האם הודעת המשתמש נחתכה כדי לעמוד בתקציב
+
+
+class PromptBuilder:
+    """
+    בונה את רשימת ההודעות:
+    [system סטטי] [הקשר המשתמש] [סיכום השיחה] [היסטוריה] [הודעת המשתמש].
+
+    static_prompts: פונקציה (שפה, מצב פלט) -> טקסט ה-system הסטטי. התוצאה נשמרת
+    (יחד עם מספר הטוקנים שלה), כך שהתחילית היא תמיד אותה מחרוזת בדיוק.
+    """
+
+    def __init__(self, static_prompts, token_budget: int = PROMPT_TOKEN_BUDGET, metrics: PromptMetrics = prompt_metrics):
+        self.static_prompts = static_prompts
+        self.token_budget = token_budget
+        self.metrics = metrics
+        self._static_cache: Dict[tuple, tuple] = {}
+
+    def static_prefix(self, language: str, output_mode: str = "tags"):
+        """(הודעת ה-system הסטטית, מספר הטוקנים שלה) לשפה ולמצב הפלט."""
+        key = (language, output_mode)
+        cached = self._static_cache.get(key)
+        if cached is None:
+            message = {"role": "system", "content": self.static_prompts(language, output_mode)}
+            cached = self._static_cache[key] = (message, TOKENS_PER_MESSAGE + count_tokens(message["content"]))
+        return cached
+
+    def build(self, user_message: str, user_name: str, language: str, output_mode: str = "tags",
+              history: Optional[List[Dict[str, str]]] = None, summary: Optional[str] = None) -> Prompt:
+        """
+        history: הודעות קודמות (user/assistant), מהישנה לחדשה. הישנות ביותר
+        מושמטות ראשונות כשאין מקום בתקציב.
+        summary: סיכום של חלק השיחה שכבר לא נשלח כהודעות (נחתך אם אין מקום).
+        """
+        static_message, static_tokens = self.static_prefix(language, output_mode)
+        template = USER_CONTEXT_TEMPLATES.get(language, USER_CONTEXT_TEMPLATES["he"])
+        context_message = {"role": "system", "content": template.format(name=user_name)}
+
+        used = static_tokens + TOKENS_PER_MESSAGE + count_tokens(context_message["content"]) + TOKENS_PER_REPLY
+        remaining = self.token_budget - used - TOKENS_PER_MESSAGE
+
+        truncated = False
+        user_tokens = count_tokens(user_message)
+        if user_tokens > remaining:
+            user_message = truncate_to_tokens(user_message, remaining)
+            user_tokens = count_tokens(user_message)
+            truncated = True
+            log.warning("⚠️ הודעת המשתמש נחתכה ל-%d טוקנים (תקציב %d)", user_tokens, self.token_budget)
+        remaining -= user_tokens
+
+        context_messages = [context_message]
+        if summary and remaining > TOKENS_PER_MESSAGE:
+            summary_template = SUMMARY_TEMPLATES.get(language, SUMMARY_TEMPLATES["he"])
+            content = summary_template.format(summary=summary)
+            content = truncate_to_tokens(content, min(count_tokens(content), remaining - TOKENS_PER_MESSAGE))
+            if content:
+                context_messages.append({"role": "system", "content": content})
+                remaining -= TOKENS_PER_MESSAGE + count_tokens(content)
+
+        # היסטוריה: מהחדשה לישנה, כל עוד יש מקום
+        kept: List[Dict[str, str]] = []
+        for message in reversed(history or []):
+            cost = TOKENS_PER_MESSAGE + count_tokens(message["content"])
+            if cost > remaining:
+                break
+            kept.append(message)
+            remaining -= cost
+        kept.reverse()
+
+        messages = [static_message, *context_messages, *kept, {"role": "user", "content": user_message}]
+        prompt_tokens = self.token_budget - remaining
+        self.metrics.record_prompt(prompt_tokens, truncated)
+        return Prompt(messages, prompt_tokens, truncated)
@@ -0,0 +1,109 @@
+"""
+לוג מובנה וזול: שורת JSON אחת לכל רשומה (מתאים ל-CloudWatch Logs Insights).
+
+- רמות: DEBUG, INFO, WARNING, ERROR. רשומה מתחת ל-LOG_LEVEL נזרקת לפני כל עיבוד.
+- דגימה לפי רמה (LOG_SAMPLE_RATES): למשל 0.1 ל-INFO שומר כעשירית מהשורות;
+  שורה שנדגמה נושאת את שדה sample_rate כדי שאפשר יהיה לשקלל חזרה.
+- עיצוב עצל: ההודעה מעוצבת עם %-args, ושדה שערכו פונקציה (למשל lambda)
+  מחושב רק אם הרשומה באמת נכתבת.
+- מספרי טלפון בשדות PHONE_FIELDS מוסתרים (mask_phone) אם LOG_MASK_PHONES פעיל.
+
+שימוש:
+    log = get_logger("lambda_function")
+    log.info("✅ משתמש נמצא: %s", name, phone=from_number)
+    log.debug("payload", payload=lambda: json_codec.dumps_str(payload))
+    log.error("🔥 FATAL ERROR: %s", e, exc_info=True)   # או exc_info=error מחוץ ל-except
+"""
+import random
+import sys
+import time
+import traceback
+from typing import Any, Dict
+
+import config
+import json_codec
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+LOG_LEVEL = getattr(config, 'LOG_LEVEL', 'INFO')
+# שיעור הדגימה לכל רמה (1.0 = הכול, 0 = כלום); רמה שלא צוינה נכתבת תמיד
+LOG_SAMPLE_RATES = getattr(config, 'LOG_SAMPLE_RATES', {})
+LOG_MASK_PHONES = getattr(config, 'LOG_MASK_PHONES', True)
+
+# שמות שדות שערכם מספר טלפון
+PHONE_FIELDS = frozenset({"phone", "phone_number", "from_number", "to"})
+
+
+def mask_phone(phone: Any) -> str:
+    """מסתיר את אמצע המספר: '972501234567' -> '972*******67'."""
+    text = str(phone)
+    if len(text) <= 5:
+        return "*" * len(text)
+    head = 4 if text.startswith("+") else 3
+    return text[:head] + "*" * (len(text) - head - 2) + text[-2:]
+
+
+class Logger:
+    """לוגר של מודול אחד. הרמה ושיעורי הדגימה מחושבים פעם אחת ביצירה."""
+
+    __slots__ = ("name", "_min_level", "_rates")
+
+    def __init__(self, name: str, level: str = LOG_LEVEL, sample_rates: Dict[str, float] = LOG_SAMPLE_RATES):
+        self.name = name
+        self._min_level = LEVELS.get(str(level).upper(), LEVELS["INFO"])
+        self._rates = {LEVELS[key.upper()]: float(rate) for key, rate in sample_rates.items()}
+
+    def is_enabled_for(self, level: str) -> bool:
+        return LEVELS[level] >= self._min_level
+
+    def _log(self, level: int, level_name: str, msg: str, args: tuple, fields: Dict[str, Any]) -> None:
+        if level < self._min_level:
+            return
+        rate = self._rates.get(level, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        exc_info = fields.pop("exc_info", False)
+        record: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "level": level_name,
+            "logger": self.name,
+            "msg": msg % args if args else msg,
+        }
+        for key, value in fields.items():
+            if callable(value):
+                value = value()
+            if LOG_MASK_PHONES and key in PHONE_FIELDS and value is not None:
+                value = mask_phone(value)
+            record[key] = value
+        if rate < 1.0:
+            record["sample_rate"] = rate
+        if isinstance(exc_info, BaseException):
+            record["exc"] = "".join(traceback.format_exception(type(exc_info), exc_info, exc_info.__traceback__))
+        elif exc_info:
+            record["exc"] = traceback.format_exc()
+
+        sys.stdout.write(json_codec.dumps_str(record, default=str) + "\n")
+
+    def debug(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log(10, "DEBUG", msg, args, fields)
+
+    def info(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log(20, "INFO", msg, args, fields)
+
+    def warning(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log(30, "WARNING", msg, args, fields)
+
+    def error(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log(40, "ERROR", msg, args, fields)
+
+
+_loggers: Dict[str, Logger] = {}
+
+
+def get_logger(name: str) -> Logger:
+    """מחזיר את הלוגר של המודול (אחד לכל שם)."""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = Logger(name)
+    return logger
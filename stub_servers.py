@@ -0,0 +1,344 @@
+"""
+שרתי HTTP מקומיים שמחליפים שירותים חיצוניים בבדיקות ובהרצות מקומיות.
+
+שימוש:
+    with AppsScriptStub() as stub:
+        queue = SheetsWriteQueue(url=stub.url, spool_path="/tmp/spool.jsonl")
+        queue.enqueue("דני", "בעיה עם הניקיון", "972501234567")
+        queue.flush()
+        print(stub.rows)
+
+לכל שרת אפשר להגדיר השהיה (latency) ושיעור שגיאות, למדידות עומס:
+    GraphStub(latency=parse_latency("lognormal:80,0.4"), error_rate=0.01)
+"""
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def parse_latency(spec: Optional[str]) -> Optional[Callable[[], float]]:
+    """
+    מפענח תיאור התפלגות השהיה (במילישניות) לפונקציה שמחזירה שניות:
+    "fixed:50", "uniform:20,80", "normal:50,10", "lognormal:50,0.5" (חציון, סיגמא).
+    """
+    if not spec:
+        return None
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class _StubServer:
+    """
+    בסיס לשרת דמה שרץ ב-thread ברקע על פורט פנוי ב-localhost.
+
+    latency: פונקציה שמחזירה השהיה בשניות לכל בקשה (ראו parse_latency).
+    error_rate: הסתברות להחזיר 500 לבקשה.
+    record: האם לשמור כל בקשה ב-requests (בבדיקות עומס עדיף לכבות; request_count נספר תמיד).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: Optional[Callable[[], float]] = None, error_rate: float = 0.0, record: bool = True):
+        self.requests: List[Dict[str, Any]] = []
+        self.request_count = 0
+        self.error_count = 0
+        self.latency = latency
+        self.error_rate = error_rate
+        self.record = record
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, כמו מול השירותים האמיתיים
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {"raw": raw.decode("utf-8", "replace")}
+                with stub._lock:
+                    stub.request_count += 1
+                    if stub.record:
+                        stub.requests.append({"path": self.path, "body": body})
+                if stub.latency is not None:
+                    time.sleep(stub.latency())
+                if stub.error_rate and random.random() < stub.error_rate:
+                    with stub._lock:
+                        stub.error_count += 1
+                    result = (500, {"error": "injected"})
+                else:
+                    result = stub.handle(self.path, body)
+                status, response = result[0], result[1]
+                if len(result) > 2:
+                    # תשובה גולמית (למשל text/event-stream)
+                    content_type, data = result[2], response.encode("utf-8")
+                else:
+                    content_type, data = "application/json", json.dumps(response, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, path: str, body: Dict[str, Any]):
+        """
+        מחזיר (סטטוס, גוף JSON), או (סטטוס, טקסט, content-type) לתשובה גולמית.
+        מומש במחלקות היורשות.
+        """
+        raise NotImplementedError
+
+    def start(self) -> "_StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class AppsScriptStub(_StubServer):
+    """
+    מחקה את ה-Apps Script של הגיליון.
+    write_structured: שומר את השורות (גם בפורמט rows וגם בפורמט הישן של שורה אחת).
+    read_user / read_users: מחזירים חברים מתוך members ({טלפון: {"name": ..., "language": ...}}).
+    supports_read_users=False מחקה Apps Script ישן שמכיר רק read_user.
+    fail_next: מספר הבקשות הבאות שיחזירו 500 (לבדיקת ניסיונות חוזרים).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **options):
+        super().__init__(host, port, **options)
+        self.rows: List[Dict[str, Any]] = []
+        self.members: Dict[str, Dict[str, Any]] = {}
+        self.supports_read_users = True
+        self.fail_next = 0
+
+    def handle(self, path: str, body: Dict[str, Any]):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 500, {"status": "error"}
+            if body.get("action") == "write_structured":
+                rows = body.get("rows") or [
+                    {key: body.get(key) for key in ("name", "inquiry", "phone")}
+                ]
+                self.rows.extend(rows)
+                return 200, {"status": "ok", "written": len(rows)}
+            if body.get("action") == "read_user":
+                member = self.members.get(body.get("phone"))
+                if member is None:
+                    return 200, {"status": "not_found"}
+                return 200, {"status": "ok", **member}
+            if body.get("action") == "read_users" and self.supports_read_users:
+                users = [{"phone": phone, **member} for phone, member in self.members.items()]
+                return 200, {"status": "ok", "users": users}
+        return 400, {"status": "unknown_action"}
+
+
+class GraphStub(_StubServer):
+    """
+    מחקה את WhatsApp Cloud API (graph.facebook.com): מקבל הודעות, איש קשר
+    ומצב הקלדה ב-/<version>/<phone id>/messages ומחזיר מזהה הודעה.
+    sent: ההודעות שנשלחו (בלי מצבי הקלדה), כשהשמירה פעילה.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **options):
+        super().__init__(host, port, **options)
+        self.sent: List[Dict[str, Any]] = []
+
+    def messages_url(self, phone_number_id: str = "stub", version: str = "v17.0") -> str:
+        return f"{self.url}/{version}/{phone_number_id}/messages"
+
+    def handle(self, path: str, body: Dict[str, Any]):
+        if not path.endswith("/messages"):
+            return 404, {"error": {"message": "Unknown path"}}
+        if body.get("status") == "read":
+            return 200, {"success": True}
+        if self.record:
+            with self._lock:
+                self.sent.append(body)
+        return 200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+        }
+
+
+def default_openai_reply(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    תשובת ברירת מחדל של OpenAIStub: הודעה קצרה מקבלת ברכה, ואחרת מסוכמת כפנייה.
+    מחזיר מילון בפורמט הפלט המובנה (reply / is_request / summary / language).
+    """
+    text = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    language = "en" if text[:1].isascii() else "he"
+    if len(text.split()) <= 2:
+        reply = "Hello! How can I help?" if language == "en" else "שלום! במה אוכל לעזור?"
+        return {"reply": reply, "is_request": False, "summary": None, "language": language}
+    summary = text[:60]
+    question = (f"So should I submit the request: '{summary}'?" if language == "en"
+                else f"אז להכניס את הפנייה: '{summary}'?")
+    return {"reply": question, "is_request": True, "summary": summary, "language": language}
+
+
+class OpenAIStub(_StubServer):
+    """
+    מחקה את /v1/chat/completions של OpenAI: תשובה רגילה, הזרמה (SSE) ופלט JSON
+    (response_format). התוכן נקבע ע"י responder(messages) -> מילון בפורמט המובנה,
+    ובמצב תגיות הוא מומר לטקסט עם [PENDING_REQUEST].
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 responder: Callable[[List[Dict[str, Any]]], Dict[str, Any]] = default_openai_reply, **options):
+        super().__init__(host, port, **options)
+        self.responder = responder
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @staticmethod
+    def _count_tokens(text: str) -> int:
+        return max(1, len(text) // 3)
+
+    def _usage(self, body: Dict[str, Any], content: str) -> Dict[str, int]:
+        prompt_tokens = sum(self._count_tokens(m.get("content") or "") for m in body.get("messages") or [])
+        completion_tokens = self._count_tokens(content)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _content(self, body: Dict[str, Any]) -> str:
+        reply = self.responder(body.get("messages") or [])
+        if body.get("response_format", {}).get("type") in ("json_schema", "json_object"):
+            return json.dumps(reply, ensure_ascii=False)
+        if reply.get("is_request"):
+            return f"[PENDING_REQUEST]\n{reply['summary']}\n[/PENDING_REQUEST]\n{reply['reply']}"
+        return reply["reply"]
+
+    def handle(self, path: str, body: Dict[str, Any]):
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": "Unknown path"}}
+        content = self._content(body)
+        model = body.get("model", "stub")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if body.get("stream"):
+            pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+            events = []
+            for piece in pieces:
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                events.append("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [], "usage": self._usage(body, content)}
+                events.append("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+            events.append("data: [DONE]\n\n")
+            return 200, "".join(events), "text/event-stream"
+
+        return 200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self._usage(body, content),
+        }
+
+
+class FakeRedis:
+    """
+    לקוח Redis מזויף בזיכרון, עם הפקודות ש-RedisPendingStore משתמש בהן
+    (get / set עם ex / getdel / delete / pipeline) ותפוגה לפי זמן.
+    supports_getdel=False מחקה שרת ישן (לפני Redis 6.2).
+    """
+
+    def __init__(self, supports_getdel: bool = True):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.RLock()
+        self.supports_getdel = supports_getdel
+
+    def _live(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: str, ex: Optional[float] = None) -> bool:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def getdel(self, key: str) -> Optional[str]:
+        if not self.supports_getdel:
+            raise RuntimeError("ERR unknown command 'getdel'")
+        with self._lock:
+            value = self._live(key)
+            self._data.pop(key, None)
+            return value
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction: bool = True) -> "_FakePipeline":
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    """pipeline של FakeRedis: הפקודות נאספות ומורצות יחד תחת נעילה (כמו MULTI/EXEC)."""
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._commands: List[Tuple[str, tuple]] = []
+
+    def get(self, key: str) -> "_FakePipeline":
+        self._commands.append(("get", (key,)))
+        return self
+
+    def delete(self, *keys: str) -> "_FakePipeline":
+        self._commands.append(("delete", keys))
+        return self
+
+    def execute(self) -> List[Any]:
+        with self._redis._lock:
+            return [getattr(self._redis, name)(*args) for name, args in self._commands]
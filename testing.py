@@ -8,7 +8,8 @@ sys.path.append(os.getcwd())
 
 # ייבוא הפונקציות שלך
 try:
-    from local_storage import check_user_local, USERS_DB
+    import local_storage
+    from local_storage import check_user_local
     from lambda_function import lambda_handler
     import config
     print("✅ כל הספריות נטענו בהצלחה.\n")
@@ -51,6 +52,8 @@ def create_mock_event(phone, text):
 # בדיקה 1: בדיקת קובץ JSON (הכי בסיסי)
 # ==========================================
 print("🔍 --- בדיקה 1: טעינת משתמשים (local_storage) ---")
+local_storage.load_users()
+USERS_DB = local_storage.USERS_DB
 if not USERS_DB:
     print("❌ שגיאה: מסד הנתונים ריק! בדוק את users.json")
 else:
@@ -99,4 +102,69 @@ if response['statusCode'] == 200:
 else:
     print("❌ שגיאה.")
 
+print("-" * 50)
+
+# ==========================================
+# בדיקה 4: פענוח תשובה מוזרמת (בלי רשת)
+# ==========================================
+print("\n🧩 --- בדיקה 4: פענוח [PENDING_REQUEST] בהזרמה ---")
+from ai_chat import PendingRequestStreamParser, parse_pending_request
+
+sample = "שלום דני!\n[PENDING_REQUEST]\nבעיה עם הניקיון\n[/PENDING_REQUEST]\nאז להכניס את הפנייה: 'בעיה עם הניקיון'?"
+close_end = sample.find("[/PENDING_REQUEST]") + len("[/PENDING_REQUEST]")
+failures = 0
+# כל נקודת חיתוך אפשרית (כולל באמצע התגיות), וגם חלקים של תו אחד
+splits = [[sample[:i], sample[i:]] for i in range(len(sample) + 1)] + [list(sample)]
+for chunks in splits:
+    parser = PendingRequestStreamParser()
+    consumed = 0
+    for chunk in chunks:
+        consumed += len(chunk)
+        if parser.feed(chunk):
+            break
+    # ההזרמה צריכה להיעצר בחלק שבו התגית הסוגרת הושלמה - לא לפני ולא אחרי
+    if not parser.complete or consumed < close_end or consumed - len(chunk) >= close_end:
+        failures += 1
+    elif parser.result() != parse_pending_request(sample[:consumed]) or parser.result()[1] != "בעיה עם הניקיון":
+        failures += 1
+if failures:
+    print(f"❌ {failures} חיתוכים נכשלו")
+else:
+    print(f"✅ הפנייה זוהתה נכון בכל {len(splits)} החיתוכים")
+
+print("-" * 50)
+
+# ==========================================
+# בדיקה 5: ניסיון חוזר ב-worker אחרי כשל (בלי רשת)
+# ==========================================
+print("\n🔁 --- בדיקה 5: אירוע שנכשל פעם אחת מעובד שוב בניסיון הבא ---")
+import tempfile
+import lambda_function
+from dedup import MessageDeduplicator
+from event_queue import SQLiteEventQueue, set_event_queue
+
+retry_queue = SQLiteEventQueue(os.path.join(tempfile.mkdtemp(), "events.db"), retry_backoff_seconds=0)
+set_event_queue(retry_queue)
+original_dedup, original_handle = lambda_function.processed_messages, lambda_function.handle_message
+lambda_function.processed_messages = MessageDeduplicator()
+attempts = []
+
+def flaky_handle_message(message):
+    attempts.append(message.msg_id)
+    if len(attempts) == 1:
+        raise RuntimeError("כשל זמני")
+    return "processed"
+
+lambda_function.handle_message = flaky_handle_message
+try:
+    retry_queue.enqueue(create_mock_event(REGISTERED_PHONE, "בדיקת ניסיון חוזר")["body"])
+    stats = lambda_function.worker_handler({}, None)
+finally:
+    lambda_function.processed_messages, lambda_function.handle_message = original_dedup, original_handle
+
+if len(attempts) == 2 and stats == {"processed": 1, "failed": 1} and retry_queue.pending_count() == 0:
+    print("✅ האירוע נכשל, נמשך שוב ועובד בהצלחה")
+else:
+    print(f"❌ ניסיונות: {len(attempts)}, סטטיסטיקה: {stats}, בתור: {retry_queue.pending_count()}")
+
 print("\n🏁 סיום בדיקות.")
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+מעקב זמנים (tracing) קל לכל הפעלה של ה-Webhook.
+
+כל הפעלה יוצרת עץ spans: שורש אחד (trace) ותחתיו השלבים - פענוח הגוף, זיהוי
+המשתמש, הקריאה ל-OpenAI, השליחות ל-WhatsApp ולגיליון - עם משך כל אחד.
+כשהזמן הכולל עובר את TRACE_SLOW_THRESHOLD_MS, העץ נכתב ללוג (slow request) כשדה JSON.
+
+- span(name): בלוק with שנמדד כתת-שלב של ה-span הנוכחי.
+- traced(name): דקורטור לפונקציה (למשל פונקציות HTTP).
+- bind(fn): מעביר את ה-span הנוכחי לפונקציה שתרוץ ב-thread אחר (executor).
+
+כשהמעקב כבוי (ברירת מחדל) או שאין trace פעיל, span מחזיר אובייקט ריק משותף
+ו-traced קורא לפונקציה ישירות - העלות היא קריאת ContextVar אחת.
+"""
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from structured_log import get_logger
+
+TRACING_ENABLED = getattr(config, 'TRACING_ENABLED', False)
+TRACE_SLOW_THRESHOLD_MS = getattr(config, 'TRACE_SLOW_THRESHOLD_MS', 3000)
+# כתיבת כל ה-traces ללוג, לא רק האיטיים (לדיבאג)
+TRACE_LOG_ALL = getattr(config, 'TRACE_LOG_ALL', False)
+
+log = get_logger("tracing")
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+# פונקציות שמקבלות כל trace שהסתיים (למשל לאיסוף מדדים בבדיקות עומס)
+_listeners: List[Callable[["Span"], None]] = []
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "error", "_lock")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], lock: threading.Lock):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self._lock = lock  # נעילה אחת לכל העץ - spans נוספים גם מ-threads אחרים
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def child(self, name: str, attrs: Dict[str, Any]) -> "Span":
+        span = Span(name, attrs, self._lock)
+        with self._lock:
+            self.children.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"name": self.name, "ms": round(self.duration_ms, 2)}
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+    def format_tree(self, indent: int = 0) -> str:
+        """העץ כטקסט מוזח, span בכל שורה."""
+        attrs = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+        line = f"{'  ' * indent}{self.name} {self.duration_ms:.1f}ms"
+        if attrs:
+            line += f" [{attrs}]"
+        if self.error:
+            line += f" ERROR: {self.error}"
+        return "\n".join([line] + [child.format_tree(indent + 1) for child in self.children])
+
+
+class _NoopSpan:
+    """span ריק שמוחזר כשהמעקב כבוי - לא מודד ולא מקצה כלום."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _ActiveSpan:
+    def __init__(self, span: Span, root: bool = False):
+        self.span = span
+        self.root = root
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self.span)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = time.perf_counter()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        if self.root:
+            _finish_trace(self.span)
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        """מוסיף מאפיינים ל-span (למשל סטטוס שנודע רק בסוף)."""
+        self.span.attrs.update(attrs)
+
+
+def start_trace(name: str, **attrs: Any):
+    """פותח trace חדש (span שורש) להפעלה אחת."""
+    if not TRACING_ENABLED:
+        return _NOOP
+    return _ActiveSpan(Span(name, attrs, threading.Lock()), root=True)
+
+
+def span(name: str, **attrs: Any):
+    """span של שלב בתוך ה-trace הנוכחי (או ריק, אם אין trace פעיל)."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _ActiveSpan(parent.child(name, attrs))
+
+
+def traced(name: Optional[str] = None):
+    """דקורטור: מריץ את הפונקציה בתוך span (בלי עלות כשאין trace פעיל)."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            with _ActiveSpan(parent.child(span_name, {})):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn: Callable) -> Callable:
+    """עוטף פונקציה שתרוץ ב-thread אחר כך שה-spans שלה ייכנסו תחת ה-span הנוכחי."""
+    parent = _current.get()
+    if parent is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run_with_parent(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run_with_parent
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def add_listener(listener: Callable[[Span], None]) -> None:
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[Span], None]) -> None:
+    _listeners.remove(listener)
+
+
+def _finish_trace(root: Span) -> None:
+    total_ms = root.duration_ms
+    if total_ms >= TRACE_SLOW_THRESHOLD_MS:
+        log.warning("🐢 SLOW REQUEST: %s %.0fms (threshold %dms)", root.name, total_ms, TRACE_SLOW_THRESHOLD_MS,
+                    trace=root.to_dict)
+    elif TRACE_LOG_ALL:
+        log.info("🧭 TRACE: %s", root.name, trace=root.to_dict)
+    for listener in list(_listeners):
+        try:
+            listener(root)
+        except Exception as e:
+            log.error("❌ TRACE_LISTENER_ERROR: %s", e)
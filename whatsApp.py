@@ -1,7 +1,15 @@
-import requests
+import re
+
+import config
+import json_codec
 from config import PHONE_NUMBER_ID, WHATSAPP_TOKEN
-from typing import Tuple, Optional, Dict, Any
-import traceback
+from typing import Tuple, Optional, Dict, Any, Iterable, Iterator, List, NamedTuple, TYPE_CHECKING
+
+from structured_log import get_logger
+from tracing import traced
+
+if TYPE_CHECKING:
+    import requests
 
 # Minimal, focused helper module for sending WhatsApp messages and contacts.
 # Only essentials kept: phone normalization, payload builders, and send functions.
@@ -13,51 +21,127 @@ headers = {
 }
 TIMEOUT = 15
 
+log = get_logger("whatsApp")
 
-def extract_message_info(event_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+# Connection pool / retry policy for the Graph API session.
+POOL_SIZE = getattr(config, 'WHATSAPP_POOL_SIZE', 10)
+MAX_RETRIES = getattr(config, 'WHATSAPP_MAX_RETRIES', 2)
+BACKOFF_FACTOR = getattr(config, 'WHATSAPP_BACKOFF_FACTOR', 0.3)
+# Only statuses that mean the request was not processed. A 500/502/504 may
+# come after Graph already accepted the message, so resending a POST could
+# deliver it twice.
+RETRY_STATUS_CODES = (429, 503)
+
+_session: Optional["requests.Session"] = None
+
+
+def get_session() -> "requests.Session":
+    """Return the shared keep-alive session, creating it on first use.
+
+    The session lives at module level so warm Lambda invocations reuse the
+    pooled TCP/TLS connections to graph.facebook.com instead of doing a new
+    handshake for every send.
+
+    Retries cover connection errors and 429/503 responses (honouring
+    Retry-After). Read timeouts and other 5xx responses are not retried: the
+    request may already have been accepted, and resending would duplicate the
+    message.
+    """
+    global _session
+    if _session is None:
+        # requests is imported on first send, keeping it off the cold-start path
+        # for calls that never send (e.g. webhook verification).
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=MAX_RETRIES,
+            connect=MAX_RETRIES,
+            read=0,
+            status=MAX_RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+class IncomingMessage(NamedTuple):
+    """A single inbound WhatsApp message from a webhook payload."""
+    from_number: Optional[str]
+    text: Optional[str]  # None for non-text messages (image, location, ...)
+    msg_id: Optional[str]
+    msg_type: Optional[str]
+    timestamp: Optional[int]  # Unix seconds as sent by WhatsApp
+
+
+def iter_messages(event_data: Dict[str, Any]) -> Iterator[IncomingMessage]:
     """
-    מחלצת את מספר השולח, תוכן ההודעה (אם קיים), ואת מזהה ההודעה (ID) מאירוע Webhook של WhatsApp.
+    מחזירה (כ-generator) את כל ההודעות באירוע Webhook של WhatsApp - מכל ה-entry/changes/messages.
+    תחת עומס WhatsApp מאגד כמה הודעות בבקשה אחת, ולכן אין לעצור בהודעה הראשונה.
 
     Args:
         event_data: גוף ה-JSON המלא שהתקבל מה-API Gateway/Webhook.
 
-    Returns:
-        (from_number, message_body, message_id): מחרוזות או None אם לא נמצאה הודעת טקסט תקינה.
+    Yields:
+        IncomingMessage לכל הודעה, כולל הודעות שאינן טקסט (text=None).
     """
-    
-    # נווט בבטחה דרך המבנה המקונן
     for entry in event_data.get("entry", []):
         for change in entry.get("changes", []):
             value = change.get("value", {})
-            
+
             # ודא שמדובר באירוע הודעה ממוצר WhatsApp
-            if value.get("messaging_product") == "whatsapp":
-                
-                for message in value.get("messages", []):
-                    msg_type = message.get("type")
-                    
-                    # חלץ את הנתונים הבסיסיים
-                    from_number = message.get("from")
-                    msg_id = message.get("id")
-                    
-                    # אם זו הודעת טקסט, חלץ את הגוף
-                    if msg_type == "text":
-                        message_body = message.get("text", {}).get("body")
-                        
-                        # החזר את הנתונים
-                        if from_number and message_body:
-                            return from_number, message_body, msg_id
-                            
-                    # אם זו הודעה מסוג אחר (למשל, image, location, document), אנחנו מחזירים None עבור הטקסט
-                    else:
-                        print(f"INFO: Ignoring non-text message of type: {msg_type}")
-                        # אפשר להחזיר את המספר וה-ID גם להודעות שאינן טקסט אם נצטרך לטפל בהן מאוחר יותר
-                        return from_number, None, msg_id
-                        
+            if value.get("messaging_product") != "whatsapp":
+                continue
+
+            for message in value.get("messages", []):
+                msg_type = message.get("type")
+                message_body = None
+                if msg_type == "text":
+                    message_body = message.get("text", {}).get("body")
+                else:
+                    log.debug("Ignoring non-text message of type: %s", msg_type)
+
+                timestamp = message.get("timestamp")
+                yield IncomingMessage(
+                    from_number=message.get("from"),
+                    text=message_body,
+                    msg_id=message.get("id"),
+                    msg_type=msg_type,
+                    timestamp=int(timestamp) if timestamp else None,
+                )
+
+
+def extract_message_info(event_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    מחלצת את מספר השולח, תוכן ההודעה (אם קיים), ואת מזהה ההודעה (ID) של ההודעה הראשונה
+    באירוע Webhook של WhatsApp. לעיבוד כל ההודעות באירוע יש להשתמש ב-iter_messages.
+
+    Args:
+        event_data: גוף ה-JSON המלא שהתקבל מה-API Gateway/Webhook.
+
+    Returns:
+        (from_number, message_body, message_id): מחרוזות או None אם לא נמצאה הודעת טקסט תקינה.
+    """
+    for message in iter_messages(event_data):
+        # הודעת טקסט תקינה, או הודעה מסוג אחר (הטקסט יהיה None)
+        if (message.from_number and message.text) or message.msg_type != "text":
+            return message.from_number, message.text, message.msg_id
+
     # אם לא נמצאה הודעה רלוונטית בכל האירועים, החזר None
     return None, None, None
 
 
+@traced("graph.post")
 def _post(payload: dict):
     """Send a raw payload to the WhatsApp Cloud API.
 
@@ -67,15 +151,18 @@ def _post(payload: dict):
     Returns:
         (ok, data) where ok is True for HTTP 2xx, data is parsed JSON or raw text.
     """
+    import requests
+
     try:
-        r = requests.post(API_URL, headers=headers, json=payload, timeout=TIMEOUT)
+        # Pre-serialized compact UTF-8 body; the session already sends the JSON content type
+        r = get_session().post(API_URL, data=json_codec.dumps(payload), timeout=TIMEOUT)
         try:
-            data = r.json()
+            data = json_codec.loads(r.content)
         except ValueError:
             data = {"raw": r.text}
         return (200 <= r.status_code < 300), data
     except requests.RequestException as e:
-        print(f"WHATSAPP_API_ERROR: {str(e)}")
+        log.error("WHATSAPP_API_ERROR: %s", e)
         return False, {"error": str(e)}
 
 
@@ -235,13 +322,71 @@ def normalize_phone_relaxed(raw: str) -> str:
     raise ValueError("Cannot normalize number: %s" % raw)
 
 
+# The accepted patterns of normalize_phone_relaxed as one regex over a cleaned
+# (digits and '+' only) line. Branch order mirrors the checks above: a number
+# starting with 972 never falls through to the local patterns. Lines that match
+# none of the branches hit the trailing ^.*$, so findall yields one tuple per line.
+_PHONE_LINES_RE = re.compile(
+    r"""
+      ^\+?972(?:0|(?!0))(?P<intl>\d{8,10})$                  # +972 / 972, one stray 0 dropped
+    | ^0(?P<local>5[\d+]{7,8}|[23489][\d+]{7})$              # local, leading 0
+    | ^(?!972)(?P<bare>5[\d+]{7,8}|[23489][\d+]{7})$         # local, leading 0 missing
+    | ^.*$
+    """,
+    re.VERBOSE | re.ASCII | re.MULTILINE,
+)
+# Bytes deleted by the cleaning pass: every ASCII character except digits, '+' and the line separator
+_PHONE_DELETE = bytes(code for code in range(128) if not (chr(code).isdigit() or chr(code) in '+\n'))
+
+
+def _normalize_or_none(raw: str) -> Optional[str]:
+    try:
+        return normalize_phone_relaxed(raw)
+    except ValueError:
+        return None
+
+
+def normalize_phones(raws: Iterable[str]) -> List[Optional[str]]:
+    """Batch version of normalize_phone_relaxed for bulk imports.
+
+    The whole batch is joined into one newline-separated string, cleaned with a
+    single bytes.translate call and matched with a single regex findall, so the
+    per-number work stays in C. Inputs with non-ASCII characters (e.g. non-Latin
+    digits) go through the scalar function, so results are identical to
+    normalize_phone_relaxed.
+
+    Returns:
+      A list aligned with the input: the +972 number, or None where
+      normalize_phone_relaxed would raise ValueError.
+    """
+    raws = [raw or "" for raw in raws]
+    joined = "\n".join(raws)
+    if joined.count("\n") != len(raws) - 1:
+        # A newline inside one of the inputs would break line alignment
+        return [_normalize_or_none(raw) if raw else None for raw in raws]
+
+    ascii_only = joined.isascii()
+    if not ascii_only:
+        joined = "\n".join(raw if raw.isascii() else "" for raw in raws)
+    cleaned = joined.encode("ascii").translate(None, _PHONE_DELETE).decode("ascii")
+    results: List[Optional[str]] = [
+        '+972' + body if (body := intl or local or bare) else None
+        for intl, local, bare in _PHONE_LINES_RE.findall(cleaned)
+    ]
+    if not ascii_only:
+        for index, raw in enumerate(raws):
+            if not raw.isascii():
+                results[index] = _normalize_or_none(raw)
+    return results
+
+
 def send_message(to: str, text: str):
     """Send a plain text message. Returns (ok, data)."""
     try:
         return _post(build_text_payload(to, text))
     except ValueError as e:
         # Handle empty text or invalid input
-        print(f"SEND_MESSAGE_VALIDATION_ERROR: {str(e)}")
+        log.warning("SEND_MESSAGE_VALIDATION_ERROR: %s", e, to=to)
         return False, {"error": str(e)}
 
 
@@ -269,7 +414,7 @@ def send_contact(
         )
     except ValueError as e:
         # Handle validation errors in contact payload
-        print(f"SEND_CONTACT_VALIDATION_ERROR: {str(e)}")
+        log.warning("SEND_CONTACT_VALIDATION_ERROR: %s", e, to=to)
         return False, {"error": str(e)}
 
 